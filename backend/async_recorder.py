@@ -0,0 +1,383 @@
+# async_recorder.py
+
+import asyncio
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pyoauthbridge.wsclient import is_socket_open, subscribe_ticker, unsubscribe_ticker
+from backend.bar_builder import BarBuilder, CsvBarWriter, bar_collection_name
+from backend.mongodb_connect import get_db
+from backend.db_utils import write_documents, MONGO_BATCH_SIZE, MONGO_QUEUE_SIZE
+from backend.ticker_resolver import warm_instruments
+from backend.tick_policy import policy_for
+from backend.tick_buffer import open_tick_buffer
+from backend.exchange_constants import get_multiplier
+from backend.tick_spool import TICK_SPOOL, get_spool
+from backend.sinks import get_pipeline
+from backend.connection_supervisor import ConnectionSupervisor, new_gap_history, subscribe_batch
+from backend.ws_recorder import (
+    get_connection, process_tick, flush_recording, recording_metrics, deliver_spooled, STORAGE_SINKS, BARS_TO_FILES,
+    SUBSCRIBE_BATCH_SIZE, SUBSCRIBE_BATCH_PAUSE, SUBSCRIBE_CONFIRM_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+ASYNC_FLUSH_INTERVAL = float(os.getenv("ASYNC_FLUSH_INTERVAL", "1.0"))    # seconds between storage flushes
+ASYNC_IO_WORKERS = int(os.getenv("ASYNC_IO_WORKERS", "4"))              # threads for blocking drivers
+
+
+class AsyncRecorderService:
+    """
+    Recorder that runs everything except the socket reads on one asyncio
+    event loop (in its own thread):
+
+    - the socket is still read on pyoauthbridge's websocket thread; its
+      callbacks only hand ticks to the loop (call_soon_threadsafe), so each
+      tick costs one cross-thread wakeup and a slow loop backs up there,
+      not on the socket,
+    - one dispatch task routes them to the recordings and hands stored ticks
+      to the sink pipeline (non-blocking queue puts; see backend.sinks),
+    - finished bars are only queued on the loop; one flush task writes them
+      to the bar files and Mongo,
+    - subscription confirmations are awaited concurrently,
+    - a ConnectionSupervisor reopens a dropped socket and replays the
+      subscriptions, so recordings survive disconnects.
+
+    Only blocking calls (HTTP resolve, socket subscribe, file and Mongo
+    writes) are offloaded to a small fixed thread pool, so the thread count
+    does not grow with the number of instruments.
+
+    The public methods are synchronous and mirror ws_recorder's
+    start_recording(s)/stop_recording(s).
+    """
+
+    def __init__(self, io_workers=ASYNC_IO_WORKERS, flush_interval=ASYNC_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.loop = None
+        self.recordings = {}        # ticker -> recording dict (same shape ws_recorder.process_tick expects)
+        self._routes = {}           # instrument key -> recording
+        self._executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="recorder-io")
+        self._thread = None
+        self._started = threading.Lock()
+        self._queue = None
+        self._tasks = []
+        self._bar_writer = CsvBarWriter()
+        self._bars_pending = []     # finished bars for the bar files
+        self._mongo_pending = {}    # collection name -> [documents]
+        self._mongo_pending_count = 0
+        self._flush_now = None
+        self._supervisor = ConnectionSupervisor(get_connection, lambda: list(self.recordings.values()),
+                                                self._resubscribe)
+        self.stats = {"ticks_received": 0, "ticks_stored": 0, "mongo_flushed": 0, "mongo_failed": 0, "mongo_dropped": 0}
+
+    # --- lifecycle ---
+
+    def start(self):
+        """Start the event loop thread (idempotent)."""
+        with self._started:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._thread is None:
+                # Storage is opened before the exit hook is registered, so at exit
+                # shutdown() runs first and its flushed ticks still reach the sinks
+                get_pipeline()
+                if TICK_SPOOL:
+                    get_spool(deliver_spooled)
+                atexit.register(self.shutdown)
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="async-recorder", daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def _run_loop(self, ready):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._queue = asyncio.Queue()
+        self._flush_now = asyncio.Event()
+        self._tasks = [
+            self.loop.create_task(self._dispatch_loop()),
+            self.loop.create_task(self._flush_loop()),
+        ]
+        ready.set()
+        self.loop.run_forever()
+
+    def shutdown(self, timeout=10.0):
+        """Stop every recording, flush all storage and stop the loop."""
+        if self.loop is None or not self.loop.is_running():
+            return
+        self._supervisor.stop()
+        self._call(self._shutdown(), timeout)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self._executor.shutdown(wait=True)
+
+    def _call(self, coro, timeout=None):
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    async def _in_pool(self, func, *args):
+        """Run a blocking call on the thread pool, or inline at interpreter exit (the pool takes no new work then)."""
+        try:
+            future = self.loop.run_in_executor(self._executor, func, *args)
+        except RuntimeError:
+            return func(*args)
+        return await future
+
+    # --- synchronous API (same semantics as ws_recorder) ---
+
+    def start_recordings(self, tickers, access_token, timeout=SUBSCRIBE_CONFIRM_TIMEOUT):
+        return self._call(self._start_many(tickers, access_token, timeout))
+
+    def start_recording(self, ticker, access_token):
+        ticker = ticker.strip().upper()
+        result = self.start_recordings([ticker], access_token).get(ticker)
+        if result is None:
+            return "⚠️ Please enter a ticker."
+        return None if result["status"] == "started" else result["message"]
+
+    def stop_recordings(self, tickers):
+        return self._call(self._stop_many(tickers))
+
+    def stop_recording(self, ticker):
+        result = self.stop_recordings([ticker]).get(ticker.strip().upper())
+        if result and result["status"] == "not_recording":
+            logger.warning(result["message"])
+
+    def is_recording(self, ticker) -> bool:
+        return ticker.strip().upper() in self.recordings
+
+    # --- socket thread -> loop ---
+
+    def _on_socket_tick(self, key, tick):
+        self.loop.call_soon_threadsafe(self._queue.put_nowait, (key, tick))
+
+    # --- tasks ---
+
+    async def _dispatch_loop(self):
+        while True:
+            key, raw = await self._queue.get()
+            recording = self._routes.get(key)
+            if recording is None:
+                continue
+            self.stats["ticks_received"] += 1
+            if not recording["confirmed"].is_set():
+                recording["confirmed"].set()
+            try:
+                if process_tick(recording, raw) is not None:
+                    self.stats["ticks_stored"] += 1
+            except Exception as e:
+                logger.exception("Processing tick for %s failed: %s", recording["ticker"], e)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            try:
+                await self._flush_all()
+            except Exception as e:
+                logger.exception("Storage flush failed: %s", e)
+
+    async def _flush_all(self):
+        await asyncio.gather(self._flush_mongo(), self._flush_bars())
+
+    async def _flush_bars(self):
+        if not self._bars_pending:
+            return
+        pending, self._bars_pending = self._bars_pending, []
+        await self._in_pool(self._write_bars, pending)
+
+    def _write_bars(self, bars):
+        """Runs in the thread pool."""
+        for bar in bars:
+            self._bar_writer.write(bar)
+
+    async def _flush_mongo(self):
+        if not self._mongo_pending:
+            return
+        pending, self._mongo_pending, self._mongo_pending_count = self._mongo_pending, {}, 0
+
+        results = await asyncio.gather(*(
+            self._in_pool(write_documents, get_db(), name, docs)
+            for name, docs in pending.items()
+        ))
+        for inserted, failed in results:
+            self.stats["mongo_flushed"] += inserted
+            self.stats["mongo_failed"] += failed
+
+    # --- storage (runs on the loop; only buffers in memory, the flush task writes) ---
+
+    def _queue_document(self, collection_name, document):
+        if self._mongo_pending_count >= MONGO_QUEUE_SIZE:
+            self.stats["mongo_dropped"] += 1
+            return
+        self._mongo_pending.setdefault(collection_name, []).append(document)
+        self._mongo_pending_count += 1
+        if self._mongo_pending_count >= MONGO_BATCH_SIZE:
+            self._flush_now.set()
+
+    def _store_for(self, ticker):
+        pipeline = get_pipeline()
+        if TICK_SPOOL:
+            return get_spool(deliver_spooled).append     # the spool drainer feeds the sinks
+        return pipeline.submit
+
+    def _save_bar(self, bar):
+        if "mongodb" in STORAGE_SINKS:
+            self._queue_document(bar_collection_name(bar.ticker, bar.interval), bar.to_document())
+        if BARS_TO_FILES:
+            self._bars_pending.append(bar)
+
+    # --- start / stop ---
+
+    async def _start_many(self, tickers, access_token, timeout):
+        tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
+        report = {}
+
+        to_start = []
+        for ticker in tickers:
+            if ticker in self.recordings:
+                report[ticker] = {"status": "already_recording", "message": f"⚠️ {ticker} is already being recorded."}
+            else:
+                to_start.append(ticker)
+        if not to_start:
+            return report
+
+        resolved = await self._in_pool(warm_instruments, to_start, access_token)
+
+        if not is_socket_open():
+            conn = get_connection()
+            conn.set_access_token(access_token)
+            if not await self._in_pool(conn.run_socket):
+                for ticker in to_start:
+                    report[ticker] = {"status": "failed", "message": "❌ WebSocket failed to connect."}
+                return report
+
+        self._supervisor.start()
+
+        registered = []
+        for ticker in to_start:
+            instrument = resolved[ticker]
+            if isinstance(instrument, Exception):
+                report[ticker] = {"status": "failed", "message": f"❌ Failed to resolve {ticker}: {instrument}"}
+                continue
+            self._register(ticker, instrument)
+            registered.append(ticker)
+
+        subscribed = []
+        for i in range(0, len(registered), SUBSCRIBE_BATCH_SIZE):
+            batch = registered[i:i + SUBSCRIBE_BATCH_SIZE]
+            try:
+                await self._in_pool(self._subscribe, [self.recordings[t] for t in batch])
+                subscribed.extend(batch)
+            except Exception as e:
+                for ticker in batch:
+                    await self._teardown(ticker)
+                    report[ticker] = {"status": "failed", "message": f"❌ Subscribing {ticker} failed: {e}"}
+            if i + SUBSCRIBE_BATCH_SIZE < len(registered):
+                await asyncio.sleep(SUBSCRIBE_BATCH_PAUSE)
+
+        async def confirm(ticker):
+            try:
+                await asyncio.wait_for(self.recordings[ticker]["confirmed"].wait(), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+        confirmed = await asyncio.gather(*(confirm(t) for t in subscribed))
+        for ticker, ok in zip(subscribed, confirmed):
+            if ok:
+                report[ticker] = {"status": "started", "message": f"✅ Recording started for {ticker}"}
+                logger.info("✅ Recording started for %s", ticker)
+            else:
+                await self._teardown(ticker)
+                report[ticker] = {
+                    "status": "failed",
+                    "message": f"❌ Failed to receive data for {ticker}. Subscription may have failed.",
+                }
+        return report
+
+    def _register(self, ticker, instrument):
+        key = f"{instrument['token']}_{instrument['exchange_code']}"
+        recording = {
+            "ticker": ticker,
+            "instrument": instrument,
+            "key": key,
+            "store": self._store_for(ticker),
+            "policy": policy_for(ticker),
+            "confirmed": asyncio.Event(),
+            "bars": BarBuilder(ticker, on_bar=self._save_bar),
+            "buffer": open_tick_buffer(ticker, get_multiplier(instrument["exchange_code"])),
+            "metrics": recording_metrics(ticker),
+            "gap": None,
+            "gaps": new_gap_history(),
+        }
+        self.recordings[ticker] = recording
+        self._routes[key] = recording
+
+    def _subscribe(self, recordings):
+        """Runs in the thread pool (the pyoauthbridge calls block on the socket): one packet for all `recordings`."""
+        for recording in recordings:
+            instrument = recording["instrument"]
+            subscribe_ticker(instrument["exchange_code"], instrument["token"],
+                             callback=lambda tick, key=recording["key"]: self._on_socket_tick(key, tick))
+        subscribe_batch(get_connection, [recording["instrument"] for recording in recordings])
+
+    def _resubscribe(self, recordings):
+        """Supervisor thread, after a reconnect: re-attach callbacks and subscribe everything in one batch."""
+        for recording in recordings:
+            instrument = recording["instrument"]
+            subscribe_ticker(instrument["exchange_code"], instrument["token"],
+                             callback=lambda tick, key=recording["key"]: self._on_socket_tick(key, tick))
+        subscribe_batch(get_connection, [recording["instrument"] for recording in recordings])
+
+    async def _teardown(self, ticker):
+        recording = self.recordings.pop(ticker, None)
+        if recording is None:
+            return False
+        self._routes.pop(recording["key"], None)
+
+        instrument = recording["instrument"]
+
+        def unsubscribe(last):
+            unsubscribe_ticker(instrument["exchange_code"], instrument["token"])
+            if last:
+                get_connection().unsubscribe_detailed_marketdata()
+
+        try:
+            await self._in_pool(unsubscribe, not self.recordings)
+        except Exception as e:
+            logger.error("Unsubscribing %s failed: %s", ticker, e)
+
+        flush_recording(recording)      # only queues: ticks to the store, bars to _save_bar
+        get_pipeline().release(ticker)
+        await self._flush_bars()
+        await self._in_pool(self._bar_writer.close, ticker)
+        return True
+
+    async def _stop_many(self, tickers):
+        tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
+        report = {}
+        for ticker in tickers:
+            if await self._teardown(ticker):
+                report[ticker] = {"status": "stopped", "message": f"🛑 Recording stopped for {ticker}"}
+                logger.info("🛑 Recording stopped for %s", ticker)
+            else:
+                report[ticker] = {"status": "not_recording", "message": f"⚠️ {ticker} was not recording."}
+        await self._flush_mongo()
+        if report and not await self._in_pool(get_pipeline().flush):
+            logger.warning("⚠️ Timed out flushing queued ticks")
+        return report
+
+    async def _shutdown(self):
+        await self._stop_many(list(self.recordings))
+        await self._flush_all()
+        for task in self._tasks:
+            task.cancel()
+
+
+recorder_service = AsyncRecorderService()      # start() registers its exit hook
@@ -0,0 +1,294 @@
+# bar_builder.py
+
+import csv
+import glob
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+BAR_FOLDER = os.path.join("data", "bars")
+BAR_INTERVALS = [s.strip() for s in os.getenv("BAR_INTERVALS", "1s,1m,5m").split(",") if s.strip()]
+BAR_HEADER = ["Ticker", "Start", "Open", "High", "Low", "Close", "Volume", "VWAP", "Trades"]
+
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600}
+LOCAL_TZ = datetime.now().astimezone().tzinfo
+
+
+def interval_seconds(label: str) -> int:
+    """'1s' -> 1, '1m' -> 60, '5m' -> 300, '1h' -> 3600"""
+    try:
+        return int(label[:-1]) * _UNIT_SECONDS[label[-1]]
+    except (KeyError, ValueError):
+        raise ValueError(f"Unsupported bar interval: {label} (use e.g. 1s, 1m, 5m, 1h)")
+
+
+def bar_collection_name(ticker: str, label: str) -> str:
+    """e.g. TCS_NSE_bars_1m"""
+    return f"{ticker.replace('.', '_')}_bars_{label}"
+
+
+class Bar:
+    __slots__ = ("ticker", "interval", "start_ns", "open", "high", "low", "close", "volume", "notional", "trades")
+
+    def __init__(self, ticker, interval, start_ns, price, qty):
+        self.ticker = ticker
+        self.interval = interval
+        self.start_ns = start_ns
+        self.open = self.high = self.low = self.close = price
+        self.volume = qty
+        self.notional = price * qty
+        self.trades = 1
+
+    def update(self, price, qty):
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += qty
+        self.notional += price * qty
+        self.trades += 1
+
+    @property
+    def vwap(self):
+        return self.notional / self.volume if self.volume else self.close
+
+    @property
+    def start(self) -> datetime:
+        """Naive local time, as the CSV bar files show it."""
+        return datetime.fromtimestamp(self.start_ns / 1e9)
+
+    @property
+    def start_utc(self) -> datetime:
+        """UTC-aware, as stored in Mongo (which reads naive datetimes as UTC)."""
+        return datetime.fromtimestamp(self.start_ns / 1e9, timezone.utc)
+
+    def to_document(self) -> dict:
+        return {
+            "ticker": self.ticker,
+            "interval": self.interval,
+            "start": self.start_utc,
+            "open": self.open,
+            "high": self.high,
+            "low": self.low,
+            "close": self.close,
+            "volume": self.volume,
+            "vwap": self.vwap,
+            "trades": self.trades,
+        }
+
+    def as_row(self) -> list:
+        return [self.ticker, self.start.strftime("%Y-%m-%d %H:%M:%S"), self.open, self.high, self.low,
+                self.close, self.volume, round(self.vwap, 6), self.trades]
+
+
+class BarBuilder:
+    """
+    Incrementally maintains OHLCV + VWAP bars for one ticker at several
+    intervals. Bars are aligned to the epoch (so 1m bars start on the minute)
+    and handed to `on_bar(bar)` as soon as a tick lands in a later bucket;
+    `flush()` emits the bars still open (e.g. when the recording stops).
+    """
+
+    def __init__(self, ticker, on_bar, intervals=BAR_INTERVALS):
+        self.ticker = ticker
+        self.on_bar = on_bar
+        self._intervals = [(label, interval_seconds(label) * 1_000_000_000) for label in intervals]
+        self._current = {}      # label -> Bar
+
+    def on_tick(self, tick):
+        """Add one backend.tick_record.Tick."""
+        price = tick.ltp
+        qty = tick.quantity
+        ts_ns = tick.ts_ns
+
+        for label, width_ns in self._intervals:
+            start_ns = ts_ns - ts_ns % width_ns
+            bar = self._current.get(label)
+            if bar is not None and bar.start_ns == start_ns:
+                bar.update(price, qty)
+                continue
+            if bar is not None:
+                self.on_bar(bar)
+            self._current[label] = Bar(self.ticker, label, start_ns, price, qty)
+
+    def flush(self):
+        for bar in self._current.values():
+            self.on_bar(bar)
+        self._current = {}
+
+
+class CsvBarWriter:
+    """Appends finished bars to data/bars/TICKER_<interval>.csv, keeping one handle per file."""
+
+    def __init__(self, folder=BAR_FOLDER):
+        self.folder = folder
+        self._files = {}        # (ticker, label) -> (file, csv.writer)
+        self._lock = threading.Lock()
+
+    def write(self, bar: Bar):
+        key = (bar.ticker, bar.interval)
+        with self._lock:
+            entry = self._files.get(key)
+            if entry is None:
+                entry = self._files[key] = self._open(bar_csv_path(bar.ticker, bar.interval, self.folder))
+            f, writer = entry
+            writer.writerow(bar.as_row())
+            f.flush()
+
+    def close(self, ticker=None):
+        with self._lock:
+            for key in [k for k in self._files if ticker is None or k[0] == ticker]:
+                self._files.pop(key)[0].close()
+
+    @staticmethod
+    def _open(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        is_new = not os.path.exists(path) or os.stat(path).st_size == 0
+        f = open(path, mode="a", newline="")
+        writer = csv.writer(f)
+        if is_new:
+            writer.writerow(BAR_HEADER)
+        return f, writer
+
+
+def bar_csv_path(ticker, label, folder=BAR_FOLDER):
+    return os.path.join(folder, f"{ticker.upper()}_{label}.csv")
+
+
+# --- Vectorized backfill from recorded history ---
+
+def build_bars(ticks: pd.DataFrame, label: str) -> pd.DataFrame:
+    """
+    Resample a tick DataFrame (columns: timestamp in naive local time, ltp,
+    ltq) into OHLCV + VWAP bars for one interval. Buckets are aligned to the
+    epoch like BarBuilder's, so live and backfilled bars match for any
+    interval; `start` is UTC-aware. Empty buckets are dropped.
+    """
+    rule = f"{interval_seconds(label)}s"
+    ticks = ticks[ticks["ltq"] > 0].set_index("timestamp").sort_index()
+    if not ticks.empty:
+        utc = ticks.index.tz_localize(LOCAL_TZ, ambiguous="NaT", nonexistent="NaT").tz_convert(timezone.utc)
+        ticks = ticks.set_axis(utc)[utc.notna()].sort_index()
+    if ticks.empty:
+        return pd.DataFrame(columns=["start", "open", "high", "low", "close", "volume", "vwap", "trades"])
+
+    resampled = ticks["ltp"].resample(rule, origin="epoch")
+    bars = resampled.ohlc()
+    bars["volume"] = ticks["ltq"].resample(rule, origin="epoch").sum()
+    bars["vwap"] = (ticks["ltp"] * ticks["ltq"]).resample(rule, origin="epoch").sum() / bars["volume"]
+    bars["trades"] = resampled.count()
+    bars = bars[bars["trades"] > 0]
+    return bars.rename_axis("start").reset_index()
+
+
+CSV_DTYPES = {"Ticker": str, "Date": str, "Time": str}
+
+
+def load_csv_ticks(path) -> pd.DataFrame:
+    """Read a recorded tick CSV (Ticker, Date, Time, LTP, LTQ) into timestamp/ltp/ltq columns."""
+    return csv_ticks_frame(pd.read_csv(path, dtype=CSV_DTYPES, on_bad_lines="skip"), path)
+
+
+def csv_ticks_frame(df: pd.DataFrame, path="CSV") -> pd.DataFrame:
+    """Rows of a recorded tick CSV -> ticker/timestamp/ltp/ltq; unparseable rows are dropped (index kept)."""
+    if not {"Ticker", "Date", "Time", "LTP", "LTQ"}.issubset(df.columns):
+        raise ValueError(f"{path} is not a recorded tick file")
+    return pd.DataFrame({
+        "ticker": df["Ticker"],
+        "timestamp": pd.to_datetime(df["Date"] + " " + df["Time"], format="%d-%m-%y %H:%M:%S", errors="coerce"),
+        "ltp": pd.to_numeric(df["LTP"], errors="coerce"),
+        "ltq": pd.to_numeric(df["LTQ"], errors="coerce").fillna(0).astype("int64"),
+    }).dropna(subset=["timestamp", "ltp"])
+
+
+MONGO_TICK_PROJECTION = {"ticker": 1, "date": 1, "time": 1, "ts": 1, "ltp": 1, "ltq": 1}
+
+
+def load_mongo_ticks(collection) -> pd.DataFrame:
+    """
+    Read a Mongo tick collection into ticker/timestamp/ltp/ltq columns: either
+    a per-ticker collection (string date/time fields) or the time-series
+    collection (UTC "ts" datetimes, converted to local time like the CSVs).
+    """
+    return mongo_ticks_frame(collection.find({}, MONGO_TICK_PROJECTION))
+
+
+def mongo_ticks_frame(documents) -> pd.DataFrame:
+    """Tick documents of either Mongo layout -> ticker/timestamp/ltp/ltq (index = position in `documents`)."""
+    df = pd.DataFrame(list(documents))
+    if df.empty:
+        return pd.DataFrame(columns=["ticker", "timestamp", "ltp", "ltq"])
+    if "ts" in df.columns:
+        local_tz = datetime.now().astimezone().tzinfo
+        timestamp = pd.to_datetime(df["ts"], utc=True).dt.tz_convert(local_tz).dt.tz_localize(None)
+    else:
+        timestamp = pd.to_datetime(df["date"] + " " + df["time"], format="%d-%m-%Y %H:%M:%S", errors="coerce")
+    return pd.DataFrame({
+        "ticker": df["ticker"],
+        "timestamp": timestamp,
+        "ltp": df["ltp"].astype("float64"),
+        "ltq": df["ltq"].astype("int64"),
+    }).dropna(subset=["timestamp"])
+
+
+def _bars_by_ticker(ticks: pd.DataFrame, intervals) -> dict:
+    result = {}
+    for ticker, group in ticks.groupby("ticker"):
+        for label in intervals:
+            result[(ticker, label)] = build_bars(group, label)
+    return result
+
+
+def backfill_bars_from_csv(paths=None, intervals=BAR_INTERVALS, folder=BAR_FOLDER, persist=True) -> dict:
+    """
+    Build bars from recorded tick CSVs (default: data/*.csv) and, with
+    `persist`, write them to data/bars/TICKER_<interval>.csv (replacing
+    existing bar files). Returns {(ticker, interval): DataFrame}.
+    """
+    paths = paths or sorted(glob.glob(os.path.join("data", "*.csv")))
+    frames = []
+    for path in paths:
+        try:
+            frames.append(load_csv_ticks(path))
+        except ValueError as e:
+            logger.warning("⚠️ Skipping %s: %s", path, e)
+    if not frames:
+        return {}
+
+    result = _bars_by_ticker(pd.concat(frames, ignore_index=True), intervals)
+    if persist:
+        os.makedirs(folder, exist_ok=True)
+        for (ticker, label), bars in result.items():
+            out = bars.assign(Ticker=ticker)
+            out["start"] = out["start"].dt.tz_convert(LOCAL_TZ).dt.strftime("%Y-%m-%d %H:%M:%S")
+            out = out[["Ticker", "start", "open", "high", "low", "close", "volume", "vwap", "trades"]]
+            out.columns = BAR_HEADER
+            out.to_csv(bar_csv_path(ticker, label, folder), index=False)
+    return result
+
+
+def backfill_bars_from_mongo(database, collection_names, intervals=BAR_INTERVALS, persist=True) -> dict:
+    """
+    Build bars from per-ticker Mongo tick collections and, with `persist`,
+    replace the matching <collection>_bars_<interval> collections.
+    """
+    frames = [load_mongo_ticks(database[name]) for name in collection_names]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return {}
+
+    result = _bars_by_ticker(pd.concat(frames, ignore_index=True), intervals)
+    if persist:
+        for (ticker, label), bars in result.items():
+            collection = database[bar_collection_name(ticker, label)]
+            collection.delete_many({})
+            documents = bars.assign(ticker=ticker, interval=label).to_dict("records")
+            if documents:
+                collection.insert_many(documents, ordered=False)
+            collection.create_index([("start", 1)])
+    return result
@@ -0,0 +1,234 @@
+# chart_data.py
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", "64"))             # cached chart results (LRU)
+CHART_CACHE_LIVE_TTL = float(os.getenv("CHART_CACHE_LIVE_TTL", "5"))    # seconds, for ranges still being recorded
+CHART_MAX_BUCKETS = int(os.getenv("CHART_MAX_BUCKETS", "4000"))
+
+SERIES_COLUMNS = ["timestamp", "ltp"]
+LOCAL_TZ = datetime.now().astimezone().tzinfo
+
+
+def min_max_downsample(ts_ns: np.ndarray, values: np.ndarray, start_ns: int, end_ns: int, buckets: int):
+    """
+    Reduce a time-sorted series to at most 2 points per time bucket: the
+    minimum and the maximum of each bucket, kept in time order. Unlike
+    averaging, every spike in the input survives at any resolution.
+    Returns (ts_ns, values) arrays.
+    """
+    if len(ts_ns) <= 2 * buckets:
+        return ts_ns, values
+    span = max(1, end_ns - start_ns)
+    bucket = np.clip((ts_ns - start_ns) * buckets // span, 0, buckets - 1)
+
+    # Rows are time-sorted, so each bucket is one contiguous run
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bucket)) + 1))
+    run = np.repeat(np.arange(len(starts)), np.diff(np.concatenate((starts, [len(bucket)]))))
+    lows = np.minimum.reduceat(values, starts)
+    highs = np.maximum.reduceat(values, starts)
+
+    # First row of each run that hits the run's min / max
+    _, low_at = np.unique(run[values == lows[run]], return_index=True)
+    _, high_at = np.unique(run[values == highs[run]], return_index=True)
+    low_rows = np.flatnonzero(values == lows[run])[low_at]
+    high_rows = np.flatnonzero(values == highs[run])[high_at]
+
+    keep = np.union1d(low_rows, high_rows)      # sorted, so time order is kept
+    return ts_ns[keep], values[keep]
+
+
+def _series_frame(ts_ns, values) -> pd.DataFrame:
+    return pd.DataFrame({"timestamp": pd.to_datetime(ts_ns), "ltp": values})
+
+
+def _local_naive(moment: datetime) -> datetime:
+    """Chart sources compare in naive local time: CSV rows are recorded that way, read_parquet_ticks converts to it."""
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(LOCAL_TZ).replace(tzinfo=None)
+
+
+def mongo_utc_offset(moment: datetime) -> str:
+    """Local UTC offset at `moment` as "+05:30": $dateFromString takes offsets or Olson ids, not "IST"."""
+    offset = moment.astimezone().strftime("%z")
+    return f"{offset[:3]}:{offset[3:]}"
+
+
+def _bucket_count(width: int) -> int:
+    return max(1, min(int(width), CHART_MAX_BUCKETS))
+
+
+def downsample_frame(df: pd.DataFrame, start: datetime, end: datetime, width: int) -> pd.DataFrame:
+    """min/max-downsample a timestamp/ltp DataFrame (naive local timestamps) over [start, end)."""
+    if df.empty:
+        return pd.DataFrame(columns=SERIES_COLUMNS)
+    df = df.sort_values("timestamp", kind="stable")
+    ts_ns = df["timestamp"].to_numpy("datetime64[ns]").view(np.int64)
+    ts, values = min_max_downsample(ts_ns, df["ltp"].to_numpy(np.float64),
+                                    pd.Timestamp(start).value, pd.Timestamp(end).value, _bucket_count(width))
+    return _series_frame(ts, values)
+
+
+# --- sources: each returns {ticker: DataFrame(timestamp, ltp)} already downsampled ---
+
+def csv_series(tickers, start: datetime, end: datetime, width: int) -> dict:
+    """From the recorded CSVs through the indexed archive reader (only the needed hours are parsed)."""
+    from backend.csv_archive import csv_archive
+    start, end = _local_naive(start), _local_naive(end)
+    result = {}
+    for ticker in tickers:
+        batches = [df[["timestamp", "ltp"]] for df in csv_archive.iter_batches([ticker], start, end)]
+        frame = pd.concat(batches, ignore_index=True) if batches else pd.DataFrame(columns=SERIES_COLUMNS)
+        result[ticker] = downsample_frame(frame, start, end, width)
+    return result
+
+
+def parquet_series(tickers, start: datetime, end: datetime, width: int) -> dict:
+    """From the Parquet partitions; stored UTC timestamps come back as naive local time before filtering."""
+    from backend.parquet_utils import read_parquet_ticks
+    start, end = _local_naive(start), _local_naive(end)
+    df = read_parquet_ticks(tickers, start.date(), end.date())
+    result = {}
+    for ticker in tickers:
+        rows = df[df["ticker"] == ticker] if len(df) else df
+        rows = rows[(rows["timestamp"] >= start) & (rows["timestamp"] < end)] if len(rows) else rows
+        result[ticker] = downsample_frame(rows[["timestamp", "ltp"]] if len(rows) else
+                                          pd.DataFrame(columns=SERIES_COLUMNS), start, end, width)
+    return result
+
+
+def _mongo_bucket_stages(ts_expr, start_utc: datetime, bucket_ms: int) -> list:
+    """$group per (ticker, bucket) keeping the min and max tick with their timestamps ($top/$bottom, MongoDB 5.2+)."""
+    return [
+        {"$group": {
+            "_id": {"ticker": "$ticker",
+                    "bucket": {"$floor": {"$divide": [{"$subtract": [ts_expr, start_utc]}, bucket_ms]}}},
+            "low": {"$top": {"sortBy": {"ltp": 1}, "output": [ts_expr, "$ltp"]}},
+            "high": {"$bottom": {"sortBy": {"ltp": 1}, "output": [ts_expr, "$ltp"]}},
+        }},
+        {"$sort": {"_id.bucket": 1}},
+    ]
+
+
+def mongo_series(database, tickers, start: datetime, end: datetime, width: int) -> dict:
+    """
+    Downsampled in MongoDB with one aggregation per collection: only about
+    two documents per bucket come back over the network. Works on the
+    time-series collection and on per-ticker collections (string date/time).
+    """
+    from backend.db_utils import MONGO_LAYOUT, TS_COLLECTION, TS_META_FIELD, TS_TIME_FIELD, tick_collection_name
+    start_utc = (start if start.tzinfo else start.replace(tzinfo=LOCAL_TZ)).astimezone(timezone.utc)
+    end_utc = (end if end.tzinfo else end.replace(tzinfo=LOCAL_TZ)).astimezone(timezone.utc)
+    bucket_ms = max(1, int((end_utc - start_utc).total_seconds() * 1000) // _bucket_count(width))
+
+    if MONGO_LAYOUT == "timeseries":
+        pipeline = [{"$match": {TS_META_FIELD: {"$in": list(tickers)},
+                                TS_TIME_FIELD: {"$gte": start_utc, "$lt": end_utc}}}]
+        pipeline += _mongo_bucket_stages(f"${TS_TIME_FIELD}", start_utc, bucket_ms)
+        groups = {TS_COLLECTION: pipeline}
+    else:
+        local_start, local_end = _local_naive(start), _local_naive(end)
+        days = [d.strftime("%d-%m-%Y") for d in pd.date_range(local_start.date(), local_end.date())]
+        ts_expr = {"$dateFromString": {"dateString": {"$concat": ["$date", " ", "$time"]},
+                                       "format": "%d-%m-%Y %H:%M:%S", "timezone": mongo_utc_offset(local_start)}}
+        pipeline = [
+            {"$match": {"date": {"$in": days}}},
+            {"$addFields": {"_ts": ts_expr}},
+            {"$match": {"_ts": {"$gte": start_utc, "$lt": end_utc}}},
+        ] + _mongo_bucket_stages("$_ts", start_utc, bucket_ms)
+        groups = {tick_collection_name(t): pipeline for t in tickers}
+
+    points = {t: [] for t in tickers}
+    for collection_name, pipeline in groups.items():
+        for doc in database[collection_name].aggregate(pipeline, allowDiskUse=True):
+            ticker = doc["_id"]["ticker"]
+            if ticker not in points:
+                continue
+            low, high = doc["low"], doc["high"]
+            points[ticker].extend(sorted({tuple(low), tuple(high)}))
+
+    result = {}
+    for ticker, rows in points.items():
+        if not rows:
+            result[ticker] = pd.DataFrame(columns=SERIES_COLUMNS)
+            continue
+        ts = pd.to_datetime([r[0] for r in rows], utc=True).tz_convert(LOCAL_TZ).tz_localize(None)
+        result[ticker] = pd.DataFrame({"timestamp": ts, "ltp": [float(r[1]) for r in rows]})
+    return result
+
+
+class ChartCache:
+    """
+    LRU cache of chart results keyed by (source, ticker set, range,
+    resolution). Ranges that end in the future are still being recorded, so
+    those entries expire after CHART_CACHE_LIVE_TTL seconds.
+    """
+
+    def __init__(self, maxsize=CHART_CACHE_SIZE, live_ttl=CHART_CACHE_LIVE_TTL):
+        self.maxsize = maxsize
+        self.live_ttl = live_ttl
+        self._entries = OrderedDict()   # key -> (expires_at or None, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, end: datetime, build):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = build()
+        live = _local_naive(end) > datetime.now()
+        with self._lock:
+            self._entries[key] = (now + self.live_ttl if live else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+chart_cache = ChartCache()
+
+
+def chart_series(source, tickers, start: datetime, end: datetime, width: int = 1200, database=None) -> dict:
+    """
+    {ticker: DataFrame(timestamp, ltp)} for a multi-ticker chart, downsampled
+    server-side to about 2 * `width` points per ticker (min/max per bucket)
+    and cached. `source` is "mongodb" (needs `database`), "csv" or "parquet".
+    """
+    tickers = sorted({t.upper() for t in tickers})
+    key = (source, tuple(tickers), start, end, _bucket_count(width))
+
+    def build():
+        started = time.perf_counter()
+        if source == "mongodb":
+            result = mongo_series(database, tickers, start, end, width)
+        elif source == "csv":
+            result = csv_series(tickers, start, end, width)
+        elif source == "parquet":
+            result = parquet_series(tickers, start, end, width)
+        else:
+            raise ValueError(f"Unknown chart source: {source}")
+        logger.debug("Chart data for %d tickers from %s in %.3fs", len(tickers), source, time.perf_counter() - started)
+        return result
+
+    return chart_cache.get_or_build(key, end, build)
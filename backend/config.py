@@ -0,0 +1,57 @@
+# config.py
+
+import os
+import threading
+from dotenv import load_dotenv
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_env():
+    """Load .env into os.environ once per process; later calls are no-ops."""
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if not _loaded:
+            load_dotenv()
+            _loaded = True
+
+
+load_env()
+
+STORAGE_MODE = os.getenv("STORAGE_MODE", "mongodb").strip().lower()   # csv | mongodb | parquet
+
+
+def parse_sinks(value: str) -> list:
+    """'csv, mongodb' -> ['csv', 'mongodb']"""
+    return [s.strip().lower() for s in value.split(",") if s.strip()]
+
+
+# Tick sinks written in parallel, e.g. "csv,mongodb" (default: just STORAGE_MODE)
+STORAGE_SINKS = parse_sinks(os.getenv("STORAGE_SINKS", STORAGE_MODE))
+
+
+def ipc_authkey(env_var: str, key_file: str) -> bytes:
+    """
+    Auth key for a local multiprocessing.managers endpoint (those unpickle
+    what they receive, so the key must stay secret): `env_var` if set,
+    otherwise a random key kept in `key_file` (mode 0600, created on first
+    use) that the server and its clients on this machine share.
+    """
+    key = os.getenv(env_var, "").strip()
+    if key:
+        return key.encode()
+    key_file = os.path.expanduser(key_file)
+    os.makedirs(os.path.dirname(key_file), mode=0o700, exist_ok=True)
+    try:
+        fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(key_file) as f:
+            return f.read().strip().encode()
+    import secrets
+    key = secrets.token_hex(32)
+    with os.fdopen(fd, "w") as f:
+        f.write(key)
+    return key.encode()
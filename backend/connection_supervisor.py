@@ -0,0 +1,165 @@
+# connection_supervisor.py
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pyoauthbridge.wsclient import is_socket_open
+from backend.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+SOCKET_CHECK_INTERVAL = float(os.getenv("SOCKET_CHECK_INTERVAL", "1.0"))   # seconds between socket checks
+RECONNECT_INITIAL = float(os.getenv("RECONNECT_INITIAL", "1.0"))           # seconds, doubled per failed attempt
+RECONNECT_MAX = float(os.getenv("RECONNECT_MAX", "60"))
+GAP_HISTORY = int(os.getenv("GAP_HISTORY", "100"))                         # gaps kept per recording
+GAP_LOG_PATH = os.getenv("GAP_LOG_PATH", os.path.join("data", "gaps.jsonl"))
+
+SOCKET_CONNECTED = registry.gauge("recorder_socket_connected", "1 while the market data socket is open")
+DISCONNECTS = registry.counter("recorder_socket_disconnects_total", "Socket drops noticed by the supervisor")
+RECONNECTS = registry.counter("recorder_socket_reconnects_total", "Successful reconnects with subscriptions replayed")
+GAPS = registry.counter("recorder_gaps_total", "Disconnect gaps closed by a tick", ["ticker"])
+GAP_SECONDS = registry.counter("recorder_gap_seconds_total", "Time without ticks across disconnect gaps", ["ticker"])
+
+_gap_log_lock = threading.Lock()
+
+
+def new_gap_history():
+    return deque(maxlen=GAP_HISTORY)
+
+
+def open_gap(recording, disconnected_ns: int):
+    """Mark a recording as cut off; the gap starts at its last received tick."""
+    if recording.get("gap") is not None:
+        return
+    last_tick = recording["metrics"]["last_tick"].value
+    recording["gap"] = {
+        "ticker": recording["ticker"],
+        "start_ns": int(last_tick * 1e9) if last_tick else disconnected_ns,
+        "disconnected_ns": disconnected_ns,
+    }
+
+
+def close_gap(recording, ts_ns: int):
+    """Called by process_tick with the first tick after a reconnect: account and log the gap."""
+    gap, recording["gap"] = recording["gap"], None
+    gap["end_ns"] = ts_ns
+    seconds = (ts_ns - gap["start_ns"]) / 1e9
+    recording["gaps"].append(gap)
+    GAPS.labels(recording["ticker"]).inc()
+    GAP_SECONDS.labels(recording["ticker"]).inc(seconds)
+    logger.info("🩹 %s resumed after a %.1fs gap", recording["ticker"], seconds)
+
+    line = json.dumps({
+        "ticker": gap["ticker"],
+        "start": datetime.fromtimestamp(gap["start_ns"] / 1e9).isoformat(),
+        "end": datetime.fromtimestamp(ts_ns / 1e9).isoformat(),
+        "seconds": round(seconds, 3),
+    })
+    try:
+        with _gap_log_lock:
+            os.makedirs(os.path.dirname(GAP_LOG_PATH) or ".", exist_ok=True)
+            with open(GAP_LOG_PATH, "a") as f:
+                f.write(line + "\n")
+    except OSError as e:
+        logger.warning("⚠️ Could not log gap for %s: %s", gap["ticker"], e)
+
+
+def subscribe_batch(get_connection, instruments):
+    """
+    Subscribe detailed market data for many instruments in one packet.
+    Falls back to one request per instrument for clients without
+    wsclient.send_message (e.g. the replay stand-in) or when the batched
+    send fails.
+    """
+    try:
+        from pyoauthbridge.wsclient import send_message
+        send_message("DetailedMarketDataMessage",
+                     [[instrument["exchange_code"], int(instrument["token"])] for instrument in instruments])
+        return
+    except ImportError:
+        pass
+    except Exception as e:
+        logger.warning("⚠️ Batched subscribe of %d instruments failed (%s); subscribing one by one", len(instruments), e)
+    conn = get_connection()
+    for instrument in instruments:
+        conn.subscribe_detailed_marketdata({
+            "exchangeCode": instrument["exchange_code"],
+            "instrumentToken": int(instrument["token"])
+        })
+
+
+class ConnectionSupervisor:
+    """
+    Watches the shared socket while anything is recording. When it drops:
+
+    - every active recording gets an open gap (closed by its next tick),
+    - the socket is reopened with exponential backoff
+      (RECONNECT_INITIAL .. RECONNECT_MAX) using the token already set,
+    - `resubscribe(recordings)` replays all subscriptions in one batch.
+
+    Recordings (policy, bars, buffers, sinks) are untouched, so recording
+    simply resumes; no thread or recording is torn down.
+    """
+
+    def __init__(self, get_connection, recordings, resubscribe,
+                 check_interval=SOCKET_CHECK_INTERVAL, initial=RECONNECT_INITIAL, maximum=RECONNECT_MAX):
+        self.get_connection = get_connection
+        self.recordings = recordings        # () -> list of recording dicts
+        self.resubscribe = resubscribe      # (list of recording dicts) -> None, raises on failure
+        self.check_interval = check_interval
+        self.initial = initial
+        self.maximum = maximum
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="connection-supervisor", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            connected = is_socket_open()
+            SOCKET_CONNECTED.set(1 if connected else 0)
+            if not connected and self.recordings():
+                self._recover()
+
+    def _recover(self):
+        DISCONNECTS.inc()
+        disconnected_ns = time.time_ns()
+        for recording in self.recordings():
+            open_gap(recording, disconnected_ns)
+        logger.warning("🔌 Socket closed; reconnecting %d recordings", len(self.recordings()))
+
+        delay = self.initial
+        attempt = 0
+        while not self._stop.is_set():
+            recordings = self.recordings()
+            if not recordings:
+                return
+            attempt += 1
+            try:
+                if is_socket_open() or self.get_connection().run_socket():
+                    self.resubscribe(recordings)
+                    RECONNECTS.inc()
+                    SOCKET_CONNECTED.set(1)
+                    logger.info("🔌 Reconnected after %d attempt(s); %d subscriptions replayed",
+                                attempt, len(recordings))
+                    return
+            except Exception as e:
+                logger.warning("⚠️ Reconnect attempt %d failed: %s", attempt, e)
+            if self._stop.wait(delay):
+                return
+            delay = min(delay * 2, self.maximum)
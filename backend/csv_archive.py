@@ -0,0 +1,260 @@
+# csv_archive.py
+
+import glob
+import io
+import json
+import logging
+import mmap
+import os
+import re
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from backend.csv_utils import CSV_FOLDER, CSV_HEADER
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_INDEX_FOLDER = os.path.join(CSV_FOLDER, ".index")
+ARCHIVE_CHUNK_BYTES = int(os.getenv("ARCHIVE_CHUNK_BYTES", str(8 * 1024 * 1024)))   # bytes parsed per batch
+UNKNOWN_HOUR = -1       # rows whose date/time could not be read from the raw bytes; always parsed
+
+# data/TCS.NSE.csv (legacy, one file per ticker) and data/TCS.NSE_2025-08-07.csv (daily)
+_ARCHIVE_NAME = re.compile(r"^(?P<ticker>[A-Z0-9&\-]+\.[A-Z]+)(?:_(?P<day>\d{4}-\d{2}-\d{2}))?\.csv$")
+_COLUMNS = ["ticker", "date", "time", "ltp", "ltq"]
+
+
+def hour_key(moment: datetime) -> int:
+    """yymmddhh as an int, the unit of the sidecar index (rows store 2-digit years)."""
+    return ((moment.year % 100) * 100 + moment.month) * 10000 + moment.day * 100 + moment.hour
+
+
+class ArchiveIndex:
+    """
+    Sidecar index of one recorded CSV: runs of consecutive rows from the same
+    hour as [hour_key, start_offset, end_offset]. Recorder files are
+    append-only, so a grown file is indexed incrementally from the last
+    indexed byte; a replaced or truncated file is re-indexed from scratch.
+    """
+
+    def __init__(self, path, index_folder=ARCHIVE_INDEX_FOLDER):
+        self.path = path
+        self.ticker = _ARCHIVE_NAME.match(os.path.basename(path)).group("ticker")
+        self.sidecar = os.path.join(index_folder, os.path.basename(path) + ".json")
+        self.size = 0           # bytes indexed (always ends on a newline)
+        self.inode = None
+        self.runs = []
+
+    def refresh(self):
+        st = os.stat(self.path)
+        if self.inode is None and os.path.exists(self.sidecar):
+            try:
+                with open(self.sidecar) as f:
+                    stored = json.load(f)
+                self.size, self.inode, self.runs = stored["size"], stored["inode"], stored["runs"]
+            except (OSError, ValueError, KeyError):
+                self.size, self.inode, self.runs = 0, None, []
+
+        if self.inode != st.st_ino or st.st_size < self.size:
+            self.size, self.runs = 0, []
+        self.inode = st.st_ino
+        if st.st_size > self.size:
+            self._extend(st.st_size)
+            os.makedirs(os.path.dirname(self.sidecar), exist_ok=True)
+            with open(f"{self.sidecar}.tmp", "w") as f:
+                json.dump({"size": self.size, "inode": self.inode, "runs": self.runs}, f)
+            os.replace(f"{self.sidecar}.tmp", self.sidecar)
+        return self
+
+    def _extend(self, file_size):
+        """Index the complete lines in [self.size, file_size) with vectorized byte lookups."""
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = np.frombuffer(mm, dtype=np.uint8, count=file_size)
+            try:
+                keys, starts, ends = self._hour_keys(data, file_size)
+            finally:
+                del data        # release the buffer before the map closes
+        if not len(ends):
+            return
+
+        # Collapse consecutive rows of the same hour into runs
+        change = np.flatnonzero(np.diff(keys)) + 1
+        run_starts = np.concatenate(([0], change))
+        run_ends = np.concatenate((change, [len(keys)])) - 1
+        for key, a, b in zip(keys[run_starts], starts[run_starts], ends[run_ends]):
+            if self.runs and self.runs[-1][0] == key and self.runs[-1][2] == a:
+                self.runs[-1][2] = int(b)
+            else:
+                self.runs.append([int(key), int(a), int(b)])
+        self.size = int(ends[-1])
+
+    def _hour_keys(self, data, file_size):
+        """(hour key, start, end) arrays for the complete rows after self.size; the header row is skipped."""
+        newlines = np.flatnonzero(data[self.size:] == 10) + self.size
+        if not len(newlines) or file_size < 16:
+            return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.int64)
+        starts = np.concatenate(([self.size], newlines[:-1] + 1))
+        ends = newlines + 1
+
+        # Row layout: <ticker>,dd-mm-yy,HH:MM:SS,...  -> read the digits in place
+        d = starts + len(self.ticker) + 1
+        valid = (d + 12) < ends
+        d = np.where(valid, d, 1)
+        valid &= (data[d - 1] == ord(",")) & (data[d + 2] == ord("-")) & (data[d + 5] == ord("-")) \
+            & (data[d + 8] == ord(",")) & (data[d + 11] == ord(":"))
+
+        def number(offset):
+            return (data[d + offset].astype(np.int64) - 48) * 10 + (data[d + offset + 1].astype(np.int64) - 48)
+
+        keys = (number(6) * 100 + number(3)) * 10000 + number(0) * 100 + number(9)
+        keys = np.where(valid, keys, UNKNOWN_HOUR)
+
+        if self.size == 0 and bytes(data[starts[0]:ends[0]]).startswith(CSV_HEADER[0].encode()):
+            self.size = int(ends[0])
+            keys, starts, ends = keys[1:], starts[1:], ends[1:]
+        return keys, starts, ends
+
+    def ranges(self, start: datetime = None, end: datetime = None):
+        """
+        Contiguous [start_offset, end_offset, clean] byte ranges that can hold
+        rows in [start, end). `clean` is False for ranges that include lines
+        the index could not read (stray log output in old files, a header).
+        """
+        low = hour_key(start) if start else None
+        high = hour_key(end) if end else None
+        ranges = []
+        for key, a, b in self.runs:
+            if key != UNKNOWN_HOUR and ((low is not None and key < low) or (high is not None and key > high)):
+                continue
+            clean = key != UNKNOWN_HOUR
+            if ranges and ranges[-1][1] == a and ranges[-1][2] == clean:
+                ranges[-1][1] = b
+            else:
+                ranges.append([a, b, clean])
+        return ranges
+
+
+class CsvArchive:
+    """
+    Time-range, multi-ticker reads over the recorded CSVs in `folder`.
+
+    Files are located from their names (daily files outside the range are
+    never opened), seeks come from each file's ArchiveIndex, and the selected
+    byte ranges are parsed from a read-only memory map in chunks of about
+    ARCHIVE_CHUNK_BYTES with pandas' C parser. Results stream as DataFrame
+    (or Arrow RecordBatch) batches, one ticker at a time in file order, so
+    memory stays bounded by the chunk size.
+    """
+
+    def __init__(self, folder=CSV_FOLDER, index_folder=ARCHIVE_INDEX_FOLDER, chunk_bytes=ARCHIVE_CHUNK_BYTES):
+        self.folder = folder
+        self.index_folder = index_folder
+        self.chunk_bytes = chunk_bytes
+        self._indexes = {}      # path -> ArchiveIndex
+
+    def files(self, ticker=None):
+        """{ticker: [paths]} of archive files (legacy file first, then daily files by date)."""
+        found = {}
+        for path in sorted(glob.glob(os.path.join(self.folder, "*.csv"))):
+            match = _ARCHIVE_NAME.match(os.path.basename(path))
+            if match and (ticker is None or match.group("ticker") == ticker.upper()):
+                found.setdefault(match.group("ticker"), []).append((match.group("day") or "", path))
+        return {t: [p for _, p in sorted(entries)] for t, entries in found.items()}
+
+    def tickers(self):
+        return sorted(self.files())
+
+    def index(self, path) -> ArchiveIndex:
+        index = self._indexes.get(path)
+        if index is None:
+            index = self._indexes[path] = ArchiveIndex(path, self.index_folder)
+        return index.refresh()
+
+    def iter_batches(self, tickers=None, start: datetime = None, end: datetime = None):
+        """Yield DataFrames (ticker, timestamp, ltp, ltq) of rows with start <= timestamp < end."""
+        files = self.files()
+        for ticker in (tickers or sorted(files)):
+            for path in files.get(ticker.upper(), []):
+                day = _ARCHIVE_NAME.match(os.path.basename(path)).group("day")
+                if day and not _day_overlaps(day, start, end):
+                    continue
+                try:
+                    ranges = self.index(path).ranges(start, end)
+                except (OSError, ValueError) as e:
+                    logger.warning("⚠️ Skipping unreadable archive %s: %s", path, e)
+                    continue
+                if ranges:
+                    yield from self._read_ranges(path, ticker.upper(), ranges, start, end)
+
+    def iter_record_batches(self, tickers=None, start: datetime = None, end: datetime = None):
+        """Same rows as iter_batches, as pyarrow RecordBatches."""
+        import pyarrow as pa
+        for df in self.iter_batches(tickers, start, end):
+            yield pa.RecordBatch.from_pandas(df, preserve_index=False)
+
+    def write_csv(self, target, tickers=None, start: datetime = None, end: datetime = None) -> int:
+        """Stream matching rows as CSV (recorder column layout) to a path or binary file; returns rows written."""
+        own = isinstance(target, (str, os.PathLike))
+        f = open(target, "wb") if own else target
+        rows = 0
+        try:
+            f.write((",".join(CSV_HEADER) + "\n").encode())
+            for df in self.iter_batches(tickers, start, end):
+                out = pd.DataFrame({
+                    "Ticker": df["ticker"],
+                    "Date": df["timestamp"].dt.strftime("%d-%m-%y"),
+                    "Time": df["timestamp"].dt.strftime("%H:%M:%S"),
+                    "LTP": df["ltp"],
+                    "LTQ": df["ltq"],
+                })
+                f.write(out.to_csv(index=False, header=False).encode())
+                rows += len(out)
+        finally:
+            if own:
+                f.close()
+        return rows
+
+    def _read_ranges(self, path, ticker, ranges, start, end):
+        prefix = f"{ticker},".encode()
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for a, b, clean in ranges:
+                pos = a
+                while pos < b:
+                    cut = b if b - pos <= self.chunk_bytes else mm.find(b"\n", pos + self.chunk_bytes, b) + 1
+                    if cut <= 0:
+                        cut = b
+                    raw = mm[pos:cut]
+                    if not clean:
+                        raw = b"\n".join(line for line in raw.split(b"\n") if line.startswith(prefix))
+                    df = _parse_rows(raw)
+                    pos = cut
+                    if start is not None:
+                        df = df[df["timestamp"] >= start]
+                    if end is not None:
+                        df = df[df["timestamp"] < end]
+                    if len(df):
+                        yield df.reset_index(drop=True)
+
+
+def _parse_rows(raw: bytes) -> pd.DataFrame:
+    if not raw.strip():
+        return pd.DataFrame(columns=["ticker", "timestamp", "ltp", "ltq"])
+    df = pd.read_csv(io.BytesIO(raw), header=None, names=_COLUMNS,
+                     dtype={"ticker": str, "date": str, "time": str}, on_bad_lines="skip")
+    return pd.DataFrame({
+        "ticker": df["ticker"],
+        "timestamp": pd.to_datetime(df["date"] + " " + df["time"], format="%d-%m-%y %H:%M:%S", errors="coerce"),
+        "ltp": pd.to_numeric(df["ltp"], errors="coerce"),
+        "ltq": pd.to_numeric(df["ltq"], errors="coerce").fillna(0).astype("int64"),
+    }).dropna(subset=["timestamp", "ltp"])
+
+
+def _day_overlaps(day: str, start, end) -> bool:
+    day_start = datetime.strptime(day, "%Y-%m-%d")
+    if end is not None and day_start >= end:
+        return False
+    if start is not None and day_start.date() < start.date():
+        return False
+    return True
+
+
+csv_archive = CsvArchive()
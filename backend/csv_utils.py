@@ -1,32 +1,189 @@
-import csv 
+import atexit
+import csv
 import os
+import threading
+import time
+from datetime import date
+from backend.metrics import FLUSH_DURATION, PERSIST_LATENCY
 
 CSV_FOLDER = "data"
+CSV_HEADER = ["Ticker", "Date", "Time", "LTP", "LTQ"]
 
-def initialize_csv(ticker):
+# Buffering / durability knobs for CsvTickSink (overridable from .env)
+CSV_FLUSH_ROWS = int(os.getenv("CSV_FLUSH_ROWS", "200"))
+CSV_FLUSH_INTERVAL = float(os.getenv("CSV_FLUSH_INTERVAL", "1.0"))     # seconds
+CSV_FSYNC = os.getenv("CSV_FSYNC", "none").strip().lower()             # none | batch | tick
+CSV_ROTATE_DAILY = os.getenv("CSV_ROTATE_DAILY", "true").strip().lower() in ("1", "true", "yes")
+
+FSYNC_POLICIES = ("none", "batch", "tick")
+
+
+def initialize_csv(ticker, filepath=None):
     ticker = ticker.upper()
-    filepath = os.path.join(CSV_FOLDER, f"{ticker}.csv")
-    os.makedirs(CSV_FOLDER, exist_ok=True)
+    filepath = filepath or os.path.join(CSV_FOLDER, f"{ticker}.csv")
+    os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
 
     if not os.path.exists(filepath) or os.stat(filepath).st_size == 0:
         with open(filepath, mode='w', newline='') as f:
             writer = csv.writer(f)
-            writer.writerow(["Ticker", "Date", "Time", "LTP", "LTQ"])
+            writer.writerow(CSV_HEADER)
 
     return filepath
 
 
-def save_tick_in_csv(tick, filepath):
-    print(f"💾 Saving tick to {filepath}: {tick}")  # Add this
-    with open(filepath, mode='a', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            tick["symbol"],
-            tick["date"],
-            tick["time"],
-            tick["ltp"],
-            tick["ltq"]
-        ])
-        f.flush()  # ✅ Immediately write to disk to prevent loss on crash
+def daily_csv_path(ticker, day: date, folder=CSV_FOLDER):
+    """data/TICKER_YYYY-MM-DD.csv"""
+    return os.path.join(folder, f"{ticker.upper()}_{day.isoformat()}.csv")
+
+
+class CsvTickSink:
+    """
+    Per-ticker CSV writer that keeps its file handle open for the life of the
+    recording and writes rows in batches.
+
+    Rows are buffered and written every `flush_rows` rows or `flush_interval`
+    seconds. `fsync` chooses durability vs throughput:
+        "none"  - leave it to the OS page cache (fastest)
+        "batch" - fsync after every batch
+        "tick"  - write and fsync every row (safest, slowest)
+    With `rotate_daily` the sink writes to data/TICKER_YYYY-MM-DD.csv and
+    switches file at midnight; otherwise it appends to data/TICKER.csv.
+    """
+
+    def __init__(self, ticker, folder=CSV_FOLDER, flush_rows=CSV_FLUSH_ROWS, flush_interval=CSV_FLUSH_INTERVAL,
+                 fsync=CSV_FSYNC, rotate_daily=CSV_ROTATE_DAILY):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync} (expected one of {FSYNC_POLICIES})")
+
+        self.ticker = ticker.upper()
+        self.folder = folder
+        self.flush_rows = 1 if fsync == "tick" else max(1, flush_rows)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.rotate_daily = rotate_daily
+        self.filepath = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._writer = None
+        self._day = None
+        self._file_date = None
+        self._rows = []
+        self._oldest_ns = 0
+        self._last_flush = time.monotonic()
+        self._sizes = {}        # path -> size when the last mark was taken (or when opened after it)
+
+    def mark(self):
+        """State to go back to with `rollback` if what is written after this fails part way."""
+        with self._lock:
+            self._sizes = {self.filepath: self._file.tell()} if self._file is not None else {}
+            return list(self._rows), self._oldest_ns, self._day, self._file_date
+
+    def rollback(self, mark):
+        """Undo every row buffered or written since `mark`: files are truncated back and the buffer restored."""
+        with self._lock:
+            self._close_locked()
+            for path, size in self._sizes.items():
+                os.truncate(path, size)
+            rows, self._oldest_ns, self._day, self._file_date = mark
+            self._rows = list(rows)     # the file is reopened by the next write or flush
+
+    def write(self, tick):
+        """Buffer one backend.tick_record.Tick."""
+        row = tick.as_row()
+        day = row[1] if self.rotate_daily else None     # "%d-%m-%y", cached per second by tick_record
+        with self._lock:
+            if self._file is None or day != self._day:
+                self._flush_locked()
+                self._open_locked(day, tick.timestamp.date() if self.rotate_daily else None)
+
+            if not self._rows:
+                self._oldest_ns = tick.ts_ns
+            self._rows.append(row)
+
+            if len(self._rows) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._close_locked()
+
+    def _open_locked(self, day, file_date):
+        self._close_locked()
+        if file_date is not None:
+            path = daily_csv_path(self.ticker, file_date, self.folder)
+        else:
+            path = os.path.join(self.folder, f"{self.ticker}.csv")
+        self.filepath = initialize_csv(self.ticker, path)
+        self._file = open(self.filepath, mode='a', newline='', buffering=1 << 16)
+        self._sizes.setdefault(self.filepath, self._file.tell())
+        self._writer = csv.writer(self._file)
+        self._day, self._file_date = day, file_date
+
+    def _close_locked(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass            # unwritten bytes are dropped; callers truncate back after a failure
+            self._file = None
+            self._writer = None
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._rows:
+            return
+        if self._file is None:
+            self._open_locked(self._day, self._file_date)     # closed by a failed write
+
+        started = time.perf_counter()
+        offset = self._file.tell()
+        try:
+            self._writer.writerows(self._rows)
+            self._file.flush()
+            if self.fsync != "none":
+                os.fsync(self._file.fileno())
+        except OSError:
+            # Never leave part of a batch behind: the rows stay buffered for the next attempt
+            self._close_locked()
+            os.truncate(self.filepath, offset)
+            raise
+        FLUSH_DURATION.labels("csv").observe(time.perf_counter() - started)
+        PERSIST_LATENCY.labels("csv").observe((time.time_ns() - self._oldest_ns) / 1e9)
+        self._rows = []
+
+
+_sinks = {}     # ticker -> CsvTickSink
+_sinks_lock = threading.Lock()
+
+
+def open_csv_sink(ticker) -> CsvTickSink:
+    """Return the open sink for `ticker`, creating it if needed."""
+    ticker = ticker.upper()
+    with _sinks_lock:
+        sink = _sinks.get(ticker)
+        if sink is None:
+            sink = _sinks[ticker] = CsvTickSink(ticker)
+        return sink
+
+
+def close_csv_sink(ticker):
+    with _sinks_lock:
+        sink = _sinks.pop(ticker.upper(), None)
+    if sink is not None:
+        sink.close()
+
+
+def close_all_csv_sinks():
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+        _sinks.clear()
+    for sink in sinks:
+        sink.close()
 
 
+atexit.register(close_all_csv_sinks)
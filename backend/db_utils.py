@@ -1,22 +1,416 @@
-from datetime import datetime
-from .mongodb_connect import db
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, PyMongoError
+from .mongodb_connect import get_db
+from .bar_builder import bar_collection_name
+from .metrics import registry, FLUSH_DURATION, PERSIST_LATENCY
 
-def insert_tick_data(ticker: str, ltp: float, ltq: int):
+logger = logging.getLogger(__name__)
+
+# Batching knobs for the background writer (overridable from .env)
+MONGO_BATCH_SIZE = int(os.getenv("MONGO_BATCH_SIZE", "500"))
+MONGO_FLUSH_INTERVAL = float(os.getenv("MONGO_FLUSH_INTERVAL", "1.0"))   # seconds
+MONGO_QUEUE_SIZE = int(os.getenv("MONGO_QUEUE_SIZE", "50000"))
+MONGO_PUT_TIMEOUT = float(os.getenv("MONGO_PUT_TIMEOUT", "0.5"))         # seconds to block when the queue is full
+
+# Storage layout: one plain collection per ticker with string date/time fields
+# ("collections"), or one time-series collection for all tickers ("timeseries")
+MONGO_LAYOUT = os.getenv("MONGO_LAYOUT", "collections").strip().lower()
+TS_COLLECTION = os.getenv("MONGO_TS_COLLECTION", "ticks")
+TS_GRANULARITY = os.getenv("MONGO_TS_GRANULARITY", "seconds")             # seconds | minutes | hours
+TS_EXPIRE_SECONDS = int(os.getenv("MONGO_TS_EXPIRE_SECONDS", "0"))        # 0 = keep forever
+TS_TIME_FIELD = "ts"            # BSON datetime (UTC, millisecond precision)
+TS_META_FIELD = "ticker"
+
+DUPLICATE_KEY = 11000
+
+_FLUSH = object()   # queue marker asking the writer to flush right away
+_STOP = object()    # queue marker asking the writer to flush and exit
+
+
+class MongoTickWriter:
+    """
+    Background writer that collects documents (finished bars; ticks go
+    through sinks.MongoSink and write_ticks) on a bounded queue and
+    writes them with insert_many(ordered=False), one call per collection,
+    whenever `batch_size` documents are pending or `flush_interval` seconds
+    have passed since the last write.
+
+    When the queue is full, `submit` blocks for up to `put_timeout` seconds
+    (slowing the producer down) and then drops the document, counting it.
+    """
+
+    def __init__(self, database, batch_size=MONGO_BATCH_SIZE, flush_interval=MONGO_FLUSH_INTERVAL,
+                 queue_size=MONGO_QUEUE_SIZE, put_timeout=MONGO_PUT_TIMEOUT):
+        self.db = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {"queued": 0, "flushed": 0, "failed": 0, "dropped": 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="mongo-tick-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, collection_name: str, document: dict) -> bool:
+        """Queue a document for writing. Returns False if it had to be dropped."""
+        self.start()
+        try:
+            self._queue.put((collection_name, document, time.monotonic()), timeout=self.put_timeout)
+        except queue.Full:
+            self._count("dropped", 1)
+            return False
+        self._count("queued", 1)
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Write everything queued so far. Returns False if it did not finish within `timeout`."""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put((_FLUSH, done, None), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        """Flush pending documents and stop the writer thread."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put((_STOP, None, None), timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["pending"] = self._queue.qsize()
+        return stats
+
+    def _count(self, name, n):
+        with self._lock:
+            self.stats[name] += n
+
+    def _run(self):
+        pending = {}        # collection name -> [documents]
+        pending_count = 0
+        oldest = None       # enqueue time of the oldest pending document
+        deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if item is not None:
+                target, payload, enqueued = item
+                if target is _FLUSH or target is _STOP:
+                    self._write(pending, oldest)
+                    pending, pending_count, oldest = {}, 0, None
+                    deadline = time.monotonic() + self.flush_interval
+                    if target is _STOP:
+                        return
+                    payload.set()
+                    continue
+
+                pending.setdefault(target, []).append(payload)
+                pending_count += 1
+                if oldest is None:
+                    oldest = enqueued
+
+            if pending_count >= self.batch_size or time.monotonic() >= deadline:
+                self._write(pending, oldest)
+                pending, pending_count, oldest = {}, 0, None
+                deadline = time.monotonic() + self.flush_interval
+
+    def _write(self, pending, oldest=None):
+        for collection_name, documents in pending.items():
+            inserted, failed = write_documents(self.db, collection_name, documents)
+            self._count("flushed", inserted)
+            self._count("failed", failed)
+        if oldest is not None:
+            PERSIST_LATENCY.labels("mongodb").observe(time.monotonic() - oldest)
+
+
+def write_documents(database, collection_name: str, documents: list):
+    """
+    insert_many(ordered=False) into `collection_name`, creating its indexes
+    on first use. Returns (inserted, failed) counts; errors are reported, not raised.
+    """
+    ensure_tick_indexes(database, collection_name)
+    started = time.perf_counter()
+    try:
+        result = database[collection_name].insert_many(documents, ordered=False)
+        FLUSH_DURATION.labels("mongodb").observe(time.perf_counter() - started)
+        return len(result.inserted_ids), 0
+    except BulkWriteError as e:
+        details = e.details or {}
+        errors = details.get("writeErrors", [])
+        # Duplicate _ids are documents a replay already wrote, not failures
+        failed = sum(1 for error in errors if error.get("code") != DUPLICATE_KEY)
+        if failed:
+            logger.error("❌ Bulk insert into %s partially failed: %d error(s)", collection_name, failed)
+        return details.get("nInserted", 0), failed
+    except PyMongoError as e:
+        logger.error("❌ Bulk insert into %s failed (%d docs): %s", collection_name, len(documents), e)
+        return 0, len(documents)
+
+
+# Indexes every tick collection gets the first time this process writes to it
+TICK_INDEXES = [
+    [("date", 1), ("time", 1), ("_id", 1)],     # covers the viewer's (time, _id) sort within a day
+]
+REPLACED_INDEXES = ["date_1_time_1"]            # prefix of the index above; dropped so writes maintain one
+BAR_INDEXES = [
+    [("start", 1)],
+]
+TS_INDEXES = [
+    [(TS_META_FIELD, 1), (TS_TIME_FIELD, -1)],
+]
+# Fields the viewer reads; `_id` is kept only as the paging cursor
+VIEW_PROJECTION = {"_id": 1, "date": 1, "time": 1, "ltp": 1, "ltq": 1}
+TS_VIEW_PROJECTION = {"_id": 1, TS_TIME_FIELD: 1, "ltp": 1, "ltq": 1}
+
+_indexed_collections = set()
+
+
+def ensure_tick_indexes(database, collection_name: str):
+    """Create the tick (or bar) indexes on `collection_name` once per process (create_index is idempotent)."""
+    if collection_name in _indexed_collections:
+        return
+    if collection_name == TS_COLLECTION:
+        ensure_timeseries_collection(database, collection_name)
+        return
+    indexes = BAR_INDEXES if is_bar_collection(collection_name) else TICK_INDEXES
+    try:
+        collection = database[collection_name]
+        for keys in indexes:
+            collection.create_index(keys)
+        if indexes is TICK_INDEXES:
+            for name in set(REPLACED_INDEXES) & set(collection.index_information()):
+                collection.drop_index(name)
+        _indexed_collections.add(collection_name)
+    except PyMongoError as e:
+        logger.warning("⚠️ Could not create indexes on %s: %s", collection_name, e)
+
+
+def ensure_timeseries_collection(database, collection_name: str = TS_COLLECTION):
+    """
+    Create the time-series tick collection (timeField "ts", metaField
+    "ticker") if it does not exist, apply the configured expiry, and add the
+    (ticker, ts) index used by the viewer. Runs once per process.
+    """
+    if collection_name in _indexed_collections:
+        return
+    try:
+        if collection_name not in database.list_collection_names(filter={"name": collection_name}):
+            options = {"timeseries": {"timeField": TS_TIME_FIELD, "metaField": TS_META_FIELD,
+                                      "granularity": TS_GRANULARITY}}
+            if TS_EXPIRE_SECONDS:
+                options["expireAfterSeconds"] = TS_EXPIRE_SECONDS
+            database.create_collection(collection_name, **options)
+            logger.info("🗂️ Created time-series collection %s (granularity %s)", collection_name, TS_GRANULARITY)
+        elif TS_EXPIRE_SECONDS:
+            database.command("collMod", collection_name, expireAfterSeconds=TS_EXPIRE_SECONDS)
+        for keys in TS_INDEXES:
+            database[collection_name].create_index(keys)
+        _indexed_collections.add(collection_name)
+    except PyMongoError as e:
+        logger.warning("⚠️ Could not prepare time-series collection %s: %s", collection_name, e)
+
+
+def is_bar_collection(collection_name: str) -> bool:
+    return "_bars_" in collection_name
+
+
+def _time_range_query(ticker: str, start: datetime = None, end: datetime = None) -> dict:
+    query = {TS_META_FIELD: ticker}
+    if start or end:
+        query[TS_TIME_FIELD] = {}
+        if start:
+            query[TS_TIME_FIELD]["$gte"] = start
+        if end:
+            query[TS_TIME_FIELD]["$lt"] = end
+    return query
+
+
+def fetch_tick_range(collection, ticker: str, start: datetime = None, end: datetime = None,
+                     page_size: int = 100, before=None):
     """
-    Insert a single tick data point into the MongoDB Atlas collection for the given ticker.
-    Each ticker gets its own collection.
+    One page of a ticker's ticks in [start, end) from the time-series
+    collection, newest first, keyset-paginated on (ts, _id) and served by the
+    (ticker, ts) index. Returns (documents, next_cursor).
     """
-    collection_name = ticker.replace('.', '_')  # e.g., TCS_NSE
-    collection = db[collection_name]
+    query = _time_range_query(ticker, start, end)
+    if before is not None:
+        last_ts, last_id = before
+        query["$or"] = [{TS_TIME_FIELD: {"$lt": last_ts}}, {TS_TIME_FIELD: last_ts, "_id": {"$lt": last_id}}]
 
-    document = {
+    documents = list(collection.find(query, TS_VIEW_PROJECTION)
+                     .sort([(TS_TIME_FIELD, -1), ("_id", -1)]).limit(page_size))
+    if len(documents) < page_size:
+        return documents, None
+    return documents, (documents[-1][TS_TIME_FIELD], documents[-1]["_id"])
+
+
+def delete_tick_range(collection, ticker: str, start: datetime, end: datetime) -> int:
+    """Delete a ticker's ticks in [start, end) (needs MongoDB 7.0+ on time-series collections)."""
+    return collection.delete_many(_time_range_query(ticker, start, end)).deleted_count
+
+
+def list_timeseries_tickers(collection) -> list:
+    return sorted(collection.distinct(TS_META_FIELD))
+
+
+def fetch_tick_page(collection, date_str: str = None, page_size: int = 100, before=None):
+    """
+    One page of ticks, newest first, using keyset pagination instead of skip:
+    the next page starts strictly after the last row of this one.
+
+    With `date_str` ("%d-%m-%Y") the page is ordered by (time, _id) and served
+    by the (date, time, _id) index; without it, by `_id` (insertion order).
+    Returns (documents, next_cursor); next_cursor is None on the last page.
+    """
+    query = {}
+    if date_str:
+        query["date"] = date_str
+        sort = [("time", -1), ("_id", -1)]
+    else:
+        sort = [("_id", -1)]
+
+    if before is not None:
+        if date_str:
+            last_time, last_id = before
+            query["$or"] = [{"time": {"$lt": last_time}}, {"time": last_time, "_id": {"$lt": last_id}}]
+        else:
+            query["_id"] = {"$lt": before}
+
+    documents = list(collection.find(query, VIEW_PROJECTION).sort(sort).limit(page_size))
+    return documents, next_page_cursor(documents, page_size, date_str)
+
+
+def next_page_cursor(documents, page_size: int, date_str: str = None):
+    """Cursor for the page after `documents`, or None if it was the last page."""
+    if len(documents) < page_size:
+        return None
+    last = documents[-1]
+    return (last["time"], last["_id"]) if date_str else last["_id"]
+
+
+def fetch_ticks_since(collection, after_id, date_str: str = None, limit: int = 10000):
+    """Ticks inserted after `after_id`, newest first (for refreshing a page already on screen)."""
+    query = {"_id": {"$gt": after_id}}
+    if date_str:
+        query["date"] = date_str
+    return list(collection.find(query, VIEW_PROJECTION).sort("_id", -1).limit(limit))
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_tick_writer() -> MongoTickWriter:
+    """Return the process-wide writer, creating it on first use."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = MongoTickWriter(get_db())
+            atexit.register(_writer.close)
+        return _writer
+
+
+def tick_collection_name(ticker: str) -> str:
+    if MONGO_LAYOUT == "timeseries":
+        return TS_COLLECTION
+    return ticker.replace('.', '_')  # e.g., TCS_NSE
+
+
+def tick_document(ticker: str, ltp: float, ltq: int, timestamp_ns: int = None) -> dict:
+    if MONGO_LAYOUT == "timeseries":
+        ts = datetime.now(timezone.utc) if timestamp_ns is None else \
+            datetime.fromtimestamp(timestamp_ns / 1e9, timezone.utc)
+        return {TS_TIME_FIELD: ts, TS_META_FIELD: ticker, "ltp": ltp, "ltq": ltq}
+
+    now = datetime.now() if timestamp_ns is None else datetime.fromtimestamp(timestamp_ns / 1e9)
+    return {
         "ticker": ticker,
-        "date": datetime.now().strftime("%d-%m-%Y"),
-        "time": datetime.now().strftime("%H:%M:%S"),
+        "date": now.strftime("%d-%m-%Y"),
+        "time": now.strftime("%H:%M:%S"),
         "ltp": ltp,
         "ltq": ltq
     }
-    collection.insert_one(document)
-    print(f"📥 Inserted tick data into MongoDB for {ticker}: {document}")
 
 
+def write_ticks(ticks):
+    """
+    Write a batch of Ticks synchronously, one insert_many per collection,
+    with each tick's capture id as _id: ids increase in capture order (the
+    live tail and the viewer page by _id), and a retried batch is not
+    duplicated in plain collections (time-series collections have no unique
+    _id index, so there a retry is at-least-once). Raises RuntimeError if
+    any tick was not stored.
+    """
+    _write_tick_documents((tick, ObjectId(tick.capture_id)) for tick in ticks)
+
+
+def write_spooled_ticks(records, record_id):
+    """
+    Write a batch of spooled (seq, Tick) records like `write_ticks`, with
+    each _id derived from the spool sequence number by `record_id(seq, ts_ns)`
+    so replaying a batch after a crash does not duplicate it.
+    """
+    _write_tick_documents((tick, ObjectId(record_id(seq, tick.ts_ns))) for seq, tick in records)
+
+
+def _write_tick_documents(ticks_with_ids):
+    batches = {}
+    for tick, object_id in ticks_with_ids:
+        document = tick_document(tick.ticker, tick.ltp, tick.quantity, tick.ts_ns)
+        document["_id"] = object_id
+        batches.setdefault(tick_collection_name(tick.ticker), []).append(document)
+
+    database = get_db()
+    for collection_name, documents in batches.items():
+        _, failed = write_documents(database, collection_name, documents)
+        if failed:
+            raise RuntimeError(f"{failed} of {len(documents)} ticks not written to {collection_name}")
+
+
+def flush_bar_data(timeout: float = 5.0) -> bool:
+    """Block until every queued bar has been written (or `timeout` expires)."""
+    if _writer is None:
+        return True
+    return _writer.flush(timeout)
+
+
+registry.gauge(
+    "recorder_mongo_writer_documents", "Background Mongo writer counters and queue depth", ["stat"],
+    callback=lambda: {(name,): value for name, value in get_tick_writer_stats().items()},
+)
+
+
+def get_tick_writer_stats() -> dict:
+    """Counters for queued, flushed, failed and dropped documents."""
+    if _writer is None:
+        return {"queued": 0, "flushed": 0, "failed": 0, "dropped": 0, "pending": 0}
+    return _writer.get_stats()
+
+
+def insert_bar_data(bar):
+    """Queue a finished backend.bar_builder.Bar for its <ticker>_bars_<interval> collection."""
+    return get_tick_writer().submit(bar_collection_name(bar.ticker, bar.interval), bar.to_document())
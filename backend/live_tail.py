@@ -0,0 +1,151 @@
+# live_tail.py
+
+import csv
+import io
+import os
+from collections import deque
+from datetime import timezone
+
+LIVE_COLUMNS = ["date", "time", "ltp", "ltq"]
+
+
+class LiveTickBuffer:
+    """Bounded ring buffer of the most recent tick rows (oldest rows fall off)."""
+
+    def __init__(self, capacity=2000):
+        self.rows = deque(maxlen=capacity)
+
+    def extend(self, rows):
+        self.rows.extend(rows)
+
+    def newest_first(self):
+        return list(reversed(self.rows))
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class MongoTail:
+    """
+    Follows a tick collection by remembering the last `_id` seen. Each poll
+    is one indexed range query for documents inserted since then.
+    """
+
+    PROJECTION = {"_id": 1, "date": 1, "time": 1, "ltp": 1, "ltq": 1}
+
+    def __init__(self, collection, date_str=None, batch_size=5000):
+        self.collection = collection
+        self.date_str = date_str
+        self.batch_size = batch_size
+        self.last_id = None
+
+    def poll(self, initial_rows=500):
+        """Return new rows (oldest first); the first call returns the latest `initial_rows`."""
+        query = {"date": self.date_str} if self.date_str else {}
+
+        if self.last_id is None:
+            docs = list(self.collection.find(query, self.PROJECTION).sort("_id", -1).limit(initial_rows))
+            docs.reverse()
+        else:
+            query["_id"] = {"$gt": self.last_id}
+            docs = list(self.collection.find(query, self.PROJECTION).sort("_id", 1).limit(self.batch_size))
+
+        if docs:
+            self.last_id = docs[-1]["_id"]
+        return [{k: doc.get(k) for k in LIVE_COLUMNS} for doc in docs]
+
+
+class TimeSeriesTail:
+    """
+    Follows one ticker in the time-series collection by its last timestamp
+    (time-series collections have no _id index). Rows sharing the last
+    millisecond are remembered by _id so they are not returned twice.
+    """
+
+    PROJECTION = {"_id": 1, "ts": 1, "ltp": 1, "ltq": 1}
+
+    def __init__(self, collection, ticker, batch_size=5000):
+        self.collection = collection
+        self.ticker = ticker
+        self.batch_size = batch_size
+        self.last_ts = None
+        self.seen_at_last_ts = set()
+
+    def poll(self, initial_rows=500):
+        """Return new rows (oldest first); the first call returns the latest `initial_rows`."""
+        query = {"ticker": self.ticker}
+        if self.last_ts is None:
+            docs = list(self.collection.find(query, self.PROJECTION).sort("ts", -1).limit(initial_rows))
+            docs.reverse()
+        else:
+            query["ts"] = {"$gte": self.last_ts}
+            docs = list(self.collection.find(query, self.PROJECTION).sort("ts", 1).limit(self.batch_size))
+            docs = [d for d in docs if not (d["ts"] == self.last_ts and d["_id"] in self.seen_at_last_ts)]
+
+        if docs:
+            newest = docs[-1]["ts"]
+            if newest != self.last_ts:
+                self.seen_at_last_ts = set()
+            self.last_ts = newest
+            self.seen_at_last_ts.update(d["_id"] for d in docs if d["ts"] == newest)
+
+        rows = []
+        for doc in docs:
+            local = doc["ts"].replace(tzinfo=timezone.utc).astimezone()
+            rows.append({"date": local.strftime("%d-%m-%Y"), "time": local.strftime("%H:%M:%S"),
+                         "ltp": doc.get("ltp"), "ltq": doc.get("ltq")})
+        return rows
+
+
+class CsvTail:
+    """
+    Follows a tick CSV file by byte offset, reading only what was appended
+    since the last poll. A partially written last line is kept until it is
+    completed. On the first poll, or if the file shrinks or is replaced, only
+    its last few hundred rows are read.
+    """
+
+    BYTES_PER_ROW = 64      # generous estimate used to seek back for the initial rows
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.offset = 0
+        self._inode = None
+        self._partial = b""
+
+    def poll(self, initial_rows=500):
+        """Return rows appended since the last call (oldest first)."""
+        try:
+            stat = os.stat(self.filepath)
+        except FileNotFoundError:
+            return []
+
+        skip_first_line = False
+        if self._inode != stat.st_ino or stat.st_size < self.offset:
+            # New or replaced file: start near the end instead of scanning it all
+            self._inode = stat.st_ino
+            self.offset = max(0, stat.st_size - initial_rows * self.BYTES_PER_ROW)
+            self._partial = b""
+            skip_first_line = self.offset > 0
+        if stat.st_size == self.offset:
+            return []
+
+        with open(self.filepath, "rb") as f:
+            f.seek(self.offset)
+            chunk = f.read(stat.st_size - self.offset)
+        self.offset += len(chunk)
+
+        if skip_first_line:
+            chunk = chunk[chunk.find(b"\n") + 1:]
+
+        data = self._partial + chunk
+        cut = data.rfind(b"\n") + 1
+        self._partial = data[cut:]
+
+        rows = []
+        for record in csv.reader(io.StringIO(data[:cut].decode("utf-8"))):
+            if len(record) < 5 or record[0] == "Ticker":
+                continue
+            rows.append({"date": record[1], "time": record[2], "ltp": float(record[3]), "ltq": int(record[4])})
+
+        return rows
@@ -0,0 +1,276 @@
+# metrics.py
+
+import bisect
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Seconds; spans sub-millisecond dispatch up to multi-second storage stalls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)     # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        """Approximate quantile (upper bound of the bucket it falls in)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **kwargs):
+        """Child for one label set. Look it up once and keep it on hot paths."""
+        key = tuple(kwargs[n] for n in self.labelnames) if kwargs else tuple(values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def remove(self, *values):
+        with self._lock:
+            self._children.pop(tuple(values), None)
+
+    def samples(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def _new_child(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), callback=None):
+        """`callback()` (optional) returns {label tuple: value} and is read at scrape time."""
+        super().__init__(name, help_text, labelnames)
+        self.callback = callback
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def samples(self):
+        if self.callback is None:
+            return super().samples()
+        try:
+            values = self.callback()
+        except Exception as e:
+            logger.warning("Gauge %s callback failed: %s", self.name, e)
+            return []
+        return [(key, _gauge_value(value)) for key, value in values.items()]
+
+
+def _gauge_value(value):
+    child = _GaugeChild()
+    child.value = value
+    return child
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing     # modules re-imported by Streamlit reruns keep the original
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=(), callback=None):
+        return self.register(Gauge(name, help_text, labelnames, callback))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for key, child in metric.samples():
+                labels = _format_labels(metric.labelnames, key)
+                if metric.kind == "histogram":
+                    cumulative = 0
+                    for bound, n in zip(list(metric.buckets) + ["+Inf"], child.counts):
+                        cumulative += n
+                        le = _format_labels(metric.labelnames + ("le",), key + (str(bound),))
+                        lines.append(f"{metric.name}_bucket{le} {cumulative}")
+                    lines.append(f"{metric.name}_sum{labels} {child.sum}")
+                    lines.append(f"{metric.name}_count{labels} {child.count}")
+                else:
+                    lines.append(f"{metric.name}{labels} {child.value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """{metric name: {label tuple: value}} for in-process display; histograms give count/sum/p50/p99."""
+        result = {}
+        for metric in self.metrics():
+            values = {}
+            for key, child in metric.samples():
+                if metric.kind == "histogram":
+                    values[key] = {"count": child.count, "sum": child.sum,
+                                   "p50": child.quantile(0.5), "p99": child.quantile(0.99)}
+                else:
+                    values[key] = child.value
+            result[metric.name] = values
+        return result
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+registry = Registry()
+
+# --- Recorder metrics ---
+TICKS_RECEIVED = registry.counter("recorder_ticks_received_total", "Raw ticks received from the socket", ["ticker"])
+TICKS_STORED = registry.counter("recorder_ticks_stored_total", "Ticks handed to the storage sink", ["ticker"])
+TICKS_DROPPED = registry.counter("recorder_ticks_dropped_total", "Ticks not stored, by reason", ["ticker", "reason"])
+LAST_TICK_TIME = registry.gauge("recorder_last_tick_timestamp_seconds", "Epoch time of the last received tick", ["ticker"])
+DISPATCH_LATENCY = registry.histogram("recorder_dispatch_latency_seconds", "Socket callback to tick handler")
+PERSIST_LATENCY = registry.histogram("recorder_persist_latency_seconds",
+                                     "Oldest tick in a batch: receive time to storage flush", ["sink"])
+FLUSH_DURATION = registry.histogram("recorder_storage_flush_seconds", "Time spent writing one batch", ["sink"])
+
+
+# --- HTTP endpoint ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics endpoint: " + format, *args)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Serve /metrics on a local port from a daemon thread (idempotent). Returns the server or None."""
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            logger.warning("Metrics endpoint not started on %s:%s: %s", host, port, e)
+            return None
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info("📊 Metrics at http://%s:%s/metrics", host, port)
+        return _server
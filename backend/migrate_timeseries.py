@@ -0,0 +1,202 @@
+# migrate_timeseries.py
+#
+# Copy legacy tick storage into the MongoDB time-series collection:
+#     python -m backend.migrate_timeseries --mongo            # every per-ticker collection
+#     python -m backend.migrate_timeseries --csv data/*.csv   # recorded CSV files
+# Then set MONGO_LAYOUT=timeseries. Sources are left untouched and read in
+# batches of MIGRATE_BATCH_SIZE. Progress is recorded in the "_ts_migrations"
+# collection after every batch, so an interrupted run resumes where it
+# stopped; finished sources are skipped on later runs unless --force is given.
+
+import argparse
+import csv
+import glob
+import hashlib
+import io
+import itertools
+import logging
+import os
+from datetime import datetime, timezone
+import pandas as pd
+from bson import ObjectId
+from backend.bar_builder import CSV_DTYPES, MONGO_TICK_PROJECTION, csv_ticks_frame, mongo_ticks_frame
+from backend.csv_utils import CSV_HEADER
+from backend.db_utils import (
+    TS_COLLECTION, TS_META_FIELD, TS_TIME_FIELD, ensure_timeseries_collection, is_bar_collection, write_documents,
+)
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = "_ts_migrations"
+MIGRATE_BATCH_SIZE = int(os.getenv("MIGRATE_BATCH_SIZE", "5000"))
+
+
+def ticks_to_timeseries_documents(ticks: pd.DataFrame, ids=None) -> list:
+    """ticker/timestamp/ltp/ltq rows (naive local timestamps, as recorded) -> time-series documents."""
+    if ticks.empty:
+        return []
+    local_tz = datetime.now().astimezone().tzinfo
+    ts = pd.to_datetime(ticks["timestamp"]).dt.tz_localize(local_tz).dt.tz_convert(timezone.utc)
+    documents = [
+        {TS_TIME_FIELD: t.to_pydatetime(), TS_META_FIELD: ticker, "ltp": float(ltp), "ltq": int(ltq)}
+        for t, ticker, ltp, ltq in zip(ts, ticks["ticker"], ticks["ltp"], ticks["ltq"])
+    ]
+    if ids is not None:
+        for document, _id in zip(documents, ids):
+            document["_id"] = _id
+    return documents
+
+
+def row_object_id(source: str, row: int) -> ObjectId:
+    """Stable _id for row `row` of a source without ids of its own (CSV files)."""
+    return ObjectId(hashlib.blake2b(f"{source}:{row}".encode(), digest_size=12).digest())
+
+
+def _csv_batches(path, source, resume, batch_size):
+    """
+    Yield (ticks, ids, resume point) per `batch_size` lines of a recorded CSV.
+    Ids and the resume point count physical lines after the header, so blank
+    lines and stray log output in the file keep them stable between runs.
+    """
+    row = resume.get("row", 0)
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        f.readline()    # header
+        lines = itertools.islice(f, row, None)
+        while True:
+            chunk = list(itertools.islice(lines, batch_size))
+            if not chunk:
+                return
+            ticks = csv_ticks_frame(_csv_lines_frame(chunk), path)
+            ids = [row_object_id(source, row + int(i)) for i in ticks.index]
+            row += len(chunk)
+            yield ticks, ids, {"row": row}
+
+
+def _csv_lines_frame(lines) -> pd.DataFrame:
+    """Ticker..LTQ columns of the lines with the recorder's 5 fields, indexed by line position; others are skipped."""
+    kept = [i for i, line in enumerate(lines) if line.count(",") == len(CSV_HEADER) - 1]
+    df = pd.read_csv(io.StringIO("".join(lines[i] for i in kept)), header=None, names=CSV_HEADER,
+                     dtype=CSV_DTYPES, quoting=csv.QUOTE_NONE) if kept else pd.DataFrame(columns=CSV_HEADER)
+    df.index = kept
+    return df
+
+
+def _collection_batches(collection, resume, batch_size):
+    """Yield (ticks, ids, resume point) per batch of a collection in _id order; source _ids are kept."""
+    query = {"_id": {"$gt": resume["last_id"]}} if resume.get("last_id") is not None else {}
+    cursor = collection.find(query, MONGO_TICK_PROJECTION).sort("_id", 1).batch_size(batch_size)
+    batch = []
+    for document in cursor:
+        batch.append(document)
+        if len(batch) == batch_size:
+            yield _collection_batch(batch)
+            batch = []
+    if batch:
+        yield _collection_batch(batch)
+
+
+def _collection_batch(documents):
+    ticks = mongo_ticks_frame(documents)
+    return ticks, [documents[int(i)]["_id"] for i in ticks.index], {"last_id": documents[-1]["_id"]}
+
+
+def _migrate(database, source: str, batches, force: bool) -> int:
+    """
+    Insert one source's batches, recording the resume point after each.
+    `batches(resume)` yields (ticks, ids, next resume point). Returns the
+    inserted count.
+
+    Ids are deterministic (the source's own _id, or one derived from the CSV
+    row), so a batch that may have been partly inserted before a crash is
+    deleted by id before it is inserted again.
+    """
+    done = database[MIGRATIONS_COLLECTION]
+    state = done.find_one({"_id": source})
+    if state and state.get("done", True) and not force:     # records of older runs only exist when done
+        logger.info("⏭️ %s already migrated", source)
+        return 0
+    resuming = bool(state) and not state.get("done", True) and not force
+    resume = state.get("resume", {}) if resuming else {}
+    inserted = state.get("inserted", 0) if resuming else 0
+    if resuming:
+        logger.info("♻️ %s: resuming after %d ticks", source, inserted)
+    else:
+        done.replace_one({"_id": source}, {"_id": source, "done": False, "resume": {}, "inserted": 0}, upsert=True)
+
+    # Batches that may already be (partly) in the collection are deleted by id first:
+    # the first one after a crash, or all of them when --force migrates a source again
+    clean = resuming or force
+    failed = 0
+    for ticks, ids, next_resume in batches(resume):
+        documents = ticks_to_timeseries_documents(ticks, ids)
+        if documents:
+            if clean:
+                database[TS_COLLECTION].delete_many({"_id": {"$in": ids}})
+                clean = force
+            ok, bad = write_documents(database, TS_COLLECTION, documents)
+            if bad:
+                failed += bad
+                break       # keep the resume point before this batch
+            inserted += ok
+        done.replace_one({"_id": source}, {"_id": source, "done": False, "resume": next_resume,
+                                           "inserted": inserted}, upsert=True)
+
+    if failed:
+        logger.error("❌ %s: %d inserted, %d failed; rerun to resume", source, inserted, failed)
+    else:
+        done.replace_one({"_id": source}, {"_id": source, "done": True, "inserted": inserted,
+                                           "migrated_at": datetime.now(timezone.utc)}, upsert=True)
+        logger.info("✅ %s: %d ticks migrated", source, inserted)
+    return inserted
+
+
+def migrate_collections(database, names=None, force=False, batch_size=MIGRATE_BATCH_SIZE) -> dict:
+    """Migrate per-ticker collections (default: every tick collection in the database)."""
+    ensure_timeseries_collection(database)
+    if names is None:
+        names = sorted(n for n in database.list_collection_names()
+                       if n not in (TS_COLLECTION, MIGRATIONS_COLLECTION)
+                       and not n.startswith("system.") and not is_bar_collection(n))
+    return {name: _migrate(database, f"mongo:{name}",
+                           lambda resume, name=name: _collection_batches(database[name], resume, batch_size), force)
+            for name in names}
+
+
+def migrate_csvs(database, paths=None, force=False, batch_size=MIGRATE_BATCH_SIZE) -> dict:
+    """Migrate recorded tick CSVs (default: data/*.csv)."""
+    ensure_timeseries_collection(database)
+    paths = paths or sorted(glob.glob(os.path.join("data", "*.csv")))
+    result = {}
+    for path in paths:
+        source = f"csv:{os.path.abspath(path)}"
+        try:
+            result[path] = _migrate(database, source,
+                                    lambda resume: _csv_batches(path, source, resume, batch_size), force)
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️ Skipping %s: %s", path, e)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy legacy tick storage into the time-series collection")
+    parser.add_argument("--mongo", nargs="*", metavar="COLLECTION",
+                        help="per-ticker collections to migrate (no names = all)")
+    parser.add_argument("--csv", nargs="*", metavar="PATH", help="CSV files to migrate (no paths = data/*.csv)")
+    parser.add_argument("--force", action="store_true", help="migrate sources already recorded as done")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.mongo is None and args.csv is None:
+        parser.error("nothing to migrate: pass --mongo and/or --csv")
+
+    from backend.mongodb_connect import get_db
+    database = get_db()
+    if args.mongo is not None:
+        migrate_collections(database, args.mongo or None, args.force)
+    if args.csv is not None:
+        migrate_csvs(database, args.csv or None, args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,78 @@
 # mongodb_connect.py
 
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
-from dotenv import load_dotenv
+import logging
 import os
+import threading
+from backend.config import load_env
 
-# Load all variables from .env
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+load_env()
 
 # Fetch the URI from environment
 uri = os.getenv("MONGO_URI")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "TickDatabase")
+
+# Client tuning (overridable from .env)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "20000"))
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")         # e.g. "zstd,snappy,zlib"; empty = none
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Process-wide MongoClient, created on first use. Construction does not
+    block: pymongo connects in the background, and the first operation waits
+    at most MONGO_SERVER_SELECTION_TIMEOUT_MS for a server.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                from pymongo.mongo_client import MongoClient
+                from pymongo.server_api import ServerApi
+
+                options = {
+                    "server_api": ServerApi('1'),
+                    "maxPoolSize": MONGO_MAX_POOL_SIZE,
+                    "minPoolSize": MONGO_MIN_POOL_SIZE,
+                    "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+                    "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                    "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+                }
+                if MONGO_COMPRESSORS:
+                    options["compressors"] = MONGO_COMPRESSORS
+                _client = MongoClient(uri, **options)
+    return _client
+
+
+def get_db():
+    """The tick database on the shared client."""
+    return get_client()[MONGO_DB_NAME]
+
 
-# Initialize client
-client = MongoClient(uri, server_api=ServerApi('1'))
+def ping() -> bool:
+    """Blocking connectivity check, for callers that want one explicitly."""
+    try:
+        get_client().admin.command('ping')
+        logger.info("✅ Connected to MongoDB Atlas!")
+        return True
+    except Exception as e:
+        logger.error("❌ MongoDB connection failed: %s", e)
+        return False
 
-try:
-    client.admin.command('ping')
-    print("✅ Connected to MongoDB Atlas!")
-except Exception as e:
-    print("❌ MongoDB connection failed:", e)
 
-# Define DB
-db = client["TickDatabase"]
+def __getattr__(name):
+    # `from backend.mongodb_connect import db` keeps working, but only builds
+    # the client when something actually asks for it.
+    if name == "client":
+        return get_client()
+    if name == "db":
+        return get_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,197 @@
+# parquet_utils.py
+
+import atexit
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import pyarrow as pa
+import pyarrow.parquet as pq
+from backend.metrics import FLUSH_DURATION, PERSIST_LATENCY
+
+PARQUET_FOLDER = os.path.join("data", "parquet")
+PARQUET_BATCH_ROWS = int(os.getenv("PARQUET_BATCH_ROWS", "5000"))
+PARQUET_FLUSH_INTERVAL = float(os.getenv("PARQUET_FLUSH_INTERVAL", "10"))   # seconds
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+
+LOCAL_TZ = datetime.now().astimezone().tzinfo
+
+# `date` (local day) and `ticker` live in the partition path, not in the files;
+# `timestamp` is the UTC receive time
+TICK_SCHEMA = pa.schema([
+    pa.field("timestamp", pa.timestamp("ns", tz="UTC")),
+    pa.field("ltp", pa.float64()),
+    pa.field("ltq", pa.int64()),
+])
+
+
+class ParquetTickWriter:
+    """
+    Buffers ticks for one ticker in columnar lists and appends them as Arrow
+    record batches (one row group each) to a Parquet file partitioned as
+
+        data/parquet/date=YYYY-MM-DD/ticker=SYMBOL.EXCHANGE/part-HHMMSS.parquet
+
+    A batch is written every `batch_rows` ticks or `flush_interval` seconds.
+    The file is closed (footer written) on day change and on `close()`.
+    """
+
+    def __init__(self, ticker, folder=PARQUET_FOLDER, batch_rows=PARQUET_BATCH_ROWS,
+                 flush_interval=PARQUET_FLUSH_INTERVAL, compression=PARQUET_COMPRESSION):
+        self.ticker = ticker.upper()
+        self.folder = folder
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.compression = compression
+        self._lock = threading.Lock()
+        self._writer = None
+        self._date = None
+        self._last_flush = time.monotonic()
+        self._reset_buffer()
+
+    def _reset_buffer(self):
+        self._timestamps = []
+        self._ltps = []
+        self._ltqs = []
+
+    def write(self, ts_ns: int, ltp: float, ltq: int):
+        day = datetime.fromtimestamp(ts_ns // 1_000_000_000).date()
+        with self._lock:
+            if self._date is not None and day != self._date:
+                self._flush_locked()
+                self._close_file_locked()
+
+            self._timestamps.append(ts_ns)
+            self._ltps.append(ltp)
+            self._ltqs.append(ltq)
+
+            if self._date is None:
+                self._date = day
+
+            if (len(self._ltps) >= self.batch_rows
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._close_file_locked()
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._ltps:
+            return
+
+        started = time.perf_counter()
+        oldest_ns = self._timestamps[0]
+        batch = pa.record_batch([
+            pa.array(self._timestamps, type=TICK_SCHEMA.field("timestamp").type),
+            pa.array(self._ltps, type=pa.float64()),
+            pa.array(self._ltqs, type=pa.int64()),
+        ], schema=TICK_SCHEMA)
+        self._reset_buffer()
+
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self._new_file_path(), TICK_SCHEMA, compression=self.compression)
+        self._writer.write_batch(batch)
+        FLUSH_DURATION.labels("parquet").observe(time.perf_counter() - started)
+        PERSIST_LATENCY.labels("parquet").observe((time.time_ns() - oldest_ns) / 1e9)
+
+    def _close_file_locked(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._date = None
+
+    def _new_file_path(self):
+        partition = os.path.join(self.folder, f"date={self._date.isoformat()}", f"ticker={self.ticker}")
+        os.makedirs(partition, exist_ok=True)
+        stamp = datetime.now().strftime("%H%M%S")
+        path = os.path.join(partition, f"part-{stamp}.parquet")
+        n = 1
+        while os.path.exists(path):
+            path = os.path.join(partition, f"part-{stamp}-{n}.parquet")
+            n += 1
+        return path
+
+
+_writers = {}       # ticker -> ParquetTickWriter
+_writers_lock = threading.Lock()
+
+
+def open_parquet_writer(ticker) -> ParquetTickWriter:
+    """Return the open writer for `ticker`, creating it if needed."""
+    ticker = ticker.upper()
+    with _writers_lock:
+        writer = _writers.get(ticker)
+        if writer is None:
+            writer = _writers[ticker] = ParquetTickWriter(ticker)
+        return writer
+
+
+def close_parquet_writer(ticker):
+    """Flush and finalize the open Parquet file for `ticker`, if any."""
+    with _writers_lock:
+        writer = _writers.pop(ticker.upper(), None)
+    if writer is not None:
+        writer.close()
+
+
+def close_all_parquet_writers():
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+
+atexit.register(close_all_parquet_writers)
+
+
+def list_parquet_tickers(folder=PARQUET_FOLDER) -> list:
+    """Tickers with at least one partition, from the ticker=... directory names."""
+    import glob
+    return sorted({os.path.basename(path).split("=", 1)[1]
+                   for path in glob.glob(os.path.join(folder, "date=*", "ticker=*"))})
+
+
+PARTITION_SCHEMA = pa.schema([pa.field("date", pa.string()), pa.field("ticker", pa.string())])
+
+
+def read_parquet_ticks(tickers=None, start_date=None, end_date=None, folder=PARQUET_FOLDER):
+    """
+    Load recorded ticks as a pandas DataFrame with naive local timestamps
+    (like the CSVs), pruning partitions by ticker and local date
+    (`start_date`/`end_date` are datetime.date, inclusive).
+    """
+    import pyarrow.dataset as ds
+
+    # The explicit schema also reads files from before timestamps were tz-aware (naive UTC)
+    dataset = ds.dataset(folder, format="parquet", schema=pa.unify_schemas([TICK_SCHEMA, PARTITION_SCHEMA]),
+                         partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"))
+    conditions = []
+    if tickers:
+        conditions.append(ds.field("ticker").isin([t.upper() for t in tickers]))
+    if start_date is not None:
+        conditions.append(ds.field("date") >= start_date.isoformat())
+        conditions.append(ds.field("timestamp") >= _utc_scalar(datetime.combine(start_date, datetime.min.time())))
+    if end_date is not None:
+        conditions.append(ds.field("date") <= end_date.isoformat())
+        day_after = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+        conditions.append(ds.field("timestamp") < _utc_scalar(day_after))
+
+    expr = None
+    for cond in conditions:
+        expr = cond if expr is None else expr & cond
+    df = dataset.to_table(filter=expr).to_pandas()
+    df["timestamp"] = df["timestamp"].dt.tz_convert(LOCAL_TZ).dt.tz_localize(None)
+    return df
+
+
+def _utc_scalar(local: datetime):
+    """A naive local datetime as a timestamp[ns, UTC] scalar for dataset filters."""
+    return pa.scalar(local.replace(tzinfo=LOCAL_TZ), TICK_SCHEMA.field("timestamp").type)
@@ -0,0 +1,254 @@
+# recorder.py
+#
+# Headless recorder daemon:
+#     python -m backend.recorder --watchlist watchlist.txt --storage csv,mongodb
+# The access token comes from ACCESS_TOKEN (or the file named by
+# ACCESS_TOKEN_FILE); everything else from .env as usual. Set
+# RECORDER_ENGINE=daemon for streamlit_app.py to control it over local IPC,
+# authenticated with RECORDER_API_AUTHKEY or a random key generated into
+# ~/.stocko/recorder.key that clients on the same machine read.
+#
+# Signals: SIGTERM/SIGINT stop every recording, flush the sinks and exit;
+# SIGHUP reloads the watchlist (starts added tickers, stops removed ones).
+
+import argparse
+import ipaddress
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from multiprocessing.managers import BaseManager
+from backend import config
+from backend.config import ipc_authkey, load_env, parse_sinks
+from backend.watchlist import load_watchlist
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+RECORDER_API_HOST = os.getenv("RECORDER_API_HOST", "127.0.0.1")
+RECORDER_API_PORT = int(os.getenv("RECORDER_API_PORT", "50052"))
+# RECORDER_API_AUTHKEY, else a random key generated into RECORDER_API_AUTHKEY_FILE
+RECORDER_API_AUTHKEY_FILE = os.getenv("RECORDER_API_AUTHKEY_FILE", os.path.join("~", ".stocko", "recorder.key"))
+
+
+def recorder_authkey() -> bytes:
+    """Read (or create) the key when serving or connecting, not when the module is imported."""
+    return ipc_authkey("RECORDER_API_AUTHKEY", RECORDER_API_AUTHKEY_FILE)
+
+
+def is_loopback(host: str) -> bool:
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+def read_access_token():
+    """ACCESS_TOKEN, or the first line of ACCESS_TOKEN_FILE; None if neither is set."""
+    token = os.getenv("ACCESS_TOKEN", "").strip()
+    path = os.getenv("ACCESS_TOKEN_FILE")
+    if not token and path and os.path.exists(path):
+        with open(path) as f:
+            token = f.readline().strip()
+    return token or None
+
+
+class RecorderDaemon:
+    """
+    One recording engine (ws_recorder's threads, or the asyncio service) in
+    a long-lived process. The methods below are what local clients call
+    through RecorderManager; they mirror ShardSupervisor's, so the UI can
+    drive either one.
+    """
+
+    def __init__(self, engine="threads", access_token=None, watchlist_path=None):
+        if engine == "asyncio":
+            from backend.async_recorder import recorder_service
+            self._engine = recorder_service
+            self._active = lambda: recorder_service.recordings
+        elif engine == "threads":
+            from backend import ws_recorder
+            self._engine = ws_recorder
+            self._active = lambda: ws_recorder.active_recordings
+        else:
+            raise ValueError(f"Unknown recorder engine: {engine}")
+        self.engine = engine
+        self.access_token = access_token
+        self.watchlist_path = watchlist_path
+        self.started_at = time.time()
+        self._watchlisted = set()       # tickers started from the watchlist file
+        self._lock = threading.Lock()
+
+    # --- control API ---
+
+    def start_recordings(self, tickers, access_token=None):
+        token = access_token or self.access_token
+        if not token:
+            return {t: {"status": "failed", "message": "❌ The recorder has no access token."} for t in tickers}
+        if access_token:
+            self.access_token = access_token
+        with self._lock:
+            return self._engine.start_recordings(tickers, token)
+
+    def stop_recordings(self, tickers):
+        with self._lock:
+            return self._engine.stop_recordings(tickers)
+
+    def start_recording(self, ticker, access_token=None):
+        ticker = ticker.strip().upper()
+        result = self.start_recordings([ticker], access_token).get(ticker)
+        if result is None:
+            return "⚠️ Please enter a ticker."
+        return None if result["status"] == "started" else result["message"]
+
+    def stop_recording(self, ticker):
+        result = self.stop_recordings([ticker]).get(ticker.strip().upper())
+        if result and result["status"] == "not_recording":
+            logger.warning(result["message"])
+
+    def tickers(self):
+        return sorted(self._active())
+
+    def status(self):
+        from pyoauthbridge.wsclient import is_socket_open
+        return {
+            "engine": self.engine,
+            "sinks": config.STORAGE_SINKS,
+            "tickers": self.tickers(),
+            "watchlist": self.watchlist_path,
+            "socket_open": bool(is_socket_open()),
+            "has_token": bool(self.access_token),
+            "pid": os.getpid(),
+            "uptime_s": round(time.time() - self.started_at, 1),
+        }
+
+    def metrics_snapshot(self):
+        from backend.metrics import registry
+        return registry.snapshot()
+
+    def buffered_tickers(self):
+        from backend.tick_buffer import buffered_tickers
+        return buffered_tickers()
+
+    def tick_snapshot(self, ticker, n=2000):
+        """(copy of the last n ticks, last-trade state, multiplier) from the ring buffer, or (None, None, None)."""
+        from backend.tick_buffer import get_tick_buffer
+        buffer = get_tick_buffer(ticker)
+        if buffer is None:
+            return None, None, None
+        return buffer.last(n, copy=True), buffer.last_trade(), buffer.multiplier
+
+    def reload_watchlist(self):
+        """Start tickers added to the watchlist file and stop the watchlist tickers removed from it."""
+        if not self.watchlist_path:
+            return {}
+        tickers = load_watchlist(self.watchlist_path)
+        removed = sorted(self._watchlisted - set(tickers))
+        report = self.stop_recordings(removed) if removed else {}
+        report.update(self.start_recordings(tickers))
+        self._watchlisted = {t for t, r in report.items() if r["status"] in ("started", "already_recording")}
+        started = sum(1 for r in report.values() if r["status"] == "started")
+        logger.info("📋 Watchlist %s: %d started, %d stopped, %d recording",
+                    self.watchlist_path, started, len(removed), len(self._active()))
+        for result in report.values():
+            if result["status"] == "failed":
+                logger.warning(result["message"])
+        return report
+
+    def shutdown(self):
+        """Stop every recording (flushing the sinks) and stop the engine."""
+        logger.info("🛑 Stopping %d recordings", len(self._active()))
+        self.stop_recordings(self.tickers())
+        if self.engine == "asyncio":
+            self._engine.shutdown()
+
+
+class RecorderManager(BaseManager):
+    pass
+
+
+def serve_recorder(daemon: RecorderDaemon, host=RECORDER_API_HOST, port=RECORDER_API_PORT,
+                   authkey=None):
+    """Serve `daemon` to local clients until SIGTERM/SIGINT, then shut it down gracefully."""
+    if not is_loopback(host) and not os.getenv("RECORDER_API_AUTHKEY"):
+        # The protocol unpickles requests: beyond this machine only with a key set on purpose
+        raise ValueError(f"Refusing to serve the recorder on non-loopback host {host} "
+                         f"without RECORDER_API_AUTHKEY set")
+    RecorderManager.register("recorder", callable=lambda: daemon)
+    server = RecorderManager(address=(host, port), authkey=authkey or recorder_authkey()).get_server()
+
+    def terminate(signum, frame):
+        logger.info("Received %s, shutting down", signal.Signals(signum).name)
+        stop_event = getattr(server, "stop_event", None)     # created by serve_forever
+        if stop_event is None:
+            raise SystemExit(0)
+        stop_event.set()
+
+    def reload(signum, frame):
+        threading.Thread(target=daemon.reload_watchlist, name="watchlist-reload", daemon=True).start()
+
+    signal.signal(signal.SIGTERM, terminate)
+    signal.signal(signal.SIGINT, terminate)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, reload)
+
+    logger.info("🎙️ Recorder listening on %s:%s (engine=%s, sinks=%s)",
+                host, port, daemon.engine, ",".join(config.STORAGE_SINKS))
+    try:
+        server.serve_forever()      # returns via SystemExit once stop_event is set
+    finally:
+        daemon.shutdown()
+
+
+def connect_recorder(host=RECORDER_API_HOST, port=RECORDER_API_PORT, authkey=None):
+    """Proxy to a running recorder daemon; its methods are called over the local socket."""
+    RecorderManager.register("recorder")
+    manager = RecorderManager(address=(host, port), authkey=authkey or recorder_authkey())
+    manager.connect()
+    return manager.recorder()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless tick recorder")
+    parser.add_argument("--watchlist", help="file of SYMBOL.EXCHANGE tickers to record on startup (SIGHUP reloads it)")
+    parser.add_argument("--storage", help="comma-separated sinks, e.g. csv,mongodb (default: STORAGE_SINKS)")
+    parser.add_argument("--engine", choices=("threads", "asyncio"),
+                        default=os.getenv("RECORDER_DAEMON_ENGINE", "threads"))
+    parser.add_argument("--host", default=RECORDER_API_HOST)
+    parser.add_argument("--port", type=int, default=RECORDER_API_PORT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.storage:
+        # Before the engine (and the sink pipeline) is imported
+        config.STORAGE_SINKS = parse_sinks(args.storage)
+        config.STORAGE_MODE = config.STORAGE_SINKS[0]
+        os.environ["STORAGE_SINKS"] = args.storage
+
+    token = read_access_token()
+    if token:
+        from backend.token_utils import is_token_valid
+        if not is_token_valid(os.getenv("BASE_URL"), token)[0]:
+            logger.warning("⚠️ ACCESS_TOKEN was rejected; recordings will fail until a client sends a valid one")
+    elif args.watchlist:
+        parser.error("--watchlist needs ACCESS_TOKEN (or ACCESS_TOKEN_FILE) in the environment")
+
+    from backend.metrics import start_metrics_server
+    start_metrics_server()
+
+    if not is_loopback(args.host) and not os.getenv("RECORDER_API_AUTHKEY"):
+        parser.error(f"--host {args.host} is not a loopback address: set RECORDER_API_AUTHKEY explicitly")
+
+    daemon = RecorderDaemon(args.engine, token, args.watchlist)
+    if args.watchlist:
+        daemon.reload_watchlist()
+    serve_recorder(daemon, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# replay.py
+
+import csv
+import glob
+import os
+import random
+import sys
+import threading
+import time
+import types
+from backend.exchange_constants import EXCHANGE_NAME_TO_CODE, get_multiplier
+
+
+class ReplayTickSource:
+    """
+    Local stand-in for the Stocko socket. Instruments subscribed through
+    `subscribe_ticker` receive raw ticks shaped like the live feed
+    ({"last_traded_price": int, "last_traded_quantity": int, ...}) from one
+    emitter thread, at `rate` ticks/s per instrument. During the first
+    `burst_seconds` the rate is multiplied by `burst_multiplier` to mimic the
+    market open.
+
+    Prices come from the recorded data/*.csv files when `csv_folder` has a
+    file for the ticker, otherwise from a random walk. Every raw tick carries
+    "_sent_ns" (perf_counter_ns at emission) so consumers can measure
+    end-to-end latency.
+    """
+
+    def __init__(self, rate=20.0, burst_seconds=0.0, burst_multiplier=1.0, csv_folder="data", seed=1):
+        self.rate = rate
+        self.burst_seconds = burst_seconds
+        self.burst_multiplier = burst_multiplier
+        self.csv_folder = csv_folder
+        self.instruments = {}       # "SYMBOL.EXCHANGE" -> instrument dict (as resolve_ticker returns)
+        self.emitted = 0
+        self._random = random.Random(seed)
+        self._streams = {}          # key -> [callback, price iterator]
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self._started_at = None
+
+    # --- instruments ---
+
+    def add_instrument(self, ticker):
+        """Register a fake instrument for 'SYMBOL.EXCHANGE' and return it."""
+        symbol, exchange = ticker.upper().split(".")
+        exchange_code = EXCHANGE_NAME_TO_CODE[exchange]
+        instrument = {
+            "symbol": symbol,
+            "exchange": exchange,
+            "exchange_code": exchange_code,
+            "token": 100000 + len(self.instruments),
+            "trading_symbol": f"{symbol}-EQ",
+            "company": symbol,
+            "multiplier": get_multiplier(exchange_code),
+        }
+        self.instruments[f"{symbol}.{exchange}"] = instrument
+        return instrument
+
+    def _prices(self, instrument):
+        """Endless iterator of (raw price, quantity) for one instrument."""
+        multiplier = instrument["multiplier"]
+        path = self.csv_folder and os.path.join(self.csv_folder, f"{instrument['symbol']}.{instrument['exchange']}.csv")
+        rows = []
+        if path and os.path.exists(path):
+            with open(path, newline="") as f:
+                for row in csv.DictReader(f):
+                    try:
+                        rows.append((round(float(row["LTP"]) * multiplier), int(row["LTQ"])))
+                    except (KeyError, TypeError, ValueError):     # short or malformed rows
+                        continue
+        if rows:
+            while True:
+                yield from rows
+
+        price = 1000 * multiplier
+        tick_size = max(1, multiplier // 20)
+        while True:
+            price = max(tick_size, price + self._random.choice((-1, 0, 1)) * tick_size)
+            yield price, self._random.randint(1, 500)
+
+    # --- pyoauthbridge.wsclient stand-ins ---
+
+    def subscribe_ticker(self, exchange_code, token, callback=None):
+        key = f"{token}_{exchange_code}"
+        instrument = next(i for i in self.instruments.values()
+                          if i["token"] == token and i["exchange_code"] == exchange_code)
+        with self._lock:
+            self._streams[key] = [callback, self._prices(instrument), 0]      # callback, prices, cumulative volume
+        self.start()
+
+    def unsubscribe_ticker(self, exchange_code, token):
+        with self._lock:
+            self._streams.pop(f"{token}_{exchange_code}", None)
+
+    def is_socket_open(self):
+        return self._running
+
+    # --- emitter ---
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._started_at = time.perf_counter()
+            self._thread = threading.Thread(target=self._run, name="replay-source", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(5)
+
+    def _target_count(self, elapsed, streams):
+        """Ticks that should have been emitted after `elapsed` seconds across `streams` instruments."""
+        per_instrument = self.rate * elapsed
+        if self.burst_seconds:
+            per_instrument += self.rate * (self.burst_multiplier - 1) * min(elapsed, self.burst_seconds)
+        return int(per_instrument * streams)
+
+    def _run(self):
+        while self._running:
+            with self._lock:
+                streams = list(self._streams.values())
+            if not streams:
+                time.sleep(0.01)
+                continue
+
+            due = self._target_count(time.perf_counter() - self._started_at, len(streams)) - self.emitted
+            for i in range(max(0, due)):
+                # Round-robin across passes: `due` is usually 0 or 1
+                stream = streams[(self.emitted + i) % len(streams)]
+                callback, prices = stream[0], stream[1]
+                price, qty = next(prices)
+                stream[2] += qty
+                callback({
+                    "last_traded_price": price,
+                    "last_traded_quantity": qty,
+                    # Trade identity fields of the detailed feed, so replayed CSV rows
+                    # that repeat (price, qty) are not dropped as duplicates
+                    "last_traded_time": int(time.time()),
+                    "trade_volume": stream[2],
+                    "_sent_ns": time.perf_counter_ns(),
+                })
+            self.emitted += max(0, due)
+            time.sleep(0.001)
+
+
+class _ReplayConnect:
+    """Stand-in for pyoauthbridge.connect.Connect backed by a ReplayTickSource."""
+
+    def __init__(self, source, *args, **kwargs):
+        self.source = source
+        self.tick_queues = {}
+
+    def set_access_token(self, token):
+        pass
+
+    def run_socket(self):
+        self.source.start()
+        return True
+
+    def subscribe_detailed_marketdata(self, payload):
+        pass
+
+    def unsubscribe_detailed_marketdata(self, *args):
+        pass
+
+
+def install_replay_source(source: ReplayTickSource, mongo_database=None):
+    """
+    Make `import pyoauthbridge...` resolve to the replay source, and
+    optionally `backend.mongodb_connect.db` to `mongo_database` (e.g. a
+    mongomock database). Must run before backend.ws_recorder is imported.
+    """
+    package = types.ModuleType("pyoauthbridge")
+    connect = types.ModuleType("pyoauthbridge.connect")
+    wsclient = types.ModuleType("pyoauthbridge.wsclient")
+    connect.Connect = lambda *args, **kwargs: _ReplayConnect(source, *args, **kwargs)
+    wsclient.subscribe_ticker = source.subscribe_ticker
+    wsclient.unsubscribe_ticker = source.unsubscribe_ticker
+    wsclient.is_socket_open = source.is_socket_open
+    package.connect, package.wsclient = connect, wsclient
+    sys.modules.update({"pyoauthbridge": package, "pyoauthbridge.connect": connect, "pyoauthbridge.wsclient": wsclient})
+
+    if mongo_database is not None:
+        mongodb_connect = types.ModuleType("backend.mongodb_connect")
+        mongodb_connect.client = mongo_database.client
+        mongodb_connect.db = mongo_database
+        mongodb_connect.get_client = lambda: mongo_database.client
+        mongodb_connect.get_db = lambda: mongo_database
+        sys.modules["backend.mongodb_connect"] = mongodb_connect
+
+    # Resolve instruments from the source instead of the search API
+    from backend.ticker_resolver import instrument_cache
+    instrument_cache.path = None
+    for ticker, instrument in source.instruments.items():
+        instrument_cache.put(ticker, instrument)
+
+
+def replay_tickers(n, exchanges=("NSE", "BSE")):
+    """N distinct tickers: the recorded ones first, then synthetic SYMxxxx.EXCHANGE names."""
+    recorded = sorted(os.path.basename(p)[:-4] for p in glob.glob(os.path.join("data", "*.*.csv")))
+    recorded = [t for t in recorded if t.split(".")[-1] in EXCHANGE_NAME_TO_CODE]
+    tickers = recorded[:n]
+    i = 0
+    while len(tickers) < n:
+        tickers.append(f"SYM{i:04d}.{exchanges[i % len(exchanges)]}")
+        i += 1
+    return tickers
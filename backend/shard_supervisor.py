@@ -0,0 +1,347 @@
+# shard_supervisor.py
+#
+# Run the supervisor (it spawns the shard processes):
+#     python -m backend.shard_supervisor
+# and set RECORDER_ENGINE=sharded for streamlit_app.py to talk to it.
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.managers import BaseManager
+from backend.config import ipc_authkey, load_env
+from backend.exchange_constants import EXCHANGE_NAME_TO_CODE
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", str(max(1, min(4, os.cpu_count() or 1)))))
+SHARD_STRATEGY = os.getenv("SHARD_STRATEGY", "exchange").strip().lower()   # exchange | hash
+SHARD_CHECK_INTERVAL = float(os.getenv("SHARD_CHECK_INTERVAL", "2"))        # seconds between liveness checks
+SHARD_COMMAND_TIMEOUT = float(os.getenv("SHARD_COMMAND_TIMEOUT", "60"))
+SUPERVISOR_HOST = os.getenv("SUPERVISOR_HOST", "127.0.0.1")
+SUPERVISOR_PORT = int(os.getenv("SUPERVISOR_PORT", "50051"))
+# SUPERVISOR_AUTHKEY, else a random key generated into SUPERVISOR_AUTHKEY_FILE
+SUPERVISOR_AUTHKEY_FILE = os.getenv("SUPERVISOR_AUTHKEY_FILE", os.path.join("~", ".stocko", "supervisor.key"))
+
+_EXCHANGE_ORDER = sorted(EXCHANGE_NAME_TO_CODE, key=EXCHANGE_NAME_TO_CODE.get)
+
+
+def _shard_main(shard_id, conn):
+    """
+    Shard process: owns its own socket connection (ws_recorder.get_connection()
+    is created per process), dispatcher and storage sinks, and executes
+    commands sent by the supervisor over `conn`.
+    """
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                        format=f"%(asctime)s %(levelname)s shard-{shard_id} %(name)s: %(message)s")
+    os.environ["RECORDER_SHARD_ID"] = str(shard_id)     # per-shard state, e.g. the tick spool folder
+    from backend import ws_recorder
+
+    while True:
+        try:
+            command, args = conn.recv()
+        except EOFError:
+            command, args = "shutdown", ()
+
+        if command == "start":
+            conn.send(ws_recorder.start_recordings(*args))
+        elif command == "stop":
+            conn.send(ws_recorder.stop_recordings(*args))
+        elif command == "status":
+            conn.send(sorted(ws_recorder.active_recordings))
+        elif command == "metrics":
+            from backend.metrics import registry
+            conn.send(registry.snapshot())
+        elif command == "shutdown":
+            ws_recorder.stop_recordings(list(ws_recorder.active_recordings))
+            try:
+                conn.send(True)
+            except (BrokenPipeError, OSError):
+                pass
+            return
+
+
+class ShardSupervisor:
+    """
+    Spreads recordings across `shard_count` worker processes so one busy
+    exchange (or one GIL) cannot starve the others or the UI.
+
+    Tickers are assigned by exchange (default) or by a stable hash of the
+    ticker. The supervisor restarts crashed shards and re-subscribes their
+    tickers, and `rebalance()` moves tickers after the shard count changes.
+    Its public methods mirror ws_recorder's bulk API and return the same
+    per-ticker reports, with an added "shard" field.
+    """
+
+    def __init__(self, shard_count=SHARD_COUNT, strategy=SHARD_STRATEGY):
+        if strategy not in ("exchange", "hash"):
+            raise ValueError(f"Unknown shard strategy: {strategy}")
+        self.shard_count = max(1, shard_count)
+        self.strategy = strategy
+        self.assignments = {}       # ticker -> shard id
+        self._shards = {}           # shard id -> {"process", "conn", "lock", "restarts"}
+        self._access_token = None
+        self._ctx = multiprocessing.get_context("spawn")
+        self._lock = threading.RLock()
+        self._running = False
+        self._monitor_thread = None
+
+    # --- lifecycle ---
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            for shard_id in range(self.shard_count):
+                self._spawn(shard_id)
+        self._monitor_thread = threading.Thread(target=self._monitor, name="shard-monitor", daemon=True)
+        self._monitor_thread.start()
+
+    def shutdown(self):
+        with self._lock:
+            self._running = False
+            shards = list(self._shards.items())
+        for shard_id, shard in shards:
+            try:
+                self._send(shard_id, "shutdown", (), timeout=10)
+            except Exception:
+                pass
+            shard["process"].join(10)
+            if shard["process"].is_alive():
+                shard["process"].terminate()
+
+    def _spawn(self, shard_id, restarts=0):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(target=_shard_main, args=(shard_id, child_conn),
+                                    name=f"recorder-shard-{shard_id}", daemon=True)
+        process.start()
+        child_conn.close()
+        self._shards[shard_id] = {"process": process, "conn": parent_conn,
+                                  "lock": threading.Lock(), "restarts": restarts}
+        logger.info("🚀 Shard %s started (pid %s)", shard_id, process.pid)
+
+    def _send(self, shard_id, command, args, timeout=SHARD_COMMAND_TIMEOUT):
+        shard = self._shards[shard_id]
+        with shard["lock"]:
+            shard["conn"].send((command, args))
+            if not shard["conn"].poll(timeout):
+                raise TimeoutError(f"Shard {shard_id} did not answer '{command}' within {timeout}s")
+            return shard["conn"].recv()
+
+    # --- assignment ---
+
+    def shard_for(self, ticker: str, shard_count=None) -> int:
+        n = shard_count or self.shard_count
+        if self.strategy == "exchange":
+            exchange = ticker.rsplit(".", 1)[-1]
+            if exchange in _EXCHANGE_ORDER:
+                return _EXCHANGE_ORDER.index(exchange) % n
+        return zlib.crc32(ticker.encode()) % n
+
+    def _group(self, tickers):
+        groups = {}
+        for ticker in tickers:
+            shard_id = self.assignments.get(ticker)
+            if shard_id is None:
+                shard_id = self.shard_for(ticker)
+            groups.setdefault(shard_id, []).append(ticker)
+        return groups
+
+    def _fan_out(self, command, groups, extra_args=()):
+        """Send one command per shard concurrently; merge the per-ticker reports."""
+        report = {}
+        if not groups:
+            return report
+        with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+            futures = {shard_id: pool.submit(self._send, shard_id, command, (tickers,) + extra_args)
+                       for shard_id, tickers in groups.items()}
+        for shard_id, future in futures.items():
+            try:
+                results = future.result()
+            except Exception as e:
+                results = {t: {"status": "failed", "message": f"❌ Shard {shard_id} error: {e}"}
+                           for t in groups[shard_id]}
+            for ticker, result in results.items():
+                result["shard"] = shard_id
+                report[ticker] = result
+        return report
+
+    # --- API (same shape as ws_recorder) ---
+
+    def start_recordings(self, tickers, access_token):
+        tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
+        with self._lock:
+            self.start()
+            self._access_token = access_token
+            report = self._fan_out("start", self._group(tickers), (access_token,))
+            for ticker, result in report.items():
+                if result["status"] in ("started", "already_recording"):
+                    self.assignments[ticker] = result["shard"]
+            return report
+
+    def stop_recordings(self, tickers):
+        tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
+        with self._lock:
+            report = self._fan_out("stop", self._group(tickers))
+            for ticker in tickers:
+                self.assignments.pop(ticker, None)
+            return report
+
+    def start_recording(self, ticker, access_token):
+        ticker = ticker.strip().upper()
+        result = self.start_recordings([ticker], access_token).get(ticker)
+        if result is None:
+            return "⚠️ Please enter a ticker."
+        return None if result["status"] == "started" else result["message"]
+
+    def stop_recording(self, ticker):
+        self.stop_recordings([ticker])
+
+    def status(self) -> dict:
+        with self._lock:
+            shards = []
+            for shard_id, shard in sorted(self._shards.items()):
+                shards.append({
+                    "shard": shard_id,
+                    "pid": shard["process"].pid,
+                    "alive": shard["process"].is_alive(),
+                    "restarts": shard["restarts"],
+                    "tickers": sorted(t for t, s in self.assignments.items() if s == shard_id),
+                })
+            return {"strategy": self.strategy, "shard_count": self.shard_count, "shards": shards}
+
+    def metrics_snapshot(self) -> dict:
+        """
+        registry.snapshot() merged across shards. Counters and gauges with the
+        same labels are summed; for histograms the shard with the worst p99
+        is reported, since bucket percentiles cannot be combined.
+        """
+        with self._lock:
+            shard_ids = [sid for sid, shard in self._shards.items() if shard["process"].is_alive()]
+        merged = {}
+        for shard_id in shard_ids:
+            try:
+                snapshot = self._send(shard_id, "metrics", (), timeout=5)
+            except Exception as e:
+                logger.warning("Shard %s metrics unavailable: %s", shard_id, e)
+                continue
+            for name, series in snapshot.items():
+                target = merged.setdefault(name, {})
+                for labels, value in series.items():
+                    if labels not in target:
+                        target[labels] = value
+                    elif isinstance(value, dict):
+                        if (value["p99"] or 0) > (target[labels]["p99"] or 0):
+                            target[labels] = value
+                    else:
+                        target[labels] += value
+        return merged
+
+    def rebalance(self, shard_count=None) -> dict:
+        """
+        Optionally change the number of shards, then move every ticker whose
+        target shard changed (stop on the old shard, start on the new one).
+        Returns the start report for the moved tickers.
+        """
+        with self._lock:
+            if shard_count and shard_count != self.shard_count:
+                for shard_id in range(self.shard_count, shard_count):
+                    self._spawn(shard_id)
+                old_count, self.shard_count = self.shard_count, shard_count
+            else:
+                old_count = self.shard_count
+
+            moves = {t: s for t, s in self.assignments.items() if self.shard_for(t) != s}
+            if moves:
+                stop_groups = {}
+                for ticker, shard_id in moves.items():
+                    stop_groups.setdefault(shard_id, []).append(ticker)
+                    self.assignments.pop(ticker)
+                self._fan_out("stop", stop_groups)
+                report = self.start_recordings(list(moves), self._access_token)
+            else:
+                report = {}
+
+            for shard_id in range(self.shard_count, old_count):    # shrink: retire empty shards
+                try:
+                    self._send(shard_id, "shutdown", (), timeout=10)
+                except Exception:
+                    pass
+                self._shards.pop(shard_id)["process"].join(10)
+            return report
+
+    # --- crash recovery ---
+
+    def _monitor(self):
+        while self._running:
+            time.sleep(SHARD_CHECK_INTERVAL)
+            # Only spot and replace dead shards under the lock; resubscribing can take up
+            # to SHARD_COMMAND_TIMEOUT and must not block the control API meanwhile
+            with self._lock:
+                if not self._running:
+                    return
+                restarted = {}
+                for shard_id, shard in list(self._shards.items()):
+                    if shard["process"].is_alive():
+                        continue
+                    logger.warning("💥 Shard %s died (exit code %s); restarting", shard_id, shard["process"].exitcode)
+                    self._spawn(shard_id, shard["restarts"] + 1)
+                    restarted[shard_id] = [t for t, s in self.assignments.items() if s == shard_id]
+                access_token = self._access_token
+
+            for shard_id, tickers in restarted.items():
+                if not tickers or not access_token:
+                    continue
+                report = self._fan_out("start", {shard_id: tickers}, (access_token,))
+                failed = [t for t, r in report.items() if r["status"] == "failed"]
+                with self._lock:
+                    for ticker in failed:
+                        if self.assignments.get(ticker) == shard_id:
+                            self.assignments.pop(ticker)
+                if failed:
+                    logger.error("Shard %s could not resume: %s", shard_id, ", ".join(failed))
+
+
+# --- local IPC ---
+
+class SupervisorManager(BaseManager):
+    pass
+
+
+def supervisor_authkey() -> bytes:
+    """Read (or create) the key when serving or connecting, not when the module is imported."""
+    return ipc_authkey("SUPERVISOR_AUTHKEY", SUPERVISOR_AUTHKEY_FILE)
+
+
+def serve_supervisor(host=SUPERVISOR_HOST, port=SUPERVISOR_PORT, authkey=None):
+    """Start the shards and serve the supervisor to local clients until interrupted."""
+    supervisor = ShardSupervisor()
+    supervisor.start()
+    SupervisorManager.register("supervisor", callable=lambda: supervisor)
+    manager = SupervisorManager(address=(host, port), authkey=authkey or supervisor_authkey())
+    server = manager.get_server()
+    logger.info("🛰️ Shard supervisor listening on %s:%s", host, port)
+    try:
+        server.serve_forever()
+    finally:
+        supervisor.shutdown()
+
+
+def connect_supervisor(host=SUPERVISOR_HOST, port=SUPERVISOR_PORT, authkey=None):
+    """Proxy to a running supervisor; its methods are called over the local socket."""
+    SupervisorManager.register("supervisor")
+    manager = SupervisorManager(address=(host, port), authkey=authkey or supervisor_authkey())
+    manager.connect()
+    return manager.supervisor()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    serve_supervisor()
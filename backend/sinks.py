@@ -0,0 +1,413 @@
+# sinks.py
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from backend.config import STORAGE_SINKS
+from backend.csv_utils import open_csv_sink, close_csv_sink, close_all_csv_sinks
+from backend.metrics import registry, PERSIST_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# Defaults for every sink worker; each can be overridden per sink,
+# e.g. SINK_MONGODB_BATCH_SIZE=2000 or SINK_CSV_FLUSH_INTERVAL=0.5
+SINK_BATCH_SIZE = int(os.getenv("SINK_BATCH_SIZE", "500"))              # ticks per write_batch
+SINK_FLUSH_INTERVAL = float(os.getenv("SINK_FLUSH_INTERVAL", "1.0"))     # seconds between flushes
+SINK_QUEUE_SIZE = int(os.getenv("SINK_QUEUE_SIZE", "100000"))           # ticks a sink may fall behind
+SINK_MAX_RETRIES = int(os.getenv("SINK_MAX_RETRIES", "5"))              # attempts per batch before dropping it
+SINK_RETRY_INITIAL = float(os.getenv("SINK_RETRY_INITIAL", "0.5"))       # seconds, doubled per failed attempt
+SINK_RETRY_MAX = float(os.getenv("SINK_RETRY_MAX", "30"))
+
+SINK_WRITTEN = registry.counter("recorder_sink_written_total", "Ticks written by each sink", ["sink"])
+SINK_DROPPED = registry.counter("recorder_sink_dropped_total", "Ticks a sink lost, by reason", ["sink", "reason"])
+SINK_RETRIES = registry.counter("recorder_sink_retries_total", "Failed sink writes that were retried", ["sink"])
+
+_FLUSH = object()       # queue marker: flush the sink, then set the event
+_RELEASE = object()     # queue marker: release one ticker's resources
+_SPOOLED = object()     # queue marker: store a batch of spooled records and report back
+_STOP = object()        # queue marker: flush, close and exit
+
+
+def _sink_setting(name, key, default):
+    value = os.getenv(f"SINK_{name.upper()}_{key}")
+    return default if value is None else type(default)(value)
+
+
+class TickSink:
+    """
+    Storage backend for recorded ticks. A SinkWorker drives one sink from a
+    single thread, so implementations need no locking of their own:
+
+        open()              once, before the first batch
+        write_batch(ticks)  a list of backend.tick_record.Tick; raise on failure.
+                            A failed batch is passed again, so writing it
+                            twice must not duplicate what already landed
+                            (CsvSink truncates back, MongoSink reuses _ids;
+                            ParquetSink cannot take back a row group it
+                            already wrote, so it is at-least-once).
+        flush()             make everything written so far durable
+        release(ticker)     a recording stopped; close its files
+        close()             flush and free everything
+    """
+
+    name = "sink"
+
+    def open(self):
+        pass
+
+    def write_batch(self, ticks):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def release(self, ticker):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def write_spooled(self, records, record_id):
+        """Spool delivery: store (seq, Tick) records durably before returning; raise on failure."""
+        self.write_batch([tick for _, tick in records])
+        self.flush()
+
+
+class CsvSink(TickSink):
+    """data/TICKER[_YYYY-MM-DD].csv through the per-ticker CsvTickSinks of csv_utils."""
+
+    name = "csv"
+
+    def __init__(self):
+        self._files = {}        # ticker -> CsvTickSink
+
+    def write_batch(self, ticks):
+        marks = {}      # ticker -> state before this batch, to undo a partial write before the retry
+        try:
+            for tick in ticks:
+                sink = self._files.get(tick.ticker)
+                if sink is None:
+                    sink = self._files[tick.ticker] = open_csv_sink(tick.ticker)
+                if tick.ticker not in marks:
+                    marks[tick.ticker] = sink.mark()
+                sink.write(tick)
+        except Exception:
+            for ticker, mark in marks.items():
+                self._files[ticker].rollback(mark)
+            raise
+
+    def flush(self):
+        for sink in self._files.values():
+            sink.flush()
+
+    def release(self, ticker):
+        self._files.pop(ticker, None)
+        close_csv_sink(ticker)
+
+    def close(self):
+        self._files.clear()
+        close_all_csv_sinks()
+
+
+class MongoSink(TickSink):
+    """
+    Per-ticker collections or the time-series collection (MONGO_LAYOUT),
+    written synchronously. pymongo and pyarrow are imported by the sinks
+    that use them, so a csv-only recorder needs neither.
+    """
+
+    name = "mongodb"
+
+    def open(self):
+        from backend.db_utils import MONGO_LAYOUT, ensure_timeseries_collection
+        from backend.mongodb_connect import get_db
+        if MONGO_LAYOUT == "timeseries":
+            ensure_timeseries_collection(get_db())
+
+    def write_batch(self, ticks):
+        from backend.db_utils import write_ticks
+        write_ticks(ticks)
+        PERSIST_LATENCY.labels("mongodb").observe((time.time_ns() - ticks[0].ts_ns) / 1e9)
+
+    def write_spooled(self, records, record_id):
+        from backend.db_utils import write_spooled_ticks
+        write_spooled_ticks(records, record_id)
+
+
+class ParquetSink(TickSink):
+    """data/parquet/date=.../ticker=.../*.parquet through parquet_utils' per-ticker writers."""
+
+    name = "parquet"
+
+    def __init__(self):
+        self._writers = {}      # ticker -> ParquetTickWriter
+
+    def write_batch(self, ticks):
+        from backend.parquet_utils import open_parquet_writer
+        for tick in ticks:
+            writer = self._writers.get(tick.ticker)
+            if writer is None:
+                writer = self._writers[tick.ticker] = open_parquet_writer(tick.ticker)
+            writer.write(tick.ts_ns, tick.ltp, tick.quantity)
+
+    def flush(self):
+        for writer in self._writers.values():
+            writer.flush()
+
+    def release(self, ticker):
+        from backend.parquet_utils import close_parquet_writer
+        self._writers.pop(ticker, None)
+        close_parquet_writer(ticker)
+
+    def close(self):
+        from backend.parquet_utils import close_all_parquet_writers
+        self._writers.clear()
+        close_all_parquet_writers()
+
+
+# name -> factory; register_sink_type adds more backends
+SINK_TYPES = {"csv": CsvSink, "mongodb": MongoSink, "parquet": ParquetSink}
+
+
+def register_sink_type(name, factory):
+    SINK_TYPES[name.lower()] = factory
+
+
+class SinkWorker:
+    """
+    Feeds one sink from its own queue and thread. Ticks are written in
+    batches of up to `batch_size`, and the sink is flushed every
+    `flush_interval` seconds.
+
+    A failed batch is retried with exponential backoff up to `max_retries`
+    times and then dropped (counted); meanwhile new ticks keep queuing up
+    to `queue_size`, after which they are dropped too. `submit` never
+    blocks, so a slow or failing sink never holds up capture or the others.
+    """
+
+    def __init__(self, sink, batch_size=None, flush_interval=None, queue_size=None, max_retries=None):
+        self.sink = sink
+        self.batch_size = batch_size or _sink_setting(sink.name, "BATCH_SIZE", SINK_BATCH_SIZE)
+        self.flush_interval = flush_interval or _sink_setting(sink.name, "FLUSH_INTERVAL", SINK_FLUSH_INTERVAL)
+        self.queue_size = queue_size or _sink_setting(sink.name, "QUEUE_SIZE", SINK_QUEUE_SIZE)
+        self.max_retries = max_retries if max_retries is not None else \
+            _sink_setting(sink.name, "MAX_RETRIES", SINK_MAX_RETRIES)
+        self._queue = queue.Queue()     # bounded by `submit`, so control markers always fit
+        self._thread = None
+        self._written = SINK_WRITTEN.labels(sink.name)
+        self._queue_full = SINK_DROPPED.labels(sink.name, "queue_full")
+        self._failed = SINK_DROPPED.labels(sink.name, "failed")
+        self._retries = SINK_RETRIES.labels(sink.name)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._call(self.sink.open)
+            self._thread = threading.Thread(target=self._run, name=f"sink-{self.sink.name}", daemon=True)
+            self._thread.start()
+
+    def submit(self, tick) -> bool:
+        if self._queue.qsize() >= self.queue_size:
+            self._queue_full.inc()
+            return False
+        self._queue.put(tick)
+        return True
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Write and flush everything queued so far. False if it did not finish within `timeout`."""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def release(self, ticker):
+        """Release `ticker` once the ticks queued before this call are written."""
+        self._queue.put((_RELEASE, ticker))
+
+    def write_spooled(self, records, record_id):
+        """Queue spooled records for the worker thread. Wait on the returned request's "done", then check "error"."""
+        request = {"records": records, "record_id": record_id, "done": threading.Event(), "error": None}
+        self._queue.put((_SPOOLED, request))
+        return request
+
+    def close(self, timeout: float = 10.0):
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put((_STOP, None))
+        self._thread.join(timeout)
+
+    def _run(self):
+        batch = []
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, last_flush + self.flush_interval - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if type(item) is tuple:
+                marker, arg = item
+                self._write(batch)
+                batch = []
+                if marker is _RELEASE:
+                    self._call(self.sink.release, arg)
+                    continue
+                if marker is _SPOOLED:
+                    self._write_spooled(arg)
+                    continue
+                self._call(self.sink.flush)
+                last_flush = time.monotonic()
+                if marker is _STOP:
+                    self._call(self.sink.close)
+                    return
+                arg.set()
+                continue
+
+            if item is not None:
+                batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self._write(batch)
+                batch = []
+                self._call(self.sink.flush)
+                last_flush = time.monotonic()
+
+    def _write(self, batch):
+        if not batch:
+            return
+        delay = SINK_RETRY_INITIAL
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.sink.write_batch(batch)
+                self._written.inc(len(batch))
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error("❌ %s sink dropped %d ticks after %d attempts: %s",
+                                 self.sink.name, len(batch), attempt + 1, e)
+                    self._failed.inc(len(batch))
+                    return
+                self._retries.inc()
+                logger.warning("⚠️ %s sink failed to write %d ticks (%s); retrying in %.1fs",
+                               self.sink.name, len(batch), e, delay)
+                time.sleep(delay)
+                delay = min(delay * 2, SINK_RETRY_MAX)
+
+    def _write_spooled(self, request):
+        try:
+            self.sink.write_spooled(request["records"], request["record_id"])
+            self._written.inc(len(request["records"]))
+        except Exception as e:
+            request["error"] = e
+        request["done"].set()
+
+    def _call(self, method, *args):
+        try:
+            method(*args)
+        except Exception as e:
+            logger.error("❌ %s sink %s failed: %s", self.sink.name, method.__name__, e)
+
+
+class SinkPipeline:
+    """
+    Fans every stored tick out to several sinks, each behind its own
+    SinkWorker (thread, queue, batching and retries), e.g. local CSV and
+    MongoDB at the same time.
+    """
+
+    def __init__(self, sinks):
+        self.workers = [SinkWorker(sink) for sink in sinks]
+        self._started = threading.Lock()
+        self._running = False
+
+    @property
+    def names(self):
+        return [worker.sink.name for worker in self.workers]
+
+    def start(self):
+        with self._started:
+            if not self._running:
+                for worker in self.workers:
+                    worker.start()
+                self._running = True
+
+    def submit(self, tick):
+        for worker in self.workers:
+            worker.submit(tick)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        deadline = time.monotonic() + timeout
+        return all([worker.flush(max(0.0, deadline - time.monotonic())) for worker in self.workers])
+
+    def release(self, ticker):
+        for worker in self.workers:
+            worker.release(ticker)
+
+    def close(self, timeout: float = 10.0):
+        for worker in self.workers:
+            worker.close(timeout)
+        self._running = False
+
+    def qsizes(self) -> dict:
+        return {worker.sink.name: worker.qsize() for worker in self.workers}
+
+    def deliver_spooled(self, records, spool):
+        """
+        Spool drainer callback: store (seq, Tick) records in every sink, in
+        parallel on the sink workers, and wait for all of them. Each sink
+        only gets the records above its mark in `spool` (a TickSpool), and
+        the marks of the sinks that succeeded are saved, so a batch retried
+        or replayed after a crash is not written to a file sink twice.
+        Raises if any sink failed, so the spool retries.
+        """
+        marks = spool.sink_marks()
+        requests = {}
+        for worker in self.workers:
+            pending = [record for record in records if record[0] > marks.get(worker.sink.name, 0)]
+            if pending:
+                requests[worker.sink.name] = (worker.write_spooled(pending, spool.record_id), pending[-1][0])
+        errors, stored = [], {}
+        for name, (request, last_seq) in requests.items():
+            request["done"].wait()
+            if request["error"] is None:
+                stored[name] = last_seq
+            else:
+                errors.append(f"{name}: {request['error']}")
+        if stored:
+            spool.save_sink_marks(stored)
+        if errors:
+            raise RuntimeError("; ".join(errors))
+
+
+def build_pipeline(names=None) -> SinkPipeline:
+    """SinkPipeline for sink names (default STORAGE_SINKS); unknown names raise ValueError."""
+    names = names or STORAGE_SINKS
+    unknown = [name for name in names if name not in SINK_TYPES]
+    if unknown:
+        raise ValueError(f"Unknown storage sink(s): {', '.join(unknown)} (expected one of {sorted(SINK_TYPES)})")
+    return SinkPipeline([SINK_TYPES[name]() for name in dict.fromkeys(names)])
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline() -> SinkPipeline:
+    """Process-wide pipeline over STORAGE_SINKS, started on first use and closed at exit."""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = build_pipeline()
+            registry.gauge("recorder_sink_queue_depth", "Ticks waiting for each sink", ["sink"],
+                           callback=lambda: {(name,): n for name, n in _pipeline.qsizes().items()})
+            atexit.register(_pipeline.close)
+        _pipeline.start()
+        return _pipeline
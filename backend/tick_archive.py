@@ -0,0 +1,432 @@
+# tick_archive.py
+#
+# Compact cold-storage format for recorded ticks, one file per ticker and day:
+#     data/archive/TCS.NSE_2025-08-07.tka
+# Convert existing storage with
+#     python -m backend.tick_archive --csv data/*.csv
+#     python -m backend.tick_archive --mongo              # every tick collection
+#     python -m backend.tick_archive --info data/archive/TCS.NSE_2025-08-07.tka
+
+import argparse
+import glob
+import logging
+import lzma
+import mmap
+import os
+import struct
+import zlib
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from backend.exchange_constants import EXCHANGE_NAME_TO_CODE, get_multiplier
+from backend.tick_record import TICK_DTYPE
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FOLDER = os.getenv("TICK_ARCHIVE_FOLDER", os.path.join("data", "archive"))
+ARCHIVE_CODEC = os.getenv("TICK_ARCHIVE_CODEC", "zlib").strip().lower()     # none | zlib | lzma | zstd
+ARCHIVE_LEVEL = os.getenv("TICK_ARCHIVE_LEVEL")                             # codec default when unset
+ARCHIVE_BLOCK_TICKS = int(os.getenv("TICK_ARCHIVE_BLOCK_TICKS", "65536"))
+
+# File header: magic, version, exchange code, price multiplier, ticker length + ticker bytes.
+# Then blocks of up to ARCHIVE_BLOCK_TICKS ticks, each a header
+# (count, payload length, crc32 of payload, first/last ts_ns, first price_raw,
+#  codec, byte width of each column) and the compressed payload:
+#     ts_ns deltas | price_raw deltas | quantities
+# each column stored in the narrowest integer type that fits it in that block.
+# Blocks are in time order (an append that goes back in time rewrites the file
+# merged). There is no footer: a block cut off by a crash is ignored and
+# overwritten on append.
+MAGIC = b"TKAR"
+VERSION = 1
+_FILE = struct.Struct("<4sBbqH")
+_BLOCK = struct.Struct("<IIIqqqBBBB")
+
+CODECS = {"none": 0, "zlib": 1, "lzma": 2, "zstd": 3}
+_ARCHIVE_NAME = "{ticker}_{day}.tka"
+LOCAL_TZ = datetime.now().astimezone().tzinfo
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("The zstd archive codec needs the zstandard package (pip install zstandard)")
+    return zstandard
+
+
+def _compress(codec: int, data: bytes, level=None) -> bytes:
+    if codec == CODECS["none"]:
+        return data
+    if codec == CODECS["zlib"]:
+        return zlib.compress(data, 6 if level is None else int(level))
+    if codec == CODECS["lzma"]:
+        return lzma.compress(data, preset=6 if level is None else int(level))
+    if codec == CODECS["zstd"]:
+        return _zstd().ZstdCompressor(level=3 if level is None else int(level)).compress(data)
+    raise ValueError(f"Unknown archive codec: {codec}")
+
+
+def _decompress(codec: int, payload, size: int):
+    """`payload` is a memoryview into the mapped file; with codec none it is returned as is (no copy)."""
+    if codec == CODECS["none"]:
+        return payload
+    if codec == CODECS["zlib"]:
+        return zlib.decompress(payload, bufsize=size)
+    if codec == CODECS["lzma"]:
+        return lzma.decompress(payload)
+    if codec == CODECS["zstd"]:
+        return _zstd().ZstdDecompressor().decompress(payload, max_output_size=size)
+    raise ValueError(f"Unknown archive codec: {codec}")
+
+
+def _narrow(values: np.ndarray) -> np.ndarray:
+    """Little-endian copy of `values` in the smallest signed integer type holding all of them."""
+    low, high = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    for width in (1, 2, 4):
+        limit = 1 << (8 * width - 1)
+        if -limit <= low and high < limit:
+            return values.astype(f"<i{width}")
+    return values.astype("<i8")
+
+
+def archive_path(ticker: str, day, folder=ARCHIVE_FOLDER) -> str:
+    return os.path.join(folder, _ARCHIVE_NAME.format(ticker=ticker.upper(), day=day.isoformat()))
+
+
+def exchange_code_for(ticker: str) -> int:
+    """TCS.NSE -> 1; the exchange fixes the price multiplier of the file."""
+    exchange = ticker.rsplit(".", 1)[-1].upper()
+    if exchange not in EXCHANGE_NAME_TO_CODE:
+        raise ValueError(f"Unknown exchange in ticker {ticker}")
+    return EXCHANGE_NAME_TO_CODE[exchange]
+
+
+class TickArchive:
+    """
+    Read-only view of one archive file through mmap. Opening only walks the
+    block headers; `read_columns` decodes just the blocks overlapping the
+    requested range, straight from the mapped pages into preallocated NumPy
+    arrays (with codec none the stored columns are used in place).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < _FILE.size:
+            self._file.close()
+            raise ValueError(f"{path} is not a tick archive")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mm)
+
+        magic, version, self.exchange_code, self.multiplier, name_len = _FILE.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} tick archive")
+        self.ticker = bytes(self._mm[_FILE.size:_FILE.size + name_len]).decode()
+
+        # Block table: header offset, count, first/last ts_ns
+        offset = _FILE.size + name_len
+        table = []
+        while offset + _BLOCK.size <= size:
+            count, length, _, first_ts, last_ts, _, _, _, _, _ = _BLOCK.unpack_from(self._mm, offset)
+            if count == 0 or offset + _BLOCK.size + length > size:
+                break       # torn tail
+            table.append((offset, count, first_ts, last_ts))
+            offset += _BLOCK.size + length
+        self.end = offset       # end of the valid data
+        self.blocks = np.array(table, dtype=[("offset", np.int64), ("count", np.int64),
+                                             ("first_ts", np.int64), ("last_ts", np.int64)])
+
+    def __len__(self):
+        return int(self.blocks["count"].sum())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._mm is not None:
+            self._view.release()
+            self._mm.close()
+            self._file.close()
+            self._mm = None
+
+    def _decode_block(self, offset, ts_out, price_out, qty_out):
+        count, length, crc, first_ts, _, first_price, codec, ts_w, price_w, qty_w = _BLOCK.unpack_from(self._mm, offset)
+        payload = self._view[offset + _BLOCK.size:offset + _BLOCK.size + length]
+        if zlib.crc32(payload) != crc:
+            raise ValueError(f"{self.path}: corrupt block at byte {offset}")
+        raw = _decompress(codec, payload, count * (ts_w + price_w + qty_w))
+
+        ts_deltas = np.frombuffer(raw, dtype=f"<i{ts_w}", count=count)
+        price_deltas = np.frombuffer(raw, dtype=f"<i{price_w}", count=count, offset=count * ts_w)
+        quantities = np.frombuffer(raw, dtype=f"<i{qty_w}", count=count, offset=count * (ts_w + price_w))
+        np.cumsum(ts_deltas, dtype=np.int64, out=ts_out)
+        ts_out += first_ts
+        np.cumsum(price_deltas, dtype=np.int64, out=price_out)
+        price_out += first_price
+        qty_out[:] = quantities
+        del ts_deltas, price_deltas, quantities     # release views on the map before it can be closed
+
+    def read_columns(self, start_ns: int = None, end_ns: int = None) -> dict:
+        """
+        {"ts_ns", "price_raw", "quantity"} int64 arrays of the ticks with
+        start_ns <= ts_ns < end_ns, in time order (files from before the
+        writer kept blocks ordered are sorted here).
+        """
+        blocks = self.blocks
+        if start_ns is not None:
+            blocks = blocks[blocks["last_ts"] >= start_ns]
+        if end_ns is not None:
+            blocks = blocks[blocks["first_ts"] < end_ns]
+        total = int(blocks["count"].sum())
+        ts = np.empty(total, dtype=np.int64)
+        prices = np.empty(total, dtype=np.int64)
+        quantities = np.empty(total, dtype=np.int64)
+
+        i = 0
+        for offset, count in zip(blocks["offset"], blocks["count"]):
+            self._decode_block(int(offset), ts[i:i + count], prices[i:i + count], quantities[i:i + count])
+            i += count
+
+        # Only blocks straddling a bound need trimming
+        if total and ((start_ns is not None and blocks["first_ts"].min() < start_ns) or
+                      (end_ns is not None and blocks["last_ts"].max() >= end_ns)):
+            keep = np.ones(total, dtype=bool)
+            if start_ns is not None:
+                keep &= ts >= start_ns
+            if end_ns is not None:
+                keep &= ts < end_ns
+            ts, prices, quantities = ts[keep], prices[keep], quantities[keep]
+        if len(blocks) > 1 and (blocks["first_ts"][1:] < blocks["last_ts"][:-1]).any():
+            order = np.argsort(ts, kind="stable")
+            ts, prices, quantities = ts[order], prices[order], quantities[order]
+        return {"ts_ns": ts, "price_raw": prices, "quantity": quantities}
+
+    def read(self, start_ns: int = None, end_ns: int = None) -> np.ndarray:
+        """The same ticks as a TICK_DTYPE array."""
+        columns = self.read_columns(start_ns, end_ns)
+        ticks = np.empty(len(columns["ts_ns"]), dtype=TICK_DTYPE)
+        for name, values in columns.items():
+            ticks[name] = values
+        ticks["exchange_code"] = self.exchange_code
+        return ticks
+
+    def read_frame(self, start_ns: int = None, end_ns: int = None) -> pd.DataFrame:
+        """ticker/timestamp/ltp/ltq rows with naive local timestamps, like bar_builder.load_csv_ticks."""
+        columns = self.read_columns(start_ns, end_ns)
+        return pd.DataFrame({
+            "ticker": self.ticker,
+            "timestamp": pd.to_datetime(columns["ts_ns"], utc=True).tz_convert(LOCAL_TZ).tz_localize(None),
+            "ltp": columns["price_raw"] / self.multiplier,
+            "ltq": columns["quantity"],
+        })
+
+    def info(self) -> dict:
+        size = os.path.getsize(self.path)
+        ticks = len(self)
+        return {
+            "ticker": self.ticker,
+            "ticks": ticks,
+            "blocks": len(self.blocks),
+            "bytes": size,
+            "bytes_per_tick": round(size / ticks, 2) if ticks else None,
+            "first": datetime.fromtimestamp(self.blocks["first_ts"].min() / 1e9).isoformat() if ticks else None,
+            "last": datetime.fromtimestamp(self.blocks["last_ts"].max() / 1e9).isoformat() if ticks else None,
+        }
+
+
+class TickArchiveWriter:
+    """
+    Appends ticks of one ticker to an archive file in compressed blocks.
+    An existing file is continued after its last complete block; `fresh=True`
+    starts the file over. Blocks stay in time order: a write with ticks older
+    than the file's last tick rewrites the file with both merged, so
+    backfilling an earlier source costs a rewrite of that day's file. Every
+    tick given is kept; converting the same ticks from two sources in one run
+    stores them twice.
+    """
+
+    def __init__(self, path, ticker: str, exchange_code: int = None, codec=ARCHIVE_CODEC,
+                 level=ARCHIVE_LEVEL, block_ticks=ARCHIVE_BLOCK_TICKS, fresh=False):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown archive codec: {codec} (expected one of {', '.join(CODECS)})")
+        if codec == "zstd":
+            _zstd()
+        self.path = path
+        self.ticker = ticker.upper()
+        self.exchange_code = exchange_code_for(ticker) if exchange_code is None else exchange_code
+        self.multiplier = get_multiplier(self.exchange_code)
+        self.codec = CODECS[codec]
+        self.level = level
+        self.block_ticks = block_ticks
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        end = 0
+        self.last_ts = None     # newest tick in the file
+        if not fresh and os.path.exists(path) and os.path.getsize(path) > 0:
+            with TickArchive(path) as existing:
+                if existing.ticker != self.ticker or existing.exchange_code != self.exchange_code:
+                    raise ValueError(f"{path} holds {existing.ticker}, not {self.ticker}")
+                end = existing.end
+                if len(existing.blocks):
+                    self.last_ts = int(existing.blocks["last_ts"].max())
+        self._data_start = _FILE.size + len(self.ticker.encode())
+        self._file = open(path, "r+b" if end else "wb")
+        if end:
+            self._file.truncate(end)
+            self._file.seek(end)
+        else:
+            name = self.ticker.encode()
+            self._file.write(_FILE.pack(MAGIC, VERSION, self.exchange_code, self.multiplier, len(name)) + name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, ts_ns: np.ndarray, price_raw: np.ndarray, quantity: np.ndarray) -> int:
+        """Write ticks (any order; sorted by time here) as one or more blocks. Returns the count written."""
+        ts_ns = np.asarray(ts_ns, dtype=np.int64)
+        if not len(ts_ns):
+            return 0
+        price_raw = np.asarray(price_raw, dtype=np.int64)
+        quantity = np.asarray(quantity, dtype=np.int64)
+        count = len(ts_ns)
+        if self.last_ts is not None and ts_ns.min() < self.last_ts:
+            # Going back in time: merge with what the file holds and write it again
+            self._file.flush()
+            with TickArchive(self.path) as existing:
+                stored = existing.read_columns()
+            ts_ns = np.concatenate((stored["ts_ns"], ts_ns))
+            price_raw = np.concatenate((stored["price_raw"], price_raw))
+            quantity = np.concatenate((stored["quantity"], quantity))
+            self._file.seek(self._data_start)
+            self._file.truncate()
+            logger.info("♻️ %s: rewriting %d ticks in time order", self.path, len(ts_ns))
+
+        order = np.argsort(ts_ns, kind="stable")
+        ts_ns, price_raw, quantity = ts_ns[order], price_raw[order], quantity[order]
+        for i in range(0, len(ts_ns), self.block_ticks):
+            self._write_block(ts_ns[i:i + self.block_ticks], price_raw[i:i + self.block_ticks],
+                              quantity[i:i + self.block_ticks])
+        self.last_ts = int(ts_ns[-1])
+        return count
+
+    def write_ticks(self, ticks: np.ndarray) -> int:
+        """Write a TICK_DTYPE array (e.g. a ring buffer snapshot)."""
+        return self.write(ticks["ts_ns"], ticks["price_raw"], ticks["quantity"])
+
+    def _write_block(self, ts_ns, price_raw, quantity):
+        ts_deltas = _narrow(np.diff(ts_ns, prepend=ts_ns[0]))
+        price_deltas = _narrow(np.diff(price_raw, prepend=price_raw[0]))
+        quantities = _narrow(quantity)
+        payload = _compress(self.codec, ts_deltas.tobytes() + price_deltas.tobytes() + quantities.tobytes(),
+                            self.level)
+        self._file.write(_BLOCK.pack(len(ts_ns), len(payload), zlib.crc32(payload),
+                                     int(ts_ns[0]), int(ts_ns[-1]), int(price_raw[0]), self.codec,
+                                     ts_deltas.itemsize, price_deltas.itemsize, quantities.itemsize))
+        self._file.write(payload)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def archive_frame(ticks: pd.DataFrame, folder=ARCHIVE_FOLDER, codec=ARCHIVE_CODEC, written=None) -> dict:
+    """
+    Archive ticker/timestamp/ltp/ltq rows (naive local timestamps, as recorded)
+    into per-ticker, per-day files. Files not yet in `written` (a set shared
+    across calls of one conversion) are started over, so re-running a
+    conversion rebuilds its files instead of duplicating ticks.
+    Returns {path: ticks written}.
+    """
+    written = set() if written is None else written
+    result = {}
+    if ticks.empty:
+        return result
+    stamps = pd.to_datetime(ticks["timestamp"]).dt.as_unit("ns")
+    ts_ns = stamps.dt.tz_localize(LOCAL_TZ).astype("int64").to_numpy()
+    days = stamps.dt.date.to_numpy()
+    for (ticker, day), rows in ticks.groupby([ticks["ticker"].str.upper(), days]).indices.items():
+        try:
+            exchange_code = exchange_code_for(ticker)
+        except ValueError as e:
+            logger.warning("⚠️ Skipping %d ticks: %s", len(rows), e)
+            continue
+        path = archive_path(ticker, day, folder)
+        prices = np.rint(ticks["ltp"].to_numpy(np.float64)[rows] * get_multiplier(exchange_code)).astype(np.int64)
+        with TickArchiveWriter(path, ticker, exchange_code, codec, fresh=path not in written) as writer:
+            result[path] = result.get(path, 0) + writer.write(ts_ns[rows], prices, ticks["ltq"].to_numpy()[rows])
+        written.add(path)
+    return result
+
+
+def convert_csvs(paths=None, folder=ARCHIVE_FOLDER, codec=ARCHIVE_CODEC, written=None) -> dict:
+    """Archive recorded tick CSVs (default: data/*.csv). Returns {archive path: ticks}."""
+    from backend.bar_builder import load_csv_ticks
+    paths = paths or sorted(glob.glob(os.path.join("data", "*.csv")))
+    written, result = set() if written is None else written, {}
+    for path in paths:
+        try:
+            ticks = load_csv_ticks(path)
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️ Skipping %s: %s", path, e)
+            continue
+        for target, count in archive_frame(ticks, folder, codec, written).items():
+            result[target] = result.get(target, 0) + count
+        logger.info("✅ %s: %d ticks archived", path, len(ticks))
+    return result
+
+
+def convert_collections(database, names=None, folder=ARCHIVE_FOLDER, codec=ARCHIVE_CODEC, written=None) -> dict:
+    """Archive Mongo tick collections (default: every tick collection, including the time-series one)."""
+    from backend.bar_builder import load_mongo_ticks
+    from backend.db_utils import is_bar_collection
+    if names is None:
+        names = sorted(n for n in database.list_collection_names()
+                       if not n.startswith(("system.", "_")) and not is_bar_collection(n))
+    written, result = set() if written is None else written, {}
+    for name in names:
+        ticks = load_mongo_ticks(database[name])
+        for target, count in archive_frame(ticks, folder, codec, written).items():
+            result[target] = result.get(target, 0) + count
+        logger.info("✅ mongo:%s: %d ticks archived", name, len(ticks))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert recorded ticks to compact archive files")
+    parser.add_argument("--csv", nargs="*", metavar="PATH", help="CSV files to convert (no paths = data/*.csv)")
+    parser.add_argument("--mongo", nargs="*", metavar="COLLECTION",
+                        help="Mongo collections to convert (no names = all tick collections)")
+    parser.add_argument("--folder", default=ARCHIVE_FOLDER)
+    parser.add_argument("--codec", choices=sorted(CODECS), default=ARCHIVE_CODEC)
+    parser.add_argument("--info", nargs="+", metavar="PATH", help="print a summary of archive files")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.info:
+        for path in args.info:
+            with TickArchive(path) as archive:
+                print(path, archive.info())
+        return
+    if args.mongo is None and args.csv is None:
+        parser.error("nothing to convert: pass --csv and/or --mongo")
+
+    written = set()     # files started in this run; later sources append to them
+    if args.csv is not None:
+        convert_csvs(args.csv or None, args.folder, args.codec, written)
+    if args.mongo is not None:
+        from backend.mongodb_connect import get_db
+        convert_collections(get_db(), args.mongo or None, args.folder, args.codec, written)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# tick_buffer.py
+
+import os
+import threading
+import numpy as np
+from backend.tick_record import TICK_DTYPE
+
+TICK_BUFFER_CAPACITY = int(os.getenv("TICK_BUFFER_CAPACITY", "10000"))     # recent ticks kept per ticker
+
+
+class TickRingBuffer:
+    """
+    Fixed-capacity buffer of the most recent ticks of one ticker, backed by
+    a TICK_DTYPE array, plus running session totals.
+
+    Every tick is written twice, at `i` and `i + capacity` of a
+    2 x capacity array, so the last N ticks are always one contiguous slice
+    and `last(n)` can return a view without copying.
+
+    There is one writer (the dispatcher / event loop) and no lock: the slot
+    is written before `count` is published, so readers never see a
+    half-written tick. A view is only stable until the writer wraps around
+    onto it (capacity - n more ticks); pass copy=True to keep it longer.
+    """
+
+    def __init__(self, ticker, multiplier, capacity=TICK_BUFFER_CAPACITY):
+        self.ticker = ticker
+        self.multiplier = multiplier
+        self.capacity = capacity
+        self.count = 0              # ticks ever appended
+        self._data = np.zeros(2 * capacity, dtype=TICK_DTYPE)
+        # Session totals, updated per tick in O(1)
+        self.volume = 0
+        self.turnover_raw = 0       # sum(price_raw * quantity)
+        self.high_raw = None
+        self.low_raw = None
+
+    def append(self, tick):
+        i = self.count % self.capacity
+        row = (tick.price_raw, tick.exchange_code, tick.quantity, tick.ts_ns)
+        self._data[i] = row
+        self._data[i + self.capacity] = row
+        self.volume += tick.quantity
+        self.turnover_raw += tick.price_raw * tick.quantity
+        if self.high_raw is None or tick.price_raw > self.high_raw:
+            self.high_raw = tick.price_raw
+        if self.low_raw is None or tick.price_raw < self.low_raw:
+            self.low_raw = tick.price_raw
+        self.count += 1             # publish last
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def last(self, n=None, copy=False):
+        """The last `n` ticks (default: all buffered), oldest first, as a TICK_DTYPE array."""
+        count = self.count
+        n = len(self) if n is None else min(n, len(self))
+        end = (count - 1) % self.capacity + 1 + self.capacity if count else self.capacity
+        view = self._data[end - n:end]
+        return view.copy() if copy else view
+
+    def last_trade(self):
+        """Last-traded state and session totals, or None before the first tick."""
+        count = self.count
+        if not count:
+            return None
+        row = self._data[(count - 1) % self.capacity]
+        m = self.multiplier
+        return {
+            "ticker": self.ticker,
+            "ltp": int(row["price_raw"]) / m,
+            "ltq": int(row["quantity"]),
+            "ts_ns": int(row["ts_ns"]),
+            "ticks": count,
+            "volume": self.volume,
+            "vwap": self.turnover_raw / self.volume / m if self.volume else None,
+            "high": self.high_raw / m,
+            "low": self.low_raw / m,
+        }
+
+    def stats(self, n=None, seconds=None):
+        """
+        VWAP, volume, high/low over the last `n` buffered ticks, or over the
+        ticks of the last `seconds` (by receive time), computed on a view.
+        """
+        return window_stats(self.last(n), self.multiplier, seconds)
+
+
+def window_stats(ticks, multiplier, seconds=None):
+    """Rolling figures for a TICK_DTYPE array (oldest first), optionally only its last `seconds`."""
+    if seconds is not None and len(ticks):
+        cutoff = ticks["ts_ns"][-1] - int(seconds * 1e9)
+        ticks = ticks[np.searchsorted(ticks["ts_ns"], cutoff, side="left"):]
+    if not len(ticks):
+        return {"ticks": 0, "volume": 0, "vwap": None, "high": None, "low": None}
+
+    price = ticks["price_raw"]
+    qty = ticks["quantity"]
+    volume = int(qty.sum())
+    return {
+        "ticks": len(ticks),
+        "volume": volume,
+        "vwap": float(np.dot(price, qty)) / volume / multiplier if volume else None,
+        "high": int(price.max()) / multiplier,
+        "low": int(price.min()) / multiplier,
+        "first_ts_ns": int(ticks["ts_ns"][0]),
+        "last_ts_ns": int(ticks["ts_ns"][-1]),
+    }
+
+
+_buffers = {}       # ticker -> TickRingBuffer
+_buffers_lock = threading.Lock()
+
+
+def open_tick_buffer(ticker, multiplier, capacity=TICK_BUFFER_CAPACITY) -> TickRingBuffer:
+    """Return the buffer for `ticker`, creating it on first use (kept after the recording stops)."""
+    with _buffers_lock:
+        buffer = _buffers.get(ticker)
+        if buffer is None:
+            buffer = _buffers[ticker] = TickRingBuffer(ticker, multiplier, capacity)
+        return buffer
+
+
+def get_tick_buffer(ticker):
+    return _buffers.get(ticker.upper())
+
+
+def buffered_tickers():
+    return sorted(_buffers)
+
+
+def snapshot(ticker, n=100, copy=False):
+    """(last n ticks, last-trade state) for `ticker`, or (None, None) if it has no buffer."""
+    buffer = get_tick_buffer(ticker)
+    if buffer is None:
+        return None, None
+    return buffer.last(n, copy), buffer.last_trade()
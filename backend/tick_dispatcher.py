@@ -0,0 +1,80 @@
+# tick_dispatcher.py
+
+import logging
+import queue
+import threading
+import time
+from backend.metrics import DISPATCH_LATENCY
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class TickDispatcher:
+    """
+    Routes ticks from the WebSocket callbacks to per-instrument handlers on a
+    single worker thread.
+
+    Socket callbacks call `submit(key, tick)`, which only enqueues onto one
+    multiplexed queue. The worker blocks on that queue (no polling, no sleeps)
+    and calls the handler registered for `key`, so recording N instruments
+    costs one thread instead of N.
+    """
+
+    def __init__(self, name="tick-dispatcher"):
+        self.name = name
+        self._queue = queue.Queue()
+        self._handlers = {}         # key -> callable(tick)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Drain what is already queued, then stop the worker thread."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put((_STOP, None, None))
+            thread.join(timeout)
+
+    def register(self, key: str, handler):
+        with self._lock:
+            self._handlers[key] = handler
+        self.start()
+
+    def unregister(self, key: str):
+        with self._lock:
+            self._handlers.pop(key, None)
+
+    def is_registered(self, key: str) -> bool:
+        return key in self._handlers
+
+    def submit(self, key: str, tick):
+        """Called from the socket thread; never blocks."""
+        self._queue.put((key, tick, time.perf_counter()))
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            key, tick, enqueued = self._queue.get()
+            if key is _STOP:
+                return
+            DISPATCH_LATENCY.observe(time.perf_counter() - enqueued)
+
+            handler = self._handlers.get(key)
+            if handler is None:
+                continue    # instrument was stopped while the tick was in flight
+
+            try:
+                handler(tick)
+            except Exception as e:
+                logger.exception("Tick handler for %s failed: %s", key, e)
@@ -0,0 +1,134 @@
+# tick_policy.py
+
+import json
+import logging
+import os
+from backend.config import load_env
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# Defaults for every ticker (overridable from .env)
+DEDUP_FIELDS = os.getenv("TICK_DEDUP_FIELDS", "last_traded_time,trade_volume")   # exchange fields identifying a trade
+CONFLATE_MS = float(os.getenv("TICK_CONFLATE_MS", "0"))                          # 0 = store every tick
+MIN_CHANGE_BPS = float(os.getenv("TICK_MIN_CHANGE_BPS", "0"))                    # 0 = no threshold
+DROP_ZERO_QUANTITY = os.getenv("TICK_DROP_ZERO_QUANTITY", "true").strip().lower() in ("1", "true", "yes")
+
+# Per-ticker overrides: {"RELIANCE.NSE": {"conflate_ms": 250}, "*": {...}}
+TICK_POLICY_PATH = os.getenv("TICK_POLICY_PATH", os.path.join("data", "tick_policies.json"))
+
+
+class TickPolicy:
+    """
+    Decides which ticks of one instrument are written. Checks run in order:
+
+    1. zero quantity   - dropped when `drop_zero_quantity` is set.
+    2. exact duplicate - a tick whose `dedup_fields` (exchange time and
+       cumulative volume of the detailed market data by default) equal the
+       previous tick's is a resend of the same trade. When the feed does not
+       carry those fields, (price, quantity) of consecutive ticks is used.
+    3. change threshold - a tick that moves the price less than
+       `min_change_bps` basis points from the last written tick is skipped.
+    4. conflation      - at most one tick per `conflate_ms` window is
+       written: the last tick of each window, emitted when the first tick of
+       a later window arrives or on `flush()`.
+
+    Steps 1-2 remove bad data; 3-4 trade detail for storage and are off by
+    default. `saved` counts the ticks each step removed.
+    """
+
+    __slots__ = ("dedup_fields", "conflate_ns", "min_change_bps", "drop_zero_quantity",
+                 "saved", "_last_key", "_last_price", "_held", "_held_window")
+
+    def __init__(self, dedup_fields=DEDUP_FIELDS, conflate_ms=CONFLATE_MS,
+                 min_change_bps=MIN_CHANGE_BPS, drop_zero_quantity=DROP_ZERO_QUANTITY):
+        if isinstance(dedup_fields, str):
+            dedup_fields = [f.strip() for f in dedup_fields.split(",") if f.strip()]
+        self.dedup_fields = tuple(dedup_fields)
+        self.conflate_ns = int(conflate_ms * 1_000_000)
+        self.min_change_bps = min_change_bps
+        self.drop_zero_quantity = drop_zero_quantity
+        self.saved = {"no_quantity": 0, "duplicate": 0, "below_threshold": 0, "conflated": 0}
+        self._last_key = None
+        self._last_price = None     # price_raw of the last tick that passed the threshold
+        self._held = None           # tick waiting for its conflation window to close
+        self._held_window = None
+
+    def reject(self, tick, raw_data):
+        """Reason string if the tick is zero-quantity or a duplicate, else None. Updates the dedup key."""
+        if tick.quantity <= 0 and self.drop_zero_quantity:
+            self.saved["no_quantity"] += 1
+            return "no_quantity"
+
+        key = None
+        if self.dedup_fields:
+            try:
+                key = tuple(raw_data[f] for f in self.dedup_fields)
+            except KeyError:
+                key = None
+        if key is None:
+            key = (tick.price_raw, tick.quantity)
+        if key == self._last_key:
+            self.saved["duplicate"] += 1
+            return "duplicate"
+        self._last_key = key
+        return None
+
+    def admit(self, tick):
+        """
+        Apply the threshold and conflation to a valid tick. Returns
+        (ticks to write now, reason the tick was held back or None).
+        """
+        if self.min_change_bps and self._last_price is not None:
+            if abs(tick.price_raw - self._last_price) * 10_000 < self.min_change_bps * self._last_price:
+                self.saved["below_threshold"] += 1
+                return (), "below_threshold"
+        self._last_price = tick.price_raw
+
+        if not self.conflate_ns:
+            return (tick,), None
+
+        window = tick.ts_ns // self.conflate_ns
+        held, held_window = self._held, self._held_window
+        self._held, self._held_window = tick, window
+        if held is None:
+            return (), None
+        if held_window == window:
+            self.saved["conflated"] += 1      # `held` is replaced by a newer tick of the same window
+            return (), "conflated"
+        return (held,), None
+
+    def flush(self):
+        """The tick still waiting in an open conflation window, if any."""
+        held, self._held, self._held_window = self._held, None, None
+        return (held,) if held is not None else ()
+
+
+_overrides = None
+
+
+def load_policy_overrides(path=TICK_POLICY_PATH) -> dict:
+    """Per-ticker policy settings from `path` (read once); a missing or bad file means none."""
+    global _overrides
+    if _overrides is None:
+        _overrides = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    _overrides = {k.upper(): v for k, v in json.load(f).items()}
+            except (OSError, ValueError) as e:
+                logger.warning("⚠️ Ignoring unreadable tick policy file %s: %s", path, e)
+    return _overrides
+
+
+def policy_for(ticker: str) -> TickPolicy:
+    """TickPolicy for `ticker`: .env defaults, then the "*" entry, then the ticker's own entry."""
+    overrides = load_policy_overrides()
+    settings = dict(overrides.get("*", {}))
+    settings.update(overrides.get(ticker.upper(), {}))
+    try:
+        return TickPolicy(**settings)
+    except TypeError as e:
+        logger.warning("⚠️ Invalid tick policy for %s (%s); using defaults", ticker, e)
+        return TickPolicy()
@@ -0,0 +1,136 @@
+# tick_record.py
+
+import itertools
+import os
+import struct
+from datetime import datetime
+from decimal import Decimal
+import numpy as np
+from backend.exchange_constants import get_exchange_name, get_multiplier
+
+# Same fields as Tick, for holding many ticks in one NumPy array
+TICK_DTYPE = np.dtype([
+    ("price_raw", np.int64),       # exchange integer price (LTP * multiplier)
+    ("exchange_code", np.int8),
+    ("quantity", np.int64),
+    ("ts_ns", np.int64),           # epoch nanoseconds, local receive time
+])
+
+# Capture ids: a per-process random part and a counter, like tick_spool's record ids
+_process_id = os.urandom(3)
+_capture_seq = itertools.count(1)       # next() is atomic under the GIL
+
+
+def _reseed_capture_ids():
+    global _process_id, _capture_seq
+    _process_id, _capture_seq = os.urandom(3), itertools.count(1)
+
+
+os.register_at_fork(after_in_child=_reseed_capture_ids)
+
+_last_formatted = (None, None)     # (second, strings), swapped as one object so threads never see a torn pair
+
+
+def format_date_time(ts_ns: int):
+    """
+    Return ("%d-%m-%y", "%H:%M:%S") strings for an epoch-ns timestamp.
+    Ticks arrive many per second, so the last second's strings are reused.
+    """
+    global _last_formatted
+    second = ts_ns // 1_000_000_000
+    cached_second, strings = _last_formatted
+    if second != cached_second:
+        dt = datetime.fromtimestamp(second)
+        strings = (dt.strftime("%d-%m-%y"), dt.strftime("%H:%M:%S"))
+        _last_formatted = (second, strings)
+    return strings
+
+
+class Tick:
+    """
+    Compact tick: integer raw price, exchange code, quantity and an
+    epoch-nanosecond timestamp. Nothing is divided or formatted until a
+    property is read, so the hot path only allocates this one object and
+    prices stay exact (see `price`) even for CDS's 10,000,000 multiplier.
+    """
+
+    __slots__ = ("ticker", "exchange_code", "price_raw", "quantity", "ts_ns", "capture_seq")
+
+    def __init__(self, ticker: str, exchange_code: int, price_raw: int, quantity: int, ts_ns: int):
+        self.ticker = ticker
+        self.exchange_code = exchange_code
+        self.price_raw = price_raw
+        self.quantity = quantity
+        self.ts_ns = ts_ns
+        self.capture_seq = next(_capture_seq)   # order of capture within this process
+
+    @property
+    def capture_id(self) -> bytes:
+        """
+        12 bytes shaped like an ObjectId (seconds, process id, capture
+        counter): increasing in capture order within a process, and fixed
+        for the tick, so a retried write reuses it.
+        """
+        return struct.pack(">I", self.ts_ns // 1_000_000_000) + _process_id + self.capture_seq.to_bytes(5, "big")
+
+    @property
+    def multiplier(self) -> int:
+        return get_multiplier(self.exchange_code)
+
+    @property
+    def exchange(self) -> str:
+        return get_exchange_name(self.exchange_code)
+
+    @property
+    def price(self) -> Decimal:
+        """Exact last traded price."""
+        return Decimal(self.price_raw) / self.multiplier
+
+    @property
+    def ltp(self) -> float:
+        return self.price_raw / self.multiplier
+
+    @property
+    def ltq(self) -> int:
+        return self.quantity
+
+    @property
+    def timestamp(self) -> datetime:
+        return datetime.fromtimestamp(self.ts_ns / 1e9)
+
+    @property
+    def date_str(self) -> str:
+        return format_date_time(self.ts_ns)[0]
+
+    @property
+    def time_str(self) -> str:
+        return format_date_time(self.ts_ns)[1]
+
+    def as_row(self) -> list:
+        """[Ticker, Date, Time, LTP, LTQ] as written to the CSV files."""
+        date_str, time_str = format_date_time(self.ts_ns)
+        return [self.ticker, date_str, time_str, self.ltp, self.quantity]
+
+    def to_dict(self) -> dict:
+        """The dict layout format_tick used to return."""
+        date_str, time_str = format_date_time(self.ts_ns)
+        return {
+            "symbol": self.ticker,
+            "date": date_str,
+            "time": time_str,
+            "ltp": self.ltp,
+            "ltq": self.quantity,
+            "timestamp": self.timestamp,
+        }
+
+    def __repr__(self):
+        return f"Tick({self.ticker} {self.price} x {self.quantity} @ {self.ts_ns})"
+
+
+def ticks_to_array(ticks) -> np.ndarray:
+    """Pack a sequence of Tick objects into a TICK_DTYPE array."""
+    return np.fromiter(
+        ((t.price_raw, t.exchange_code, t.quantity, t.ts_ns) for t in ticks),
+        dtype=TICK_DTYPE,
+        count=len(ticks),
+    )
@@ -0,0 +1,389 @@
+# tick_spool.py
+
+import atexit
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from backend.config import load_env
+try:
+    import fcntl
+except ImportError:     # Windows: no folder lock
+    fcntl = None
+from backend.metrics import registry
+from backend.tick_record import Tick
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# Spool settings (overridable from .env)
+TICK_SPOOL = os.getenv("TICK_SPOOL", "false").strip().lower() in ("1", "true", "yes")
+SPOOL_FOLDER = os.getenv("SPOOL_FOLDER", os.path.join("data", "spool"))
+if os.getenv("RECORDER_SHARD_ID"):
+    # Shard processes (shard_supervisor) each get their own spool
+    SPOOL_FOLDER = os.path.join(SPOOL_FOLDER, f"shard-{os.getenv('RECORDER_SHARD_ID')}")
+SPOOL_SEGMENT_BYTES = int(float(os.getenv("SPOOL_SEGMENT_MB", "64")) * 1024 * 1024)
+SPOOL_BATCH_SIZE = int(os.getenv("SPOOL_BATCH_SIZE", "2000"))           # records per delivery
+SPOOL_DRAIN_INTERVAL = float(os.getenv("SPOOL_DRAIN_INTERVAL", "0.5"))   # seconds to wait for a full batch
+SPOOL_RETRY_INITIAL = float(os.getenv("SPOOL_RETRY_INITIAL", "0.5"))     # seconds, doubled per failed attempt
+SPOOL_RETRY_MAX = float(os.getenv("SPOOL_RETRY_MAX", "30"))
+SPOOL_MAX_ATTEMPTS = int(os.getenv("SPOOL_MAX_ATTEMPTS", "10"))          # then the batch is dead-lettered
+
+# Record: header (payload length, crc32 of payload) + payload
+# (seq, ts_ns, price_raw, quantity, exchange_code, ticker length) + ticker bytes.
+# A zero length marks the end of the data written to a segment.
+_HEADER = struct.Struct("<II")
+_PAYLOAD = struct.Struct("<QqqqbB")
+
+SPOOL_RETRIES = registry.counter("recorder_spool_retries_total", "Failed spool deliveries that were retried")
+SPOOL_DEAD_LETTERED = registry.counter("recorder_spool_dead_letter_ticks_total",
+                                       "Spooled ticks set aside after SPOOL_MAX_ATTEMPTS failed deliveries")
+
+
+class TickSpool:
+    """
+    Append-only, crash-safe log of ticks in memory-mapped segment files
+    (<folder>/00000001.seg, ...). `append` only copies a few dozen bytes into
+    the mapped page cache, so capture never waits on the network or disk;
+    the pages survive a process crash and reach disk in the background.
+
+    Every record carries a sequence number. The reader position is
+    checkpointed (checkpoint.json) only after a batch was delivered, so after
+    a crash everything past the checkpoint is delivered again. Each sink's
+    highest durably stored sequence number is kept in sinks.json (see
+    `sink_marks`), and replayed records at or below it are skipped; the Mongo
+    sink also writes them under stable ids (see `record_id`). A file sink
+    can therefore repeat at most the one batch it flushed just before a
+    crash, before its mark was saved. Segments behind the checkpoint are
+    deleted.
+
+    A spool belongs to one process: the folder is locked (flock) while open,
+    and a second process opening it fails instead of writing over it.
+    """
+
+    def __init__(self, folder=SPOOL_FOLDER, segment_bytes=SPOOL_SEGMENT_BYTES):
+        self.folder = folder
+        self.segment_bytes = segment_bytes
+        os.makedirs(folder, exist_ok=True)
+        self._lock_file = self._lock_folder()
+        self._lock = threading.Lock()
+        self._appended = threading.Condition(self._lock)
+        self._maps = {}             # segment index -> (file, mmap)
+        self._maps_lock = threading.Lock()
+        self.spool_id = self._load_spool_id()
+
+        self._sink_marks = self._load_json("sinks.json", {})
+        checkpoint = self._load_checkpoint()
+        self.read_pos = (checkpoint["segment"], checkpoint["offset"])
+        self.committed_seq = checkpoint["seq"]
+
+        # Recover the write position: scan past the checkpoint to the last valid record
+        indexes = self._segment_indexes() or [self.read_pos[0]]
+        index, offset, last_seq = self.read_pos[0], self.read_pos[1], self.committed_seq
+        while True:
+            for next_offset, seq, _ in self._scan(index, offset):
+                offset, last_seq = next_offset, seq
+            if index >= indexes[-1]:
+                break
+            index, offset = index + 1, 0
+        self.write_pos = (index, offset)
+        self.next_seq = last_seq + 1
+        _, mm = self._map(index)
+        mm[offset:] = bytes(len(mm) - offset)      # clear a torn tail left by a crash
+        if self.next_seq - 1 > self.committed_seq:
+            logger.info("♻️ Spool has %d undelivered ticks to replay", self.next_seq - 1 - self.committed_seq)
+
+    # --- files ---
+
+    def _segment_path(self, index):
+        return os.path.join(self.folder, f"{index:08d}.seg")
+
+    def _segment_indexes(self):
+        return sorted(int(name[:-4]) for name in os.listdir(self.folder) if name.endswith(".seg"))
+
+    def _lock_folder(self):
+        f = open(os.path.join(self.folder, "lock"), "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                raise RuntimeError(f"Spool folder {self.folder} is in use by another process")
+        return f
+
+    def _map(self, index):
+        with self._maps_lock:
+            entry = self._maps.get(index)
+            if entry is None:
+                path = self._segment_path(index)
+                f = open(path, "r+b" if os.path.exists(path) else "w+b")
+                if os.fstat(f.fileno()).st_size < self.segment_bytes:
+                    f.truncate(self.segment_bytes)
+                entry = self._maps[index] = (f, mmap.mmap(f.fileno(), 0))
+            return entry
+
+    def _unmap(self, index):
+        with self._maps_lock:
+            entry = self._maps.pop(index, None)
+        if entry is not None:
+            f, mm = entry
+            mm.close()
+            f.close()
+
+    def _load_spool_id(self) -> bytes:
+        """3 random bytes naming this spool, so record ids stay unique if the folder is ever reset."""
+        path = os.path.join(self.folder, "spool_id")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read(3)
+        spool_id = os.urandom(3)
+        with open(path, "wb") as f:
+            f.write(spool_id)
+        return spool_id
+
+    def _load_json(self, name, default):
+        path = os.path.join(self.folder, name)
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        return default
+
+    def _save_json(self, name, data):
+        """Replace <folder>/name atomically and durably."""
+        path = os.path.join(self.folder, name)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+
+    def _load_checkpoint(self):
+        first = (self._segment_indexes() or [1])[0]
+        return self._load_json("checkpoint.json", {"segment": first, "offset": 0, "seq": 0})
+
+    # --- records ---
+
+    def _scan(self, index, offset, end=None):
+        """Yield (next offset, seq, Tick) for valid records of one segment starting at `offset`."""
+        _, mm = self._map(index)
+        end = len(mm) if end is None else end
+        while offset + _HEADER.size <= end:
+            length, crc = _HEADER.unpack_from(mm, offset)
+            start = offset + _HEADER.size
+            if length == 0 or start + length > end:
+                return
+            payload = mm[start:start + length]
+            if zlib.crc32(payload) != crc:
+                return
+            seq, ts_ns, price_raw, quantity, exchange_code, n = _PAYLOAD.unpack_from(payload)
+            ticker = payload[_PAYLOAD.size:_PAYLOAD.size + n].decode()
+            offset = start + length
+            yield offset, seq, Tick(ticker, exchange_code, price_raw, quantity, ts_ns)
+
+    def append(self, tick) -> int:
+        """Spool one Tick; returns its sequence number."""
+        name = tick.ticker.encode()
+        with self._lock:
+            seq = self.next_seq
+            payload = _PAYLOAD.pack(seq, tick.ts_ns, tick.price_raw, tick.quantity, tick.exchange_code, len(name)) + name
+            record = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+            index, offset = self.write_pos
+            if offset + len(record) + _HEADER.size > self.segment_bytes:     # keep room for the end marker
+                index, offset = index + 1, 0
+            _, mm = self._map(index)
+            mm[offset:offset + len(record)] = record
+            self.write_pos = (index, offset + len(record))
+            self.next_seq = seq + 1
+            self._appended.notify()
+        return seq
+
+    def read_batch(self, max_records=SPOOL_BATCH_SIZE, timeout=SPOOL_DRAIN_INTERVAL):
+        """
+        Up to `max_records` undelivered (seq, Tick) pairs, waiting up to
+        `timeout` for a full batch. Returns (records, position after them).
+        """
+        with self._lock:
+            if self.next_seq - 1 - self.committed_seq < max_records:
+                self._appended.wait_for(lambda: self.next_seq - 1 - self.committed_seq >= max_records, timeout)
+            write_pos = self.write_pos
+
+        records = []
+        index, offset = self.read_pos
+        while len(records) < max_records:
+            end = write_pos[1] if index == write_pos[0] else None
+            for next_offset, seq, tick in self._scan(index, offset, end):
+                records.append((seq, tick))
+                offset = next_offset
+                if len(records) == max_records:
+                    break
+            else:
+                if index >= write_pos[0]:
+                    break
+                index, offset = index + 1, 0
+        return records, (index, offset)
+
+    def commit(self, position, seq):
+        """Record that everything before `position` (up to `seq`) was delivered, and drop finished segments."""
+        self._save_json("checkpoint.json", {"segment": position[0], "offset": position[1], "seq": seq})
+        with self._lock:
+            self.read_pos, self.committed_seq = position, seq
+            for index in [i for i in self._segment_indexes() if i < position[0]]:
+                self._unmap(index)
+                os.remove(self._segment_path(index))
+
+    def sink_marks(self) -> dict:
+        """{sink name: highest seq it has stored durably}; records at or below it are not delivered to it again."""
+        with self._lock:
+            return dict(self._sink_marks)
+
+    def save_sink_marks(self, marks: dict):
+        """Raise sinks' marks (only ever forward) and persist them before returning."""
+        with self._lock:
+            for name, seq in marks.items():
+                self._sink_marks[name] = max(seq, self._sink_marks.get(name, 0))
+            self._save_json("sinks.json", self._sink_marks)
+
+    def pending(self) -> int:
+        """Ticks spooled but not yet delivered."""
+        return self.next_seq - 1 - self.committed_seq
+
+    def record_id(self, seq: int, ts_ns: int) -> bytes:
+        """
+        12 stable bytes for a record, shaped like an ObjectId (seconds, then
+        spool id and sequence) so ids still sort by time.
+        """
+        return struct.pack(">I", ts_ns // 1_000_000_000) + self.spool_id + seq.to_bytes(5, "big")
+
+    def sync(self):
+        """Flush the mapped pages to disk (capture only reaches the page cache)."""
+        with self._maps_lock:
+            maps = [mm for _, mm in self._maps.values()]
+        for mm in maps:
+            mm.flush()
+
+    def dead_letter(self, records):
+        """Set a batch that cannot be delivered aside as JSON lines in <folder>/dead/."""
+        folder = os.path.join(self.folder, "dead")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{records[0][0]:012d}-{records[-1][0]:012d}.jsonl")
+        with open(path, "w") as f:
+            for seq, tick in records:
+                f.write(json.dumps({"seq": seq, "ticker": tick.ticker, "exchange_code": tick.exchange_code,
+                                    "price_raw": tick.price_raw, "quantity": tick.quantity,
+                                    "ts_ns": tick.ts_ns}) + "\n")
+        return path
+
+    def close(self):
+        self.sync()
+        with self._lock:
+            for index in list(self._maps):
+                self._unmap(index)
+        self._lock_file.close()     # releases the folder lock
+
+
+class SpoolDrainer:
+    """
+    Delivers spooled ticks to storage on one background thread.
+
+    `deliver(records)` receives a list of (seq, Tick) and must raise if the
+    batch was not stored. Failed batches are retried with exponential
+    backoff (SPOOL_RETRY_INITIAL .. SPOOL_RETRY_MAX) while capture keeps
+    appending to the spool; the checkpoint only moves after a success, or
+    after `max_attempts` failures, when the batch is written to the dead
+    letter folder so one bad batch cannot block delivery for good.
+    """
+
+    def __init__(self, spool: TickSpool, deliver, batch_size=SPOOL_BATCH_SIZE, max_attempts=SPOOL_MAX_ATTEMPTS):
+        self.spool = spool
+        self.deliver = deliver
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._running = False
+        self._thread = None
+        self._idle = threading.Event()
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="spool-drainer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Deliver what is already spooled (within `timeout`), then stop."""
+        self.wait_drained(timeout)
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.spool.sync()
+
+    def wait_drained(self, timeout: float = 10.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while self.spool.pending() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return not self.spool.pending()
+
+    def _run(self):
+        while self._running:
+            records, position = self.spool.read_batch(self.batch_size)
+            if not records:
+                continue
+
+            delay = SPOOL_RETRY_INITIAL
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    self.deliver(records)
+                    break
+                except Exception as e:
+                    if attempt == self.max_attempts:
+                        path = self.spool.dead_letter(records)
+                        SPOOL_DEAD_LETTERED.inc(len(records))
+                        logger.error("❌ Spool delivery of %d ticks failed %d times (%s); moved to %s",
+                                     len(records), attempt, e, path)
+                        break
+                    SPOOL_RETRIES.inc()
+                    logger.warning("⚠️ Spool delivery of %d ticks failed (%s); retrying in %.1fs",
+                                   len(records), e, delay)
+                    time.sleep(delay)
+                    delay = min(delay * 2, SPOOL_RETRY_MAX)
+            self.spool.commit(position, records[-1][0])
+
+
+_spool = None
+_drainer = None
+_spool_lock = threading.Lock()
+
+
+def get_spool(deliver=None) -> TickSpool:
+    """
+    Process-wide spool. The first call (which must pass `deliver`) opens it,
+    replays anything left undelivered by a previous run, and starts draining.
+    """
+    global _spool, _drainer
+    with _spool_lock:
+        if _spool is None:
+            _spool = TickSpool()
+            _drainer = SpoolDrainer(_spool, deliver)
+            _drainer.start()
+            registry.gauge("recorder_spool_pending_ticks", "Ticks spooled but not yet stored",
+                           callback=lambda: {(): _spool.pending()})
+            atexit.register(close_spool)    # registered after the sinks, so it runs before they close
+        return _spool
+
+
+def wait_spool_drained(timeout: float = 10.0) -> bool:
+    if _drainer is None:
+        return True
+    return _drainer.wait_drained(timeout)
+
+
+def close_spool():
+    if _drainer is not None:
+        _drainer.stop()
+        _spool.close()
@@ -1,17 +1,129 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 from backend.exchange_constants import EXCHANGE_NAME_TO_CODE, get_multiplier
-import os
-from dotenv import load_dotenv
+from backend.config import load_env
 
 # Load all variables from .env
-load_dotenv()
+load_env()
 
 BASE_URL = os.getenv("BASE_URL")
 
-def resolve_ticker(ticker_with_exchange: str, access_token: str) -> dict:
+logger = logging.getLogger(__name__)
+
+# Instrument master cache settings (overridable from .env)
+INSTRUMENT_CACHE_PATH = os.getenv("INSTRUMENT_CACHE_PATH", os.path.join("data", "instrument_cache.json"))
+INSTRUMENT_CACHE_TTL = float(os.getenv("INSTRUMENT_CACHE_TTL", str(24 * 60 * 60)))  # seconds
+INSTRUMENT_CACHE_SIZE = int(os.getenv("INSTRUMENT_CACHE_SIZE", "5000"))
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "5"))                            # seconds per HTTP call
+WARM_WORKERS = int(os.getenv("INSTRUMENT_WARM_WORKERS", "16"))
+
+
+class InstrumentCache:
+    """
+    In-memory instrument master keyed by 'SYMBOL.EXCHANGE', with a TTL per
+    entry and LRU eviction beyond `max_size`. Entries can be persisted to a
+    JSON file so a restart does not have to hit the search API again.
+    """
+
+    def __init__(self, path=INSTRUMENT_CACHE_PATH, ttl=INSTRUMENT_CACHE_TTL, max_size=INSTRUMENT_CACHE_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()   # key -> (stored_at_epoch, instrument)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, instrument = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return instrument
+
+    def put(self, key, instrument, stored_at=None):
+        with self._lock:
+            self._entries[key] = (stored_at or time.time(), instrument)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def load(self):
+        """Load unexpired entries from `path`; a missing or corrupt file is ignored."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️ Ignoring unreadable instrument cache %s: %s", self.path, e)
+            return
+
+        now = time.time()
+        for key, entry in stored.items():
+            if now - entry["stored_at"] <= self.ttl:
+                self.put(key, entry["instrument"], entry["stored_at"])
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            stored = {key: {"stored_at": at, "instrument": inst} for key, (at, inst) in self._entries.items()}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"   # shard processes may save concurrently
+        with open(tmp_path, "w") as f:
+            json.dump(stored, f)
+        os.replace(tmp_path, self.path)
+
+
+instrument_cache = InstrumentCache()
+instrument_cache.load()
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Shared HTTP session so search calls reuse pooled keep-alive connections."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(WARM_WORKERS, 10))
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def _parse_ticker(ticker_with_exchange: str):
+    if '.' not in ticker_with_exchange:
+        raise ValueError("Ticker must be in format SYMBOL.EXCHANGE (e.g., RELIANCE.NSE)")
+
+    symbol, exchange = ticker_with_exchange.strip().upper().split('.')
+    if exchange not in EXCHANGE_NAME_TO_CODE:
+        raise ValueError(f"Unsupported exchange: {exchange}")
+    return symbol, exchange
+
+
+def resolve_ticker(ticker_with_exchange: str, access_token: str, use_cache: bool = True, persist: bool = True) -> dict:
     """
     Resolves a user-entered ticker like 'RELIANCE.NSE' or 'TCS.BSE'
     to the correct instrument details using the Stocko search API.
+    Results are served from the instrument cache when available.
 
     Returns:
         {
@@ -26,21 +138,24 @@ def resolve_ticker(ticker_with_exchange: str, access_token: str) -> dict:
     or raises ValueError if not found.
     """
     try:
-        if '.' not in ticker_with_exchange:
-            raise ValueError("Ticker must be in format SYMBOL.EXCHANGE (e.g., RELIANCE.NSE)")
+        symbol, exchange = _parse_ticker(ticker_with_exchange)
+        cache_key = f"{symbol}.{exchange}"
 
-        symbol, exchange = ticker_with_exchange.strip().upper().split('.')
-        if exchange not in EXCHANGE_NAME_TO_CODE:
-            raise ValueError(f"Unsupported exchange: {exchange}")
+        if use_cache:
+            cached = instrument_cache.get(cache_key)
+            if cached is not None:
+                return dict(cached)
 
         headers = {
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json"
         }
 
-        response = requests.get(
-            f"{BASE_URL}/api/v1/search?key={symbol}",
-            headers=headers
+        response = get_session().get(
+            f"{BASE_URL}/api/v1/search",
+            params={"key": symbol},
+            headers=headers,
+            timeout=SEARCH_TIMEOUT
         )
 
         if response.status_code != 200:
@@ -48,8 +163,6 @@ def resolve_ticker(ticker_with_exchange: str, access_token: str) -> dict:
 
         results = response.json().get("result", [])
 
-        
-
         for item in results:
             if (
                 item.get("symbol", "").upper() == symbol
@@ -57,8 +170,8 @@ def resolve_ticker(ticker_with_exchange: str, access_token: str) -> dict:
             ):
                 exchange_code = EXCHANGE_NAME_TO_CODE.get(item["exchange"].upper(), -1)
                 multiplier = get_multiplier(exchange_code)
-                
-                return {
+
+                instrument = {
                     "symbol": item["symbol"],
                     "exchange": item["exchange"],
                     "exchange_code": exchange_code,
@@ -68,6 +181,10 @@ def resolve_ticker(ticker_with_exchange: str, access_token: str) -> dict:
                     "multiplier": multiplier
 
                 }
+                instrument_cache.put(cache_key, instrument)
+                if persist:
+                    instrument_cache.save()
+                return dict(instrument)
 
         raise ValueError(f"No matching instrument found for {ticker_with_exchange}. Search API returned {len(results)} results.")
 
@@ -75,5 +192,25 @@ def resolve_ticker(ticker_with_exchange: str, access_token: str) -> dict:
         raise ValueError(f"Error resolving ticker: {e}")
 
 
+def warm_instruments(tickers, access_token: str, max_workers: int = WARM_WORKERS) -> dict:
+    """
+    Resolve many tickers concurrently over the pooled session and store them
+    in the instrument cache (persisted once at the end).
+
+    Returns {ticker: instrument dict or ValueError}.
+    """
+    tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
+    if not tickers:
+        return {}
+
+    def _resolve(ticker):
+        try:
+            return resolve_ticker(ticker, access_token, persist=False)
+        except ValueError as e:
+            return e
 
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tickers))) as pool:
+        results = dict(zip(tickers, pool.map(_resolve, tickers)))
 
+    instrument_cache.save()
+    return results
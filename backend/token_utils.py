@@ -1,12 +1,15 @@
+import logging
 import requests
 # import os
-from dotenv import load_dotenv
+from backend.config import load_env
 
-load_dotenv() 
+load_env()
+
+logger = logging.getLogger(__name__)
 
 def is_token_valid(base_url, token):
     # client_id_new = os.getenv("CLIENT_ID_NEW")
-    print("DEBUG - TOKEN:", token)
+    logger.debug("Validating access token ending in ...%s", token[-4:])
     url = f"{base_url}/api/v1/user/profile"
     headers = {
         "Authorization": f"Bearer {token}"
@@ -14,8 +17,8 @@ def is_token_valid(base_url, token):
 
     try:
         response = requests.get(url, headers=headers, timeout=5)
-        print("DEBUG - Status Code:", response.status_code)
-        print("DEBUG - Response Body:", response.text)
+        logger.debug("Profile status code: %s", response.status_code)
+        logger.debug("Profile response body: %s", response.text)
 
         if response.status_code == 200:
             return True, response.json()  # Return profile data
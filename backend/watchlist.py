@@ -0,0 +1,22 @@
+# watchlist.py
+
+
+def parse_watchlist(text: str) -> list:
+    """
+    Parse a watchlist: tickers in SYMBOL.EXCHANGE form, separated by newlines
+    or commas. Blank entries and '#' comments are ignored; duplicates are
+    dropped while keeping the original order.
+    """
+    tickers = []
+    for line in text.splitlines():
+        line = line.split("#", 1)[0]
+        for entry in line.split(","):
+            entry = entry.strip().upper()
+            if entry:
+                tickers.append(entry)
+    return list(dict.fromkeys(tickers))
+
+
+def load_watchlist(path: str) -> list:
+    with open(path) as f:
+        return parse_watchlist(f.read())
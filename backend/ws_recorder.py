@@ -1,221 +1,420 @@
 # ws_recorder.py
 
+import atexit
+import functools
+import logging
 import os
-import time
-import queue
-import sys
 import threading
-from datetime import datetime
-from dotenv import load_dotenv
-from backend.ticker_resolver import resolve_ticker
+import time
+from backend.config import load_env, STORAGE_SINKS
+from backend.ticker_resolver import warm_instruments
 from backend.exchange_constants import get_exchange_name, get_multiplier
 from pyoauthbridge.connect import Connect
 from pyoauthbridge.wsclient import is_socket_open
-from backend.db_utils import insert_tick_data
-from backend.csv_utils import initialize_csv, save_tick_in_csv
+from backend.db_utils import insert_bar_data, flush_bar_data, get_tick_writer
+from backend.bar_builder import BarBuilder, CsvBarWriter
+from backend.sinks import get_pipeline
+from backend.connection_supervisor import ConnectionSupervisor, close_gap, new_gap_history, subscribe_batch
+from backend.tick_dispatcher import TickDispatcher
+from backend.tick_record import Tick
+from backend.tick_policy import policy_for
+from backend.tick_buffer import open_tick_buffer
+from backend.tick_spool import TICK_SPOOL, get_spool, wait_spool_drained
+from backend.metrics import registry, TICKS_RECEIVED, TICKS_STORED, TICKS_DROPPED, LAST_TICK_TIME
 from pyoauthbridge.wsclient import subscribe_ticker, unsubscribe_ticker
 
 
-load_dotenv()
+load_env()
+
+logger = logging.getLogger(__name__)
 
 CLIENT_ID = os.getenv("CLIENT_ID")
 CLIENT_SECRET = os.getenv("CLIENT_SECRET")
 REDIRECT_URI = os.getenv("REDIRECT_URI")
 BASE_URL = os.getenv("BASE_URL")
-STORAGE_MODE = os.getenv("STORAGE_MODE", "mongodb").strip().lower()
+
+# Bulk start tuning
+SUBSCRIBE_BATCH_SIZE = int(os.getenv("SUBSCRIBE_BATCH_SIZE", "50"))
+SUBSCRIBE_BATCH_PAUSE = float(os.getenv("SUBSCRIBE_BATCH_PAUSE", "0.05"))       # seconds between batches
+SUBSCRIBE_CONFIRM_TIMEOUT = float(os.getenv("SUBSCRIBE_CONFIRM_TIMEOUT", "3"))  # shared deadline for first ticks
 
 # ACCESS_TOKEN_PATH = "access_token_new.txt"
 
-# Shared socket connection
-shared_conn = Connect(CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, BASE_URL)
+# Shared socket connection, created on first use
+_conn = None
+_conn_lock = threading.Lock()
 
-recording_threads = {}      # ticker -> Thread
-recording_flags = {}        # ticker -> {"stop": False}
-recording_conns = {}        # ticker -> Connect object
 
-# # Auto-close if no activity for this duration
-# inactivity_timeout_sec = 30
-# last_active_time = time.time()
+def get_connection():
+    """Process-wide socket Connect; importing this module does not create it."""
+    global _conn
+    if _conn is None:
+        with _conn_lock:
+            if _conn is None:
+                _conn = Connect(CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, BASE_URL)
+    return _conn
 
 
-def format_tick(raw_data, symbol, exchange_code):
-    if "last_traded_price" not in raw_data or "last_traded_quantity" not in raw_data:
-        return None
+def __getattr__(name):
+    if name == "shared_conn":      # older callers import the connection by name
+        return get_connection()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    multiplier = get_multiplier(exchange_code)
-    exchange_name = get_exchange_name(exchange_code)
 
-    ltp_real = raw_data["last_traded_price"] / multiplier
-    timestamp = datetime.now()
+# Single dispatcher thread routes socket ticks to the recordings below
+dispatcher = TickDispatcher()
 
-    return {
-        "symbol": f"{symbol.upper()}.{exchange_name}",
-        "date": timestamp.strftime("%d-%m-%y"),
-        "time": timestamp.strftime("%H:%M:%S"),
-        "ltp": ltp_real,
-        "ltq": raw_data.get("last_traded_quantity", 0),
-    }
+active_recordings = {}      # ticker -> {"ticker", "instrument", "key", "store", "policy", "confirmed", "bars", "buffer", "gap", "gaps"}
+_exit_hook = threading.Lock()
+_exit_hook_registered = False
 
+# Finished OHLCV bars next to csv/parquet sinks
+bar_writer = CsvBarWriter()
+BARS_TO_FILES = any(name != "mongodb" for name in STORAGE_SINKS)
 
-def record_ticker(ticker, access_token, stop_flag):
-    print(f"[DEBUG] STORAGE_MODE = {STORAGE_MODE}")
-    global last_active_time
-    ticker = ticker.strip().upper()
+registry.gauge("recorder_dispatch_queue_depth", "Ticks waiting for the dispatcher thread",
+               callback=lambda: {(): dispatcher.qsize()})
+registry.gauge("recorder_active_recordings", "Tickers currently being recorded",
+               callback=lambda: {(): len(active_recordings)})
 
-    try:
-        instrument = resolve_ticker(ticker, access_token)
-    except ValueError as e:
-        print(f"❌ {e}")
-        return
+# # Auto-close if no activity for this duration
+# inactivity_timeout_sec = 30
+# last_active_time = time.time()
 
-    print(f"[DEBUG] Instrument: {instrument}")
 
-    conn = shared_conn
+def format_tick(raw_data, symbol, exchange_code, ticker=None):
+    """
+    Build a compact Tick (integer raw price, quantity, epoch-ns timestamp).
+    Division by the exchange multiplier and date/time strings are deferred to
+    the sinks that need them. `ticker` ("SYMBOL.EXCHANGE") can be passed to
+    avoid rebuilding it per tick.
+    """
+    if "last_traded_price" not in raw_data or "last_traded_quantity" not in raw_data:
+        return None
 
-    # Start socket if not already running
-    if not is_socket_open():
-        conn.set_access_token(access_token)
-        conn.run_socket()
+    if ticker is None:
+        ticker = f"{symbol.upper()}.{get_exchange_name(exchange_code)}"
+
+    return Tick(
+        ticker,
+        exchange_code,
+        int(raw_data["last_traded_price"]),
+        raw_data["last_traded_quantity"],
+        time.time_ns(),
+    )
+
+
+def process_tick(recording, raw_data):
+    """
+    Format one raw tick for a recording and run it through the recording's
+    TickPolicy: zero-quantity and duplicate ticks are dropped, every other
+    tick updates the ring buffer and the bars, and threshold/conflation
+    decide what is stored.
+    Returns the last Tick stored by this call, or None. Shared by the
+    threaded and the asyncio recorder.
+    """
+    instrument = recording["instrument"]
+    metrics = recording["metrics"]
+    metrics["received"].inc()
+
+    tick = format_tick(raw_data, instrument["symbol"], instrument["exchange_code"], recording["ticker"])
+    if not tick:
+        metrics["malformed"].inc()
+        return None
+    if recording["gap"] is not None:
+        close_gap(recording, tick.ts_ns)      # first tick after a reconnect
+    metrics["last_tick"].set(tick.ts_ns / 1e9)
+
+    policy = recording["policy"]
+    reason = policy.reject(tick, raw_data)
+    if reason:
+        metrics[reason].inc()
+        return None
 
-    # recording_conns[ticker] = conn
-    recording_conns[ticker] = {
-    "exchange_code": instrument["exchange_code"],
-    "token": instrument["token"]
-}
+    recording["buffer"].append(tick)    # in-memory view of recent trades for the UI and strategies
+    recording["bars"].on_tick(tick)     # bars see every trade, even ones conflated away below
 
-    payload = {
-        "exchangeCode": instrument["exchange_code"],
-        "instrumentToken": int(instrument["token"])
-    }
+    ready, reason = policy.admit(tick)
+    if reason:
+        metrics[reason].inc()
+    for out in ready:
+        recording["store"](out)
+        metrics["stored"].inc()
+    return ready[-1] if ready else None
 
-    conn.subscribe_detailed_marketdata(payload)
 
-    filepath = initialize_csv(ticker)
-    print(f"✅ Recording started for {ticker}")
+def flush_recording(recording):
+    """Store the tick still held by conflation and emit the open bars; called before the sinks close."""
+    for tick in recording["policy"].flush():
+        recording["store"](tick)
+        recording["metrics"]["stored"].inc()
+    recording["bars"].flush()
 
-    key = f"{instrument['token']}_{instrument['exchange_code']}"#new
 
-    previous = {}
-    try:
-        while not stop_flag["stop"]:
-            if not is_socket_open():
-                print(f"[{ticker}] Shared socket closed. Exiting recording loop.")
-                break
-            
-            # tick_data = conn.read_detailed_marketdata()
+def recording_metrics(ticker):
+    """Metric children for one ticker, looked up once so process_tick does no label lookups."""
+    return {
+        "received": TICKS_RECEIVED.labels(ticker),
+        "stored": TICKS_STORED.labels(ticker),
+        "malformed": TICKS_DROPPED.labels(ticker, "malformed"),
+        "no_quantity": TICKS_DROPPED.labels(ticker, "no_quantity"),
+        "duplicate": TICKS_DROPPED.labels(ticker, "duplicate"),
+        "below_threshold": TICKS_DROPPED.labels(ticker, "below_threshold"),
+        "conflated": TICKS_DROPPED.labels(ticker, "conflated"),
+        "last_tick": LAST_TICK_TIME.labels(ticker),
+    }
 
-            tick_data = conn.read_detailed_marketdata(key)#new
 
+def record_tick(ticker, raw_data):
+    """Dispatcher handler: process one raw tick for `ticker`."""
+    recording = active_recordings.get(ticker)
+    if recording is not None:
+        process_tick(recording, raw_data)
+
+
+def deliver_spooled(records):
+    """
+    Spool drainer callback: store a batch of (seq, Tick) in every sink and
+    make it durable before the spool checkpoint moves past it. Raises on
+    failure (retried).
+    """
+    get_pipeline().deliver_spooled(records, get_spool())
+
+
+def tick_store_for(ticker):
+    """Storage call for a recording: the spool, or the fan-out to the STORAGE_SINKS workers."""
+    pipeline = get_pipeline()       # opened before the spool, so it is closed after it at exit
+    if TICK_SPOOL:
+        return get_spool(deliver_spooled).append     # sinks are fed by the spool drainer
+    return pipeline.submit
+
+
+def _open_storage():
+    """
+    Open the sinks, the spool and the Mongo bar writer, then register
+    shutdown_recordings once. atexit runs hooks in reverse order, so the
+    hook runs while all of them are still open.
+    """
+    global _exit_hook_registered
+    with _exit_hook:
+        if _exit_hook_registered:
+            return
+        get_pipeline()
+        if TICK_SPOOL:
+            get_spool(deliver_spooled)
+        if "mongodb" in STORAGE_SINKS:
+            get_tick_writer()
+        atexit.register(shutdown_recordings)
+        _exit_hook_registered = True
+
+
+def shutdown_recordings():
+    """Exit hook: drain the dispatcher, then store what the policies and the open bars still hold."""
+    if not active_recordings:
+        return
+    connection_supervisor.stop()
+    dispatcher.stop()
+    for recording in list(active_recordings.values()):
+        flush_recording(recording)
+    bar_writer.close()
+    if not (get_pipeline().flush() and flush_bar_data()):
+        logger.warning("⚠️ Timed out flushing queued ticks at exit")
+
+
+def save_bar(bar):
+    """Persist a finished OHLCV bar next to the ticks: Mongo collections with a mongodb sink, data/bars/*.csv with a file sink."""
+    if "mongodb" in STORAGE_SINKS:
+        insert_bar_data(bar)
+    if BARS_TO_FILES:
+        bar_writer.write(bar)
+
+
+def _register(ticker, instrument):
+    """Create the recording state and route its key to record_tick before the first tick can arrive."""
+    key = f"{instrument['token']}_{instrument['exchange_code']}"
+    active_recordings[ticker] = {
+        "ticker": ticker,
+        "instrument": instrument,
+        "key": key,
+        "store": tick_store_for(ticker),
+        "policy": policy_for(ticker),       # dedup / threshold / conflation state
+        "confirmed": threading.Event(),     # set by the first tick received
+        "bars": BarBuilder(ticker, on_bar=save_bar),
+        "buffer": open_tick_buffer(ticker, get_multiplier(instrument["exchange_code"])),
+        "metrics": recording_metrics(ticker),
+        "gap": None,                        # open disconnect gap, see connection_supervisor
+        "gaps": new_gap_history(),
+    }
+    dispatcher.register(key, functools.partial(record_tick, ticker))
 
-            print(f"[DEBUG] Polled tick: {tick_data}")  #   Raw data from WebSocket
-            
-            if tick_data:
-                tick = format_tick(tick_data, instrument["symbol"], instrument["exchange_code"])
-                if tick:
-                    last_active_time = time.time()  # ⏰ Update only if tick is valid
 
-                    
+def _socket_callback(recording):
+    key = recording["key"]
+    confirmed = recording["confirmed"]
 
-                    print("[record_ticker] Tick LTP:", tick.get("ltp"), "LTQ:", tick.get("ltq"))
-                    ltp, ltq = tick["ltp"], tick["ltq"]
+    # ✅ Hand every tick to the dispatcher; the first one confirms the subscription
+    def on_tick(tick):
+        dispatcher.submit(key, tick)
+        if not confirmed.is_set():
+            confirmed.set()
+    return on_tick
 
-                    
-                    if ltq > 0 and (ltp != previous.get("ltp") or ltq != previous.get("ltq")):
-                        
-                        if STORAGE_MODE == "csv":
-                            save_tick_in_csv(tick, filepath)
-                        elif STORAGE_MODE == "mongodb":
-                             insert_tick_data(ticker, ltp, ltq)
-                        else:
-                            print("❌ Unknown storage mode:", STORAGE_MODE)
 
-                        previous = {"ltp": ltp, "ltq": ltq}
+def _subscribe(tickers):
+    """Attach each ticker's callback, then subscribe all their instruments in one packet."""
+    recordings = [active_recordings[ticker] for ticker in tickers]
+    for recording in recordings:
+        instrument = recording["instrument"]
+        subscribe_ticker(instrument["exchange_code"], instrument["token"], callback=_socket_callback(recording))
+    subscribe_batch(get_connection, [recording["instrument"] for recording in recordings])
 
 
-            time.sleep(0.05)
+def resubscribe_recordings(recordings):
+    """After a reconnect: re-attach every callback, then subscribe all instruments in one batch."""
+    for recording in recordings:
+        instrument = recording["instrument"]
+        subscribe_ticker(instrument["exchange_code"], instrument["token"], callback=_socket_callback(recording))
+    subscribe_batch(get_connection, [recording["instrument"] for recording in recordings])
 
-    finally:
-        print(f"🛑 Recording stopped for {ticker}")
-        try:
-            conn.unsubscribe_detailed_marketdata()
-        except Exception as e:
-            print(f"[ERROR] Closing socket failed: {e}")
 
-        recording_threads.pop(ticker, None)
-        recording_flags.pop(ticker, None)
-        recording_conns.pop(ticker, None)
+# Reconnects the shared socket and replays subscriptions while anything records
+connection_supervisor = ConnectionSupervisor(get_connection, lambda: list(active_recordings.values()),
+                                             resubscribe_recordings)
 
 
-def start_recording(ticker, access_token):
-    ticker = ticker.strip().upper()
+def start_recordings(tickers, access_token, timeout=SUBSCRIBE_CONFIRM_TIMEOUT):
+    """
+    Start recording several tickers at once.
 
-    if ticker in recording_threads:
-        return f"⚠️ {ticker} is already being recorded."
+    Instruments are resolved concurrently (through the instrument cache),
+    subscriptions are sent over the shared socket as one packet per
+    SUBSCRIBE_BATCH_SIZE instruments, and all confirmations are awaited against one
+    shared `timeout` deadline instead of one wait per ticker.
 
-    try:
-        instrument = resolve_ticker(ticker, access_token)
-    except ValueError as e:
-        return f"❌ Failed to resolve {ticker}: {e}"
+    Returns {ticker: {"status": "started" | "already_recording" | "failed", "message": str}}.
+    """
+    tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
+    report = {}
 
-    exchange_code = instrument["exchange_code"]
-    token = instrument["token"]
-    key = f"{token}_{exchange_code}"
+    to_start = []
+    for ticker in tickers:
+        if ticker in active_recordings:
+            report[ticker] = {"status": "already_recording", "message": f"⚠️ {ticker} is already being recorded."}
+        else:
+            to_start.append(ticker)
+    if not to_start:
+        return report
 
-    # ✅ Ensure queue exists
-    if key not in shared_conn.tick_queues:
-        shared_conn.tick_queues[key] = queue.Queue()
-        print(f"[start_recording] Created tick queue for {key}")
+    resolved = warm_instruments(to_start, access_token)
 
     # ✅ Ensure socket is open
     if not is_socket_open():
-        shared_conn.set_access_token(access_token)
-        success = shared_conn.run_socket()
-        if not success:
-            return "❌ WebSocket failed to connect."
-
-    # ✅ Set subscription success flag
-    subscribed_flag = {"success": False}
-
-    # ✅ Define the callback and push tick to queue
-    def test_callback(tick):
-        print(f"[test_callback] Received tick for {ticker}")
-        shared_conn.tick_queues[key].put(tick)
-        print(f"[test_callback] Tick pushed to queue for {key}")
-        subscribed_flag["success"] = True
-
-    # ✅ Subscribe to ticker with callback
-    subscribe_ticker(exchange_code, token, callback=test_callback)
+        conn = get_connection()
+        conn.set_access_token(access_token)
+        if not conn.run_socket():
+            for ticker in to_start:
+                report[ticker] = {"status": "failed", "message": "❌ WebSocket failed to connect."}
+            return report
+
+    connection_supervisor.start()
+    _open_storage()
+
+    registered = []
+    for ticker in to_start:
+        instrument = resolved[ticker]
+        if isinstance(instrument, Exception):
+            report[ticker] = {"status": "failed", "message": f"❌ Failed to resolve {ticker}: {instrument}"}
+            continue
+        _register(ticker, instrument)
+        registered.append(ticker)
+
+    # ✅ Send subscriptions in batches so a large watchlist does not flood the socket
+    subscribed = []
+    for i in range(0, len(registered), SUBSCRIBE_BATCH_SIZE):
+        batch = registered[i:i + SUBSCRIBE_BATCH_SIZE]
+        try:
+            _subscribe(batch)
+            subscribed.extend(batch)
+        except Exception as e:
+            for ticker in batch:
+                _teardown(ticker, flush=False)
+                report[ticker] = {"status": "failed", "message": f"❌ Subscribing {ticker} failed: {e}"}
+        if i + SUBSCRIBE_BATCH_SIZE < len(registered):
+            time.sleep(SUBSCRIBE_BATCH_PAUSE)
+
+    # ✅ Wait for first ticks against one shared deadline
+    deadline = time.monotonic() + timeout
+    for ticker in subscribed:
+        confirmed = active_recordings[ticker]["confirmed"]
+        if confirmed.wait(max(0.0, deadline - time.monotonic())):
+            report[ticker] = {"status": "started", "message": f"✅ Recording started for {ticker}"}
+            logger.info("✅ Recording started for %s", ticker)
+        else:
+            _teardown(ticker, flush=False)
+            report[ticker] = {
+                "status": "failed",
+                "message": f"❌ Failed to receive data for {ticker}. Subscription may have failed.",
+            }
+
+    return report
 
-    # ✅ Wait briefly to ensure subscription worked
-    for _ in range(10):
-        if subscribed_flag["success"]:
-            break
-        time.sleep(0.3)
 
-    if not subscribed_flag["success"]:
-        return f"❌ Failed to receive data for {ticker}. Subscription may have failed."
+def start_recording(ticker, access_token):
+    """Start a single ticker. Returns None on success, or an error/warning message."""
+    ticker = ticker.strip().upper()
+    result = start_recordings([ticker], access_token).get(ticker)
+    if result is None:
+        return "⚠️ Please enter a ticker."
+    return None if result["status"] == "started" else result["message"]
 
-    # ✅ Start recording thread
-    stop_flag = {"stop": False}
-    thread = threading.Thread(target=record_ticker, args=(ticker, access_token, stop_flag), daemon=True)
-    thread.start()
 
-    recording_threads[ticker] = thread
-    recording_flags[ticker] = stop_flag
-    return None  # Success
+def _teardown(ticker, flush=True):
+    recording = active_recordings.pop(ticker, None)
+    if recording is None:
+        return False
 
+    instrument = recording["instrument"]
+    dispatcher.unregister(recording["key"])
+    try:
+        unsubscribe_ticker(instrument["exchange_code"], instrument["token"])
+        if not active_recordings:
+            get_connection().unsubscribe_detailed_marketdata()
+    except Exception as e:
+        logger.error("Unsubscribing %s failed: %s", ticker, e)
+
+    flush_recording(recording)
+    bar_writer.close(ticker)
+    if TICK_SPOOL and not wait_spool_drained(timeout=2.0):
+        logger.warning("⚠️ Spool still has undelivered ticks; %s will be stored once storage catches up", ticker)
+
+    pipeline = get_pipeline()
+    pipeline.release(ticker)        # queued behind the ticker's last ticks
+    if flush and not (pipeline.flush() and flush_bar_data()):
+        logger.warning("⚠️ Timed out flushing queued ticks for %s", ticker)
+    return True
+
+
+def stop_recordings(tickers):
+    """
+    Stop several tickers, flushing the sinks once at the end.
+
+    Returns {ticker: {"status": "stopped" | "not_recording", "message": str}}.
+    """
+    tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
+    report = {}
+    for ticker in tickers:
+        if _teardown(ticker, flush=False):
+            report[ticker] = {"status": "stopped", "message": f"🛑 Recording stopped for {ticker}"}
+            logger.info("🛑 Recording stopped for %s", ticker)
+        else:
+            report[ticker] = {"status": "not_recording", "message": f"⚠️ {ticker} was not recording."}
+
+    if report and not (get_pipeline().flush() and flush_bar_data()):
+        logger.warning("⚠️ Timed out flushing queued ticks")
+    return report
 
 
 def stop_recording(ticker):
-    ticker = ticker.strip().upper()
-
-    if ticker in recording_flags:
-        recording_flags[ticker]["stop"] = True
-
-        instrument = recording_conns.get(ticker)
-        if instrument:
-            unsubscribe_ticker(instrument["exchange_code"], instrument["token"])
-        print(f"🔔 Stop signal sent for {ticker}")
-    else:
-        print(f"⚠️ {ticker} was not recording.")
-
+    result = stop_recordings([ticker]).get(ticker.strip().upper())
+    if result and result["status"] == "not_recording":
+        logger.warning(result["message"])
@@ -0,0 +1,128 @@
+"""
+Size / decode-speed benchmark of the tick archive format against the
+recorded CSV layout and Parquet.
+
+    python benchmarks/bench_archive.py --ticks 1000000
+    python benchmarks/bench_archive.py --csv data/TCS.NSE.csv --repeat 5
+
+Without --csv a synthetic random-walk session is generated. Every format
+holds the same ticks; decode time is the best of --repeat full reads into
+NumPy columns (CSV: bar_builder.load_csv_ticks, as backtests read it).
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from backend.bar_builder import load_csv_ticks                              # noqa: E402
+from backend.tick_archive import CODECS, TickArchive, archive_frame, _zstd  # noqa: E402
+
+
+def synthetic_ticks(n: int, ticker="TCS.NSE", seed=7) -> pd.DataFrame:
+    """One session of `n` ticks, 1-second timestamps like the recorder writes, 0.05 price steps."""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp.now().normalize() + pd.Timedelta(hours=9, minutes=15)
+    seconds = np.sort(rng.integers(0, 6 * 3600 + 15 * 60, n))
+    prices = 3500 + np.cumsum(rng.integers(-2, 3, n)) * 0.05
+    return pd.DataFrame({
+        "ticker": ticker,
+        "timestamp": start + pd.to_timedelta(seconds, unit="s"),
+        "ltp": prices.round(2),
+        "ltq": rng.integers(1, 500, n),
+    })
+
+
+def write_csv(ticks: pd.DataFrame, path):
+    """The recorder's layout: Ticker, Date (%d-%m-%y), Time, LTP, LTQ."""
+    pd.DataFrame({
+        "Ticker": ticks["ticker"],
+        "Date": ticks["timestamp"].dt.strftime("%d-%m-%y"),
+        "Time": ticks["timestamp"].dt.strftime("%H:%M:%S"),
+        "LTP": ticks["ltp"],
+        "LTQ": ticks["ltq"],
+    }).to_csv(path, index=False)
+
+
+def write_parquet(ticks: pd.DataFrame, path, compression):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from backend.parquet_utils import LOCAL_TZ, TICK_SCHEMA
+    ticks = ticks.assign(timestamp=ticks["timestamp"].dt.tz_localize(LOCAL_TZ).dt.tz_convert("UTC"))
+    table = pa.Table.from_pandas(ticks[["timestamp", "ltp", "ltq"]], schema=TICK_SCHEMA, preserve_index=False)
+    pq.write_table(table, path, compression=compression)
+
+
+def read_parquet(path):
+    import pyarrow.parquet as pq
+    table = pq.read_table(path)
+    return {name: table.column(name).to_numpy() for name in table.column_names}
+
+
+def read_archive(path):
+    with TickArchive(path) as archive:
+        return archive.read_columns()
+
+
+def best_of(repeat: int, read, paths) -> float:
+    timings = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        for path in paths:
+            read(path)
+        timings.append(time.perf_counter() - began)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", help="recorded tick CSV to use instead of synthetic ticks")
+    parser.add_argument("--ticks", type=int, default=500_000, help="synthetic ticks to generate")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    ticks = load_csv_ticks(args.csv) if args.csv else synthetic_ticks(args.ticks)
+    ticks = ticks.sort_values("timestamp", kind="stable").reset_index(drop=True)
+    workdir = tempfile.mkdtemp(prefix="bench_archive_")
+    try:
+        formats = []
+        csv_path = os.path.join(workdir, "ticks.csv")
+        write_csv(ticks, csv_path)
+        formats.append(("csv", [csv_path], load_csv_ticks))
+        for compression in ("snappy", "zstd"):
+            path = os.path.join(workdir, f"ticks_{compression}.parquet")
+            write_parquet(ticks, path, compression)
+            formats.append((f"parquet/{compression}", [path], read_parquet))
+        for codec in CODECS:
+            if codec == "zstd":
+                try:
+                    _zstd()
+                except RuntimeError:
+                    continue
+            paths = list(archive_frame(ticks, os.path.join(workdir, f"archive_{codec}"), codec))    # one per day
+            formats.append((f"archive/{codec}", paths, read_archive))
+
+        n = len(ticks)
+        csv_bytes = os.path.getsize(csv_path)
+        header = f"{'format':<18}{'bytes':>12}{'B/tick':>9}{'vs csv':>8}{'decode ms':>11}{'Mticks/s':>10}"
+        print(f"{n} ticks of {ticks['ticker'].iloc[0]}")
+        print(header)
+        print("-" * len(header))
+        for name, paths, read in formats:
+            size = sum(os.path.getsize(path) for path in paths)
+            seconds = best_of(args.repeat, read, paths)
+            print(f"{name:<18}{size:>12}{size / n:>9.2f}{size / csv_bytes:>8.1%}"
+                  f"{seconds * 1000:>11.1f}{n / seconds / 1e6:>10.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
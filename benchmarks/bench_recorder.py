@@ -0,0 +1,163 @@
+"""
+Throughput / latency benchmark for the recording pipeline, driven by the
+local replay source (no Stocko socket or Atlas needed).
+
+    python benchmarks/bench_recorder.py --modes csv,parquet,mongodb --tickers 50 --rate 50 --duration 20
+    python benchmarks/bench_recorder.py --engine asyncio --burst-seconds 5 --burst-multiplier 10
+
+For every storage mode it reports ticks/s written by the sink
+(recorder_sink_written_total), ticks the sink dropped, p99 hand-off latency
+(replayed socket callback -> tick queued for the sink), p50/p99 persist
+latency (receive -> written, histogram bucket bounds), CPU and peak RSS.
+mongodb mode runs against mongomock (pip install mongomock).
+
+Each mode runs in a fresh subprocess, since STORAGE_MODE/STORAGE_SINKS are read at import.
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_one(args):
+    """Child process: record for `duration` seconds in one storage mode and print a JSON result."""
+    sys.path.insert(0, REPO_ROOT)
+    os.environ["STORAGE_MODE"] = args.mode
+    os.environ["STORAGE_SINKS"] = args.mode
+
+    from backend.replay import ReplayTickSource, install_replay_source, replay_tickers
+
+    source = ReplayTickSource(rate=args.rate, burst_seconds=args.burst_seconds,
+                              burst_multiplier=args.burst_multiplier,
+                              csv_folder=os.path.join(REPO_ROOT, "data"))
+    os.chdir(REPO_ROOT)
+    tickers = replay_tickers(args.tickers)
+    for ticker in tickers:
+        source.add_instrument(ticker)
+
+    mongo_database = None
+    if args.mode == "mongodb":
+        import mongomock
+        mongo_database = mongomock.MongoClient()["TickDatabase"]
+    install_replay_source(source, mongo_database)
+
+    # Everything the recorder writes goes to a scratch directory
+    workdir = tempfile.mkdtemp(prefix="bench_recorder_")
+    os.chdir(workdir)
+
+    from backend import ws_recorder
+    from backend.metrics import registry
+
+    latencies = []
+    original = ws_recorder.process_tick
+
+    def timed_process_tick(recording, raw):
+        tick = original(recording, raw)
+        if tick is not None:
+            latencies.append(time.perf_counter_ns() - raw["_sent_ns"])
+        return tick
+
+    ws_recorder.process_tick = timed_process_tick
+    if args.engine == "asyncio":
+        from backend import async_recorder
+        async_recorder.process_tick = timed_process_tick
+        service = async_recorder.AsyncRecorderService()
+        start, stop = service.start_recordings, service.stop_recordings
+    else:
+        start, stop = ws_recorder.start_recordings, ws_recorder.stop_recordings
+
+    report = start(tickers, "bench-token")
+    started = sum(1 for r in report.values() if r["status"] == "started")
+
+    def sink_counts():
+        snapshot = registry.snapshot()
+        dropped = sum(n for (sink, _), n in snapshot.get("recorder_sink_dropped_total", {}).items() if sink == args.mode)
+        return snapshot.get("recorder_sink_written_total", {}).get((args.mode,), 0), dropped
+
+    latencies.clear()
+    cpu_before = time.process_time()
+    emitted_before = source.emitted
+    written_before, dropped_before = sink_counts()
+    began = time.perf_counter()
+    time.sleep(args.duration)
+    elapsed = time.perf_counter() - began
+    written, _ = sink_counts()
+    written -= written_before
+    emitted = source.emitted - emitted_before
+    cpu = time.process_time() - cpu_before
+
+    stop(tickers)
+    source.stop()
+    if args.engine == "asyncio":
+        service.shutdown()
+    _, dropped = sink_counts()      # after stop, so ticks still queued at the end are counted too
+
+    latencies.sort()
+
+    def pct(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] / 1e6 if latencies else None
+
+    persist = registry.snapshot().get("recorder_persist_latency_seconds", {}).get((args.mode,))
+    result = {
+        "mode": args.mode,
+        "engine": args.engine,
+        "tickers": started,
+        "emitted_per_s": round(emitted / elapsed, 1),
+        "stored_per_s": round(written / elapsed, 1),
+        "dropped": dropped - dropped_before,
+        "handoff_p99_ms": pct(0.99),
+        "persist_p50_s_le": persist["p50"] if persist else None,
+        "persist_p99_s_le": persist["p99"] if persist else None,
+        "cpu_s": round(cpu, 2),
+        "cpu_pct": round(100 * cpu / elapsed, 1),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="csv,parquet,mongodb", help="comma-separated storage modes")
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads")
+    parser.add_argument("--tickers", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=20.0, help="ticks/s per ticker")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds measured per mode")
+    parser.add_argument("--burst-seconds", type=float, default=0.0)
+    parser.add_argument("--burst-multiplier", type=float, default=1.0)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)   # internal: run one mode in this process
+    args = parser.parse_args()
+
+    if args.mode:
+        run_one(args)
+        return
+
+    header = (f"{'mode':<9}{'engine':<9}{'tickers':>8}{'emit/s':>10}{'store/s':>10}{'dropped':>9}"
+              f"{'handoff p99 ms':>16}{'persist p50/p99 s<=':>21}{'cpu %':>8}{'rss MB':>9}")
+    print(header)
+    print("-" * len(header))
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        cmd = [sys.executable, os.path.abspath(__file__), "--mode", mode, "--engine", args.engine,
+               "--tickers", str(args.tickers), "--rate", str(args.rate), "--duration", str(args.duration),
+               "--burst-seconds", str(args.burst_seconds), "--burst-multiplier", str(args.burst_multiplier)]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{mode:<9}failed: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}")
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        fmt = lambda v: "-" if v is None else f"{v:.2f}"
+        persist = f"{fmt(r['persist_p50_s_le'])} / {fmt(r['persist_p99_s_le'])}"
+        print(f"{r['mode']:<9}{r['engine']:<9}{r['tickers']:>8}{r['emitted_per_s']:>10}{r['stored_per_s']:>10}"
+              f"{r['dropped']:>9}{fmt(r['handoff_p99_ms']):>16}{persist:>21}{r['cpu_pct']:>8}{r['max_rss_mb']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,21 +6,134 @@ import os
 # sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 # sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "backend", "ws_recorder")))
 # sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "pyoauthbridge", "connect")))
+import glob
+import logging
+import tempfile
 import time
+import weakref
+from datetime import date, datetime, timedelta
 # import backend
 # import pyoauthbridge
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 import pandas as pd
-from backend.mongodb_connect import db
-from dotenv import load_dotenv
-from backend.ws_recorder import start_recording, stop_recording, shared_conn 
+from backend.db_utils import (
+    fetch_tick_page, fetch_ticks_since, next_page_cursor, is_bar_collection,
+    fetch_tick_range, delete_tick_range, list_timeseries_tickers, MONGO_LAYOUT, TS_COLLECTION,
+)
+from backend.config import load_env, STORAGE_SINKS
+RECORDER_ENGINE = os.getenv("RECORDER_ENGINE", "threads").strip().lower()
+REMOTE_ENGINE = RECORDER_ENGINE in ("sharded", "daemon")
+if REMOTE_ENGINE:
+    # Recording runs in another process (python -m backend.shard_supervisor, or the
+    # python -m backend.recorder daemon); this app only talks to it over local IPC
+    # and never opens a socket itself.
+    if RECORDER_ENGINE == "sharded":
+        from backend.shard_supervisor import connect_supervisor
+    else:
+        from backend.recorder import connect_recorder as connect_supervisor
+
+    @st.cache_resource
+    def get_supervisor():
+        return connect_supervisor()
+
+    def connected_supervisor():
+        """The cached proxy, reconnected once if the recorder process went away or restarted."""
+        from multiprocessing import AuthenticationError
+        error = None
+        for _ in range(2):
+            try:
+                proxy = get_supervisor()
+                proxy.status()      # cheap round trip; a stale proxy fails here
+                return proxy
+            except (ConnectionError, EOFError, OSError, AuthenticationError) as e:
+                get_supervisor.clear()
+                error = e
+        command = "backend.shard_supervisor" if RECORDER_ENGINE == "sharded" else "backend.recorder"
+        st.error(f"❌ Cannot reach the recorder process ({error!r}). Start it with `python -m {command}`, "
+                 f"then reload this page.")
+        st.stop()
+
+    supervisor = connected_supervisor()
+    get_connection = None
+    start_recording, stop_recording = supervisor.start_recording, supervisor.stop_recording
+    start_recordings, stop_recordings = supervisor.start_recordings, supervisor.stop_recordings
+else:
+    from backend.ws_recorder import get_connection
+    if RECORDER_ENGINE == "asyncio":
+        from backend.async_recorder import recorder_service
+        start_recording, stop_recording = recorder_service.start_recording, recorder_service.stop_recording
+        start_recordings, stop_recordings = recorder_service.start_recordings, recorder_service.stop_recordings
+    else:
+        from backend.ws_recorder import start_recording, stop_recording, start_recordings, stop_recordings
+from backend.watchlist import parse_watchlist
+from backend.csv_utils import CSV_FOLDER
+from backend.csv_archive import csv_archive
+from backend.live_tail import LiveTickBuffer, MongoTail, TimeSeriesTail, CsvTail, LIVE_COLUMNS
+from backend.tick_buffer import get_tick_buffer, buffered_tickers, window_stats
+from backend.chart_data import chart_series, chart_cache
 from pyoauthbridge.wsclient import is_socket_open
 from backend.token_utils import is_token_valid
+from backend.metrics import registry, start_metrics_server, METRICS_HOST, METRICS_PORT
 # -e git+https://github.com/prachi07042004/STOCKO_API_APPLICATION.git@4dc3a06e885700fe37d8c393e98a9b389d2eb403#egg=pyoauthbridge&subdirectory=pyoauthbridge
 
-load_dotenv()
 
-BASE_URL = os.getenv("BASE_URL")
+
+@st.cache_resource
+def init_process():
+    """Once per server process, not on every rerun: .env, logging and the metrics endpoint."""
+    load_env()
+    # Leveled logging instead of prints; per-tick paths log nothing above DEBUG
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if not REMOTE_ENGINE:
+        start_metrics_server()   # Prometheus text at /metrics (the recorder process serves its own)
+    return {"BASE_URL": os.getenv("BASE_URL")}
+
+
+@st.cache_resource
+def get_tick_db():
+    """Shared Mongo database handle; only created when a MongoDB view needs it."""
+    from backend.mongodb_connect import get_db
+    return get_db()
+
+
+class SessionExport:
+    """
+    An export file owned by one browser session. Kept in st.session_state, so
+    it is deleted when Streamlit drops the session (or the process exits),
+    or as soon as the session prepares a new export.
+    """
+
+    def __init__(self, path, rows):
+        self.path, self.rows = path, rows
+        self.size = os.path.getsize(path)
+        self.discard = weakref.finalize(self, _remove_export, path)
+
+
+def _remove_export(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+@st.cache_resource
+def export_folder():
+    """Once per server process: the export folder, with files left behind by a killed server removed."""
+    os.makedirs(EXPORT_FOLDER, exist_ok=True)
+    for path in glob.glob(os.path.join(EXPORT_FOLDER, "ticks_*.csv")):
+        if time.time() - os.path.getmtime(path) > 24 * 3600:
+            _remove_export(path)
+    return EXPORT_FOLDER
+
+
+config = init_process()
+BASE_URL = config["BASE_URL"]
+EXPORT_FOLDER = os.getenv("EXPORT_FOLDER", os.path.join(tempfile.gettempdir(), "stocko_exports"))
+EXPORT_MAX_BYTES = int(os.getenv("EXPORT_MAX_BYTES", str(200 * 1024 * 1024)))     # largest export served to the browser
+USE_MONGO = "mongodb" in STORAGE_SINKS   # csv/parquet-only runs never connect to Mongo
+USE_TIMESERIES = USE_MONGO and MONGO_LAYOUT == "timeseries"
+LOCAL_TZ = datetime.now().astimezone().tzinfo
 
 # --- UI Config ---
 st.set_page_config(page_title="Ticker Recorder", layout="wide")
@@ -51,10 +164,11 @@ if not st.session_state.token_validated:
                 st.session_state.token_validated = True
 
                 # Set token for shared WebSocket
-                shared_conn.set_access_token(token_input.strip())
-                if not is_socket_open():
-                    shared_conn.run_socket()
-                    time.sleep(1)
+                if get_connection is not None:
+                    get_connection().set_access_token(token_input.strip())
+                    if not is_socket_open():
+                        get_connection().run_socket()
+                        time.sleep(1)
             else:
                 
                 st.error("❌ Invalid token. Please try again.")
@@ -70,10 +184,51 @@ if st.session_state.token_validated:
         st.session_state.ticker_values = [""] * 5
     if "ticker_status" not in st.session_state:
         st.session_state.ticker_status = {}  # {ticker: "started"/"stopped"}
-
+        if RECORDER_ENGINE == "daemon":
+            # The daemon outlives browser sessions: show what it is already recording
+            running = supervisor.status()["tickers"]
+            st.session_state.ticker_status = {t: "started" for t in running}
+            st.session_state.ticker_values = running + [""] * max(0, 5 - len(running))
+
+
+    # --- Watchlist ---
+    with st.expander("📂 Load Watchlist"):
+        watchlist_file = st.file_uploader("Watchlist file (one SYMBOL.EXCHANGE per line or comma separated)", type=["txt", "csv"])
+        wl_col1, wl_col2, _ = st.columns([1, 1, 4])
+
+        if watchlist_file is not None and wl_col1.button("▶️ Start All"):
+            tickers = parse_watchlist(watchlist_file.getvalue().decode("utf-8"))
+            if not tickers:
+                st.warning("Watchlist is empty.")
+            else:
+                if get_connection is not None:
+                    get_connection().set_access_token(ACCESS_TOKEN)
+                with st.spinner(f"Starting {len(tickers)} tickers..."):
+                    report = start_recordings(tickers, ACCESS_TOKEN)
+
+                # Show the watchlist in the ticker rows (at least five rows)
+                st.session_state.ticker_values = tickers + [""] * max(0, 5 - len(tickers))
+                for i, t in enumerate(st.session_state.ticker_values):
+                    st.session_state[f"ticker_input_{i}"] = t
+
+                for t, result in report.items():
+                    if result["status"] in ("started", "already_recording"):
+                        st.session_state.ticker_status[t] = "started"
+                started = sum(1 for r in report.values() if r["status"] == "started")
+                st.success(f"✅ Started {started}/{len(tickers)} tickers.")
+                for result in report.values():
+                    if result["status"] == "failed":
+                        st.warning(result["message"])
+
+        if wl_col2.button("⏹ Stop All"):
+            running = [t for t, status in st.session_state.ticker_status.items() if status == "started"]
+            stop_recordings(running)
+            for t in running:
+                st.session_state.ticker_status[t] = "stopped"
+            st.info(f"🛑 Stopped {len(running)} tickers.")
 
     # --- Ticker Rows ---
-    for i in range(5):
+    for i in range(len(st.session_state.ticker_values)):
         col1, col2, col3, _ = st.columns([2, 1, 1, 6])
 
         # Text input
@@ -96,11 +251,12 @@ if st.session_state.token_validated:
                 st.warning("Please enter a ticker.")
             else:
                 # ✅ Ensure WebSocket is started
-                shared_conn.set_access_token(ACCESS_TOKEN)
+                if get_connection is not None:
+                    get_connection().set_access_token(ACCESS_TOKEN)
 
-                if not is_socket_open():
+                if get_connection is not None and not is_socket_open():
                     st.warning("WebSocket is not connected. Trying to reconnect...")
-                    shared_conn.run_socket()
+                    get_connection().run_socket()
                     time.sleep(1)  # give time to connect
                     if not is_socket_open():
                         st.error("❌ Could not connect to WebSocket.")
@@ -143,37 +299,215 @@ if st.session_state.token_validated:
             st.write(f"{icon} `{ticker}` → **{status.upper()}**")
     else:
         st.info("No tickers started yet.")
-    
+
+    # --- Recorder Metrics ---
+    with st.expander("📈 Recorder Metrics"):
+        snapshot = supervisor.metrics_snapshot() if REMOTE_ENGINE else registry.snapshot()
+        now = time.time()
+        previous = st.session_state.get("metrics_previous")
+
+        received = snapshot.get("recorder_ticks_received_total", {})
+        stored = snapshot.get("recorder_ticks_stored_total", {})
+        dropped = {}    # ticker -> {reason: count}
+        for (t, reason), value in snapshot.get("recorder_ticks_dropped_total", {}).items():
+            dropped.setdefault(t, {})[reason] = value
+        last_tick = snapshot.get("recorder_last_tick_timestamp_seconds", {})
+        gaps = snapshot.get("recorder_gaps_total", {})
+        gap_seconds = snapshot.get("recorder_gap_seconds_total", {})
+
+        rows = []
+        for (t,), value in sorted(received.items()):
+            rate = None
+            if previous and previous["time"] < now:
+                rate = (value - previous["received"].get((t,), 0)) / (now - previous["time"])
+            rows.append({
+                "Ticker": t,
+                "Received": value,
+                "Stored": stored.get((t,), 0),
+                "Duplicates": dropped.get(t, {}).get("duplicate", 0),
+                "Conflated": dropped.get(t, {}).get("conflated", 0),
+                "Below threshold": dropped.get(t, {}).get("below_threshold", 0),
+                "Other dropped": sum(v for r, v in dropped.get(t, {}).items()
+                                     if r not in ("duplicate", "conflated", "below_threshold")),
+                "Ticks/s": None if rate is None else round(rate, 2),
+                "Last tick (s ago)": round(now - last_tick[(t,)], 1) if (t,) in last_tick else None,
+                "Gaps": gaps.get((t,), 0),
+                "Gap time (s)": round(gap_seconds.get((t,), 0), 1),
+            })
+        st.session_state.metrics_previous = {"time": now, "received": received}
+
+        if rows:
+            st.dataframe(pd.DataFrame(rows), use_container_width=True)
+        else:
+            st.info("No ticks received yet.")
+
+        m1, m2, m3 = st.columns(3)
+        queue_depth = snapshot.get("recorder_dispatch_queue_depth", {}).get((), 0)
+        m1.metric("Dispatch queue depth", queue_depth)
+        dispatch = snapshot.get("recorder_dispatch_latency_seconds", {}).get(())
+        if dispatch and dispatch["count"]:
+            m2.metric("Dispatch latency p50 / p99", f"{dispatch['p50'] * 1000:g} / {dispatch['p99'] * 1000:g} ms")
+        writer = snapshot.get("recorder_mongo_writer_documents", {})
+        if writer:
+            m3.metric("Mongo writer pending / dropped", f"{writer.get(('pending',), 0)} / {writer.get(('dropped',), 0)}")
+        disconnects = snapshot.get("recorder_socket_disconnects_total", {}).get((), 0)
+        if disconnects:
+            reconnects = snapshot.get("recorder_socket_reconnects_total", {}).get((), 0)
+            st.caption(f"🔌 Socket drops: {disconnects} · reconnected: {reconnects}")
+
+        sink_written = snapshot.get("recorder_sink_written_total", {})
+        sink_dropped = snapshot.get("recorder_sink_dropped_total", {})
+        sink_rows = [{
+            "Sink": sink,
+            "Written": written,
+            "Queued": snapshot.get("recorder_sink_queue_depth", {}).get((sink,), 0),
+            "Retries": snapshot.get("recorder_sink_retries_total", {}).get((sink,), 0),
+            "Dropped (queue full)": sink_dropped.get((sink, "queue_full"), 0),
+            "Dropped (failed)": sink_dropped.get((sink, "failed"), 0),
+        } for (sink,), written in sorted(sink_written.items())]
+        if sink_rows:
+            st.dataframe(pd.DataFrame(sink_rows), use_container_width=True)
+
+        latency_rows = []
+        for name, label in (("recorder_persist_latency_seconds", "Socket → storage"),
+                            ("recorder_storage_flush_seconds", "Flush duration")):
+            for (sink,), h in snapshot.get(name, {}).items():
+                if h["count"]:
+                    latency_rows.append({"Metric": label, "Sink": sink, "Batches": h["count"],
+                                         "p50 (s) ≤": h["p50"], "p99 (s) ≤": h["p99"]})
+        if latency_rows:
+            st.dataframe(pd.DataFrame(latency_rows), use_container_width=True)
+
+        if RECORDER_ENGINE == "sharded":
+            status = supervisor.status()
+            st.dataframe(pd.DataFrame([{**s, "tickers": len(s["tickers"])} for s in status["shards"]]),
+                         use_container_width=True)
+            st.caption(f"{status['shard_count']} shards, assigned by {status['strategy']}")
+        elif RECORDER_ENGINE == "daemon":
+            status = supervisor.status()
+            st.caption(f"🎙️ Recorder daemon pid {status['pid']} · engine {status['engine']} · "
+                       f"sinks {', '.join(status['sinks'])} · {len(status['tickers'])} recording · "
+                       f"socket {'open' if status['socket_open'] else 'closed'} · up {status['uptime_s']:.0f}s")
+        else:
+            st.caption(f"Prometheus endpoint: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
 
     # --- Data Viewer ---
     st.divider()
     st.header("📊 Tick Data Viewer")
-    collections = db.list_collection_names()
+    if USE_TIMESERIES:
+        db = get_tick_db()
+        ts_collection = db[TS_COLLECTION]
+        collections = list_timeseries_tickers(ts_collection)     # tickers in the time-series collection
+    elif USE_MONGO:
+        db = get_tick_db()
+        collections = sorted(name for name in db.list_collection_names() if not is_bar_collection(name))
+    else:
+        collections = []
+        st.info(f"STORAGE_SINKS={','.join(STORAGE_SINKS)}: the MongoDB viewer is disabled. Use the Live Tail below for CSV files.")
+
+    selected_collection = st.selectbox("🔍 Select Ticker" if USE_TIMESERIES else "🔍 Select Ticker Collection",
+                                       collections, index=0 if collections else None)
+
+    if selected_collection and USE_TIMESERIES:
+        col1, col2, col3 = st.columns([2, 2, 2])
+        page_size = col1.slider("🎚️ Rows per page", min_value=10, max_value=5000, value=100, step=10)
+        date_range = col2.date_input("📅 Date range", value=(date.today(), date.today()))
+        hours = col3.slider("🕒 Hours", min_value=0, max_value=24, value=(0, 24))
+
+        # Local [start, end) bounds; the query runs on the (ticker, ts) index
+        first_day, last_day = (date_range[0], date_range[-1]) if date_range else (date.today(), date.today())
+        start = datetime.combine(first_day, datetime.min.time(), LOCAL_TZ) + timedelta(hours=hours[0])
+        end = datetime.combine(last_day, datetime.min.time(), LOCAL_TZ) + timedelta(hours=hours[1])
+
+        view_key = ("timeseries", selected_collection, start, end, page_size)
+        if st.session_state.get("view_key") != view_key:
+            st.session_state.view_key = view_key
+            st.session_state.page_cursors = [None]
+
+        page_cursors = st.session_state.page_cursors
+        page_no = len(page_cursors) - 1
+        docs, next_cursor = fetch_tick_range(ts_collection, selected_collection, start, end,
+                                             page_size, before=page_cursors[-1])
+        df = pd.DataFrame(docs)
 
-    selected_collection = st.selectbox("🔍 Select Ticker Collection", collections, index=0 if collections else None)
+        if not df.empty:
+            df.drop(columns=["_id"], inplace=True)
+            df.insert(0, "timestamp", pd.to_datetime(df.pop("ts"), utc=True).dt.tz_convert(LOCAL_TZ))
+            st.dataframe(df, use_container_width=True)
 
-    if selected_collection:
+            nav1, nav2, nav3, _ = st.columns([1, 1, 2, 4])
+            if nav1.button("⬅️ Newer", disabled=page_no == 0):
+                page_cursors.pop()
+                st.rerun()
+            if nav2.button("Older ➡️", disabled=next_cursor is None):
+                page_cursors.append(next_cursor)
+                st.rerun()
+            nav3.caption(f"Page {page_no + 1}")
+
+            csv = df.to_csv(index=False).encode('utf-8')
+            st.download_button("📥 Download as CSV", data=csv, file_name=f"{selected_collection}.csv", mime='text/csv')
+
+            with st.expander("🗑️ Delete Data"):
+                st.write(f"Deletes every `{selected_collection}` tick from {start:%d-%m-%Y %H:%M} to {end:%d-%m-%Y %H:%M}.")
+                if st.button("Delete Records"):
+                    deleted = delete_tick_range(ts_collection, selected_collection, start, end)
+                    st.session_state.view_key = None
+                    st.warning(f"Deleted {deleted} record(s) of {selected_collection}.")
+        else:
+            st.info("No data found for the selected options.")
+
+    elif selected_collection:
         col1, col2 = st.columns([2, 2])
 
-        # Record limit
-        limit = col1.slider("🎚️ Number of records to load", min_value=1, max_value=30000, value=100, step=10)
+        # Page size
+        page_size = col1.slider("🎚️ Rows per page", min_value=10, max_value=5000, value=100, step=10)
 
         # Date filter
         date_filter = col2.date_input("📅 Filter by Date (optional)")
+        date_str = date_filter.strftime("%d-%m-%Y") if date_filter else None
+
+        collection = db[selected_collection]
+
+        # Reset paging whenever the selection changes
+        view_key = (selected_collection, date_str, page_size)
+        if st.session_state.get("view_key") != view_key:
+            st.session_state.view_key = view_key
+            st.session_state.page_cursors = [None]      # start cursor of each visited page
+            st.session_state.first_page_docs = None     # newest page, refreshed incrementally
 
-        query = {}
-        if date_filter:
-            query["date"] = date_filter.strftime("%d-%m-%Y")
+        page_cursors = st.session_state.page_cursors
+        page_no = len(page_cursors) - 1
+        first_page = st.session_state.first_page_docs
 
         # Fetch Data
-        collection = db[selected_collection]
-        cursor = collection.find(query).sort("time", -1).limit(limit)
-        df = pd.DataFrame(list(cursor))
+        if page_no == 0 and first_page:
+            # Newest page already loaded: only fetch ticks added since its top row
+            newest_id = max(doc["_id"] for doc in first_page)
+            new_docs = fetch_ticks_since(collection, newest_id, date_str, limit=page_size)
+            docs = (new_docs + first_page)[:page_size]
+            next_cursor = next_page_cursor(docs, page_size, date_str)
+        else:
+            docs, next_cursor = fetch_tick_page(collection, date_str, page_size, before=page_cursors[-1])
+
+        if page_no == 0:
+            st.session_state.first_page_docs = docs
+
+        df = pd.DataFrame(docs)
 
         if not df.empty:
             df.drop(columns=["_id"], inplace=True)
             st.dataframe(df, use_container_width=True)
 
+            nav1, nav2, nav3, _ = st.columns([1, 1, 2, 4])
+            if nav1.button("⬅️ Newer", disabled=page_no == 0):
+                page_cursors.pop()
+                st.rerun()
+            if nav2.button("Older ➡️", disabled=next_cursor is None):
+                page_cursors.append(next_cursor)
+                st.rerun()
+            nav3.caption(f"Page {page_no + 1}")
+
             # Export button
             csv = df.to_csv(index=False).encode('utf-8')
             st.download_button("📥 Download as CSV", data=csv, file_name=f"{selected_collection}.csv", mime='text/csv')
@@ -184,13 +518,177 @@ if st.session_state.token_validated:
                 if st.button("Delete Records"):
                     del_query = {"date": delete_date.strftime("%d-%m-%Y")}
                     result = collection.delete_many(del_query)
+                    st.session_state.view_key = None
                     st.warning(f"Deleted {result.deleted_count} record(s) from {selected_collection}.")
 
         else:
             st.info("No data found for the selected options.")
 
-        # Auto-refresh
-        if st.checkbox("🔄 Auto-refresh every 5 sec"):
-            time.sleep(5)
-            st.rerun()
+    # --- CSV Archive Export ---
+    # Streams the selected range from the recorded CSVs (indexed seeks, chunked
+    # parsing) into a temporary file instead of building one DataFrame in memory.
+    # Files over EXPORT_MAX_BYTES are not offered for download.
+    st.divider()
+    st.header("🗄️ CSV Archive Export")
+    archive_tickers = csv_archive.tickers()
+    if archive_tickers:
+        export_tickers = st.multiselect("🔍 Tickers", archive_tickers, default=archive_tickers[:1])
+        ecol1, ecol2 = st.columns([2, 2])
+        export_days = ecol1.date_input("📅 Date range", value=(date.today(), date.today()), key="export_days")
+        export_hours = ecol2.slider("🕒 Hours", min_value=0, max_value=24, value=(0, 24), key="export_hours")
+        first_day, last_day = (export_days[0], export_days[-1]) if export_days else (date.today(), date.today())
+        export_start = datetime.combine(first_day, datetime.min.time()) + timedelta(hours=export_hours[0])
+        export_end = datetime.combine(last_day, datetime.min.time()) + timedelta(hours=export_hours[1])
+
+        if export_tickers and st.button("📦 Prepare export"):
+            previous = st.session_state.pop("export", None)
+            if previous:
+                previous.discard()      # one export file per session
+            export_file = tempfile.NamedTemporaryFile(prefix="ticks_", suffix=".csv", dir=export_folder(), delete=False)
+            with st.spinner("Exporting..."):
+                rows = csv_archive.write_csv(export_file, export_tickers, export_start, export_end)
+            export_file.close()
+            export = SessionExport(export_file.name, rows)
+            if export.size > EXPORT_MAX_BYTES:
+                export.discard()
+                st.warning(f"⚠️ {rows} rows ({export.size / 2**20:.0f} MB) is over the "
+                           f"{EXPORT_MAX_BYTES / 2**20:.0f} MB download limit (EXPORT_MAX_BYTES). "
+                           f"Narrow the tickers or the range, or export per day.")
+            else:
+                st.session_state.export = export
+
+        export = st.session_state.get("export")
+        if export and os.path.exists(export.path):
+            # download_button needs the bytes on every rerun; the size cap above bounds them
+            with open(export.path, "rb") as f:
+                st.download_button(f"📥 Download {export.rows} rows", data=f.read(),
+                                   file_name="ticks_export.csv", mime="text/csv")
+    else:
+        st.info("No recorded CSV archives found.")
+
+    # --- Multi-Ticker Chart ---
+    # Aggregated where the data lives (a MongoDB pipeline, or vectorized over the
+    # CSV/Parquet archives) down to a min/max pair per pixel column, so the
+    # browser gets a few thousand points however long the range is.
+    st.divider()
+    st.header("📉 Multi-Ticker Chart")
+    if USE_MONGO:
+        chart_source = "mongodb"
+        chart_tickers = collections if USE_TIMESERIES else [name.rsplit("_", 1)[0] + "." + name.rsplit("_", 1)[-1]
+                                                            for name in collections if "_" in name]
+    elif "csv" in STORAGE_SINKS:
+        chart_source, chart_tickers = "csv", csv_archive.tickers()
+    else:
+        from backend.parquet_utils import list_parquet_tickers
+        chart_source, chart_tickers = "parquet", list_parquet_tickers()
+
+    if chart_tickers:
+        chart_selected = st.multiselect("🔍 Tickers", chart_tickers, default=chart_tickers[:1], key="chart_tickers")
+        ccol1, ccol2, ccol3 = st.columns([2, 2, 2])
+        chart_days = ccol1.date_input("📅 Date range", value=(date.today(), date.today()), key="chart_days")
+        chart_hours = ccol2.slider("🕒 Hours", min_value=0, max_value=24, value=(0, 24), key="chart_hours")
+        chart_width = ccol3.select_slider("🖥️ Resolution (points)", options=[300, 600, 1200, 2400], value=1200)
+        normalize = st.toggle("% change from first tick", value=len(chart_selected) > 1)
+
+        first_day, last_day = (chart_days[0], chart_days[-1]) if chart_days else (date.today(), date.today())
+        chart_start = datetime.combine(first_day, datetime.min.time(), LOCAL_TZ) + timedelta(hours=chart_hours[0])
+        chart_end = datetime.combine(last_day, datetime.min.time(), LOCAL_TZ) + timedelta(hours=chart_hours[1])
+
+        if chart_selected:
+            with st.spinner("Aggregating..."):
+                series = chart_series(chart_source, chart_selected, chart_start, chart_end, chart_width,
+                                      database=get_tick_db() if USE_MONGO else None)
+            frames = []
+            for ticker, frame in series.items():
+                if frame.empty:
+                    continue
+                if normalize:
+                    frame = frame.assign(ltp=(frame["ltp"] / frame["ltp"].iloc[0] - 1) * 100)
+                frames.append(frame.assign(ticker=ticker))
+            if frames:
+                st.line_chart(pd.concat(frames, ignore_index=True), x="timestamp", y="ltp", color="ticker")
+                st.caption(f"{sum(len(f) for f in frames)} points from {chart_source} · "
+                           f"cache {chart_cache.hits} hits / {chart_cache.misses} misses")
+            else:
+                st.info("No ticks in the selected range.")
+    else:
+        st.info("No recorded ticks to chart yet.")
+
+    # --- Live Tail ---
+    # Runs as a fragment: only this panel re-executes on each refresh, and each
+    # refresh only reads ticks added since the previous one.
+    st.divider()
+    st.header("📡 Live Tail")
+
+    live_sources = ["MongoDB", "CSV"] if USE_MONGO else ["CSV"]
+    if RECORDER_ENGINE != "sharded":     # shards keep their ring buffers to themselves
+        live_sources = ["Memory"] + live_sources     # ring buffers of this process's recordings
+    live_source = st.radio("Source", live_sources, horizontal=True, key="live_source")
+    if live_source == "Memory":
+        live_targets = supervisor.buffered_tickers() if RECORDER_ENGINE == "daemon" else buffered_tickers()
+    elif live_source == "MongoDB":
+        live_targets = collections
+    else:
+        live_targets = sorted(os.path.basename(p) for p in glob.glob(os.path.join(CSV_FOLDER, "*.csv")))
+    live_target = st.selectbox("🔍 Select Ticker", live_targets, key="live_target")
+
+    lcol1, lcol2 = st.columns([2, 2])
+    live_interval = lcol1.select_slider("⏱️ Refresh every (sec)", options=[0.5, 1.0, 2.0, 5.0], value=1.0)
+    live_capacity = int(lcol2.number_input("🧮 Rows kept in view", min_value=100, max_value=20000, value=2000, step=100))
+
+    live_on = bool(live_target) and st.toggle("🔴 Live")
+    if live_on and live_source == "Memory":
+        def memory_snapshot(ticker, n):
+            """(last n ticks, last-trade state, price multiplier) from this process or the daemon."""
+            if RECORDER_ENGINE == "daemon":
+                return supervisor.tick_snapshot(ticker, n)
+            ring = get_tick_buffer(ticker)
+            return ring.last(n), ring.last_trade(), ring.multiplier
+
+        @st.fragment(run_every=live_interval)
+        def memory_panel():
+            ticks, last, multiplier = memory_snapshot(live_target, live_capacity)
+            if last is None:
+                st.info("Waiting for the first tick...")
+                return
+            window = window_stats(ticks, multiplier, seconds=60)
+            m1, m2, m3, m4, m5 = st.columns(5)
+            m1.metric("LTP", f"{last['ltp']:g}", f"{last['ltq']} qty", delta_color="off")
+            m2.metric("VWAP (session)", f"{last['vwap']:.2f}" if last["vwap"] else "—")
+            m3.metric("VWAP (60s)", f"{window['vwap']:.2f}" if window["vwap"] else "—")
+            m4.metric("High / Low", f"{last['high']:g} / {last['low']:g}")
+            m5.metric("Volume", f"{last['volume']:,}", f"{window['volume']:,} in 60s", delta_color="off")
+
+            ticks = ticks[::-1]
+            stamps = pd.to_datetime(ticks["ts_ns"], utc=True).tz_convert(LOCAL_TZ)
+            st.caption(f"{len(ticks)} rows of {last['ticks']} · refreshed {time.strftime('%H:%M:%S')}")
+            st.dataframe(pd.DataFrame({
+                "date": stamps.strftime("%d-%m-%y"),
+                "time": stamps.strftime("%H:%M:%S"),
+                "ltp": ticks["price_raw"] / multiplier,
+                "ltq": ticks["quantity"],
+            }), use_container_width=True)
+
+        memory_panel()
+
+    elif live_on:
+        live_key = (live_source, live_target, live_capacity)
+        if st.session_state.get("live_key") != live_key:
+            st.session_state.live_key = live_key
+            if live_source == "MongoDB" and USE_TIMESERIES:
+                st.session_state.live_tail = TimeSeriesTail(ts_collection, live_target)
+            elif live_source == "MongoDB":
+                st.session_state.live_tail = MongoTail(db[live_target])
+            else:
+                st.session_state.live_tail = CsvTail(os.path.join(CSV_FOLDER, live_target))
+            st.session_state.live_buffer = LiveTickBuffer(live_capacity)
+
+        @st.fragment(run_every=live_interval)
+        def live_panel():
+            buffer = st.session_state.live_buffer
+            buffer.extend(st.session_state.live_tail.poll(initial_rows=live_capacity))
+            st.caption(f"{len(buffer)} rows · refreshed {time.strftime('%H:%M:%S')}")
+            st.dataframe(pd.DataFrame(buffer.newest_first(), columns=LIVE_COLUMNS), use_container_width=True)
+
+        live_panel()
 
@@ -0,0 +1,17 @@
+# conftest.py
+#
+# Run from the repository root:
+#     python -m pytest tests
+# The Mongo tests use mongomock in place of a server and are skipped without it.
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def mongo_db():
+    mongomock = pytest.importorskip("mongomock")
+    return mongomock.MongoClient()["stocko_test"]
@@ -0,0 +1,35 @@
+from bson import ObjectId
+from backend import db_utils
+from backend.live_tail import MongoTail
+from backend.tick_record import Tick
+
+SECOND = 1_754_550_000_000_000_000      # a whole second, in ns
+
+
+def test_capture_ids_follow_capture_order():
+    # Same second, clock stepping back inside it, then the next second
+    ticks = [Tick("TCS.NSE", 1, 350_000, 1, SECOND + offset) for offset in (500, 400, 900, 1_000_000_000)]
+    ids = [tick.capture_id for tick in ticks]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+
+
+def test_tail_returns_every_tick_once_in_order(mongo_db, monkeypatch):
+    monkeypatch.setattr(db_utils, "get_db", lambda: mongo_db)
+    monkeypatch.setattr(db_utils, "MONGO_LAYOUT", "collections")
+    tail = MongoTail(mongo_db[db_utils.tick_collection_name("TCS.NSE")])
+
+    seen = []
+    quantity = 0
+    for batch in range(5):
+        ticks = []
+        for i in range(3):
+            quantity += 1
+            # Receive times jitter inside one second; capture order must still win
+            ticks.append(Tick("TCS.NSE", 1, 350_000, quantity, SECOND + (3 - i) * 1000 + batch))
+        db_utils.write_ticks(ticks)
+        seen.extend(row["ltq"] for row in tail.poll())
+
+    assert seen == list(range(1, quantity + 1))
+    assert tail.poll() == []
+    assert isinstance(tail.last_id, ObjectId)
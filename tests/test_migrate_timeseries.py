@@ -0,0 +1,52 @@
+import pytest
+from backend import db_utils, migrate_timeseries
+from backend.db_utils import TS_COLLECTION
+
+LINES = 23
+
+
+def write_csv(path):
+    with open(path, "w", newline="") as f:
+        f.write("Ticker,Date,Time,LTP,LTQ\n")
+        for i in range(LINES):
+            f.write(f"TCS.NSE,07-08-25,10:{i // 60:02d}:{i % 60:02d},3500.{i:02d},{i + 1}\n")
+            if i == 7:
+                f.write("\n")
+            if i == 12:
+                f.write("2025-08-07 10:00:12 INFO reconnecting\n")      # stray log output
+
+
+def migrated_ids(database):
+    return sorted(document["_id"] for document in database[TS_COLLECTION].find({}, {"_id": 1}))
+
+
+def test_resume_after_crash_gives_the_same_ids(tmp_path, mongo_db, monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    # mongomock has no time-series collections; a plain one takes the same inserts
+    for module in (db_utils, migrate_timeseries):
+        monkeypatch.setattr(module, "ensure_timeseries_collection", lambda database, name=TS_COLLECTION: None)
+    path = str(tmp_path / "TCS.NSE.csv")
+    write_csv(path)
+
+    clean = mongomock.MongoClient()["clean"]
+    assert migrate_timeseries.migrate_csvs(clean, [path], batch_size=4) == {path: LINES}
+
+    batches = migrate_timeseries._csv_batches
+
+    def crash_after_two(*args):
+        for n, batch in enumerate(batches(*args)):
+            if n == 2:
+                raise KeyboardInterrupt     # killed mid-run, after two batches were recorded
+            yield batch
+
+    monkeypatch.setattr(migrate_timeseries, "_csv_batches", crash_after_two)
+    with pytest.raises(KeyboardInterrupt):
+        migrate_timeseries.migrate_csvs(mongo_db, [path], batch_size=4)
+    monkeypatch.setattr(migrate_timeseries, "_csv_batches", batches)
+    state = mongo_db[migrate_timeseries.MIGRATIONS_COLLECTION].find_one()
+    assert not state["done"] and state["inserted"] == 8
+
+    assert migrate_timeseries.migrate_csvs(mongo_db, [path], batch_size=4) == {path: LINES}
+    assert migrated_ids(mongo_db) == migrated_ids(clean)
+    assert len(migrated_ids(mongo_db)) == LINES
+    assert migrate_timeseries.migrate_csvs(mongo_db, [path], batch_size=4) == {path: 0}     # already done
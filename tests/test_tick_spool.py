@@ -0,0 +1,76 @@
+import threading
+import pytest
+from backend.sinks import SinkPipeline, TickSink
+from backend.tick_record import Tick
+from backend.tick_spool import TickSpool
+
+
+class MemorySink(TickSink):
+    """Keeps every tick it is given; `fail` makes the next batch raise."""
+
+    def __init__(self, name):
+        self.name = name
+        self.ticks = []
+        self.fail = threading.Event()
+
+    def write_batch(self, ticks):
+        if self.fail.is_set():
+            self.fail.clear()
+            raise OSError("disk full")
+        self.ticks.extend(ticks)
+
+
+def spool_ticks(spool, count, start=0):
+    for i in range(start, start + count):
+        spool.append(Tick("TCS.NSE", 1, 350_000 + i, 10, 1_754_550_000_000_000_000 + i))
+
+
+def prices(sink):
+    return [tick.price_raw for tick in sink.ticks]
+
+
+def test_replay_after_crash_does_not_duplicate(tmp_path):
+    sink = MemorySink("memory")
+    pipeline = SinkPipeline([sink])
+    pipeline.start()
+    try:
+        spool = TickSpool(folder=str(tmp_path))
+        spool_ticks(spool, 5)
+        records, _ = spool.read_batch(timeout=0)
+        pipeline.deliver_spooled(records, spool)
+        spool.close()       # crash: the batch was stored but the checkpoint never moved
+
+        spool = TickSpool(folder=str(tmp_path))
+        spool_ticks(spool, 3, start=5)
+        records, position = spool.read_batch(timeout=0)
+        assert [seq for seq, _ in records] == list(range(1, 9))     # everything past the checkpoint comes back
+        pipeline.deliver_spooled(records, spool)
+        spool.commit(position, records[-1][0])
+        spool.close()
+    finally:
+        pipeline.close()
+
+    assert prices(sink) == [350_000 + i for i in range(8)]
+
+
+def test_retry_only_rewrites_the_sink_that_failed(tmp_path):
+    healthy, flaky = MemorySink("healthy"), MemorySink("flaky")
+    pipeline = SinkPipeline([healthy, flaky])
+    pipeline.start()
+    spool = TickSpool(folder=str(tmp_path))
+    try:
+        spool_ticks(spool, 4)
+        records, _ = spool.read_batch(timeout=0)
+        flaky.fail.set()
+        with pytest.raises(RuntimeError, match="flaky"):
+            pipeline.deliver_spooled(records, spool)
+        assert spool.sink_marks() == {"healthy": 4}
+        pipeline.deliver_spooled(records, spool)
+    finally:
+        spool.close()
+        pipeline.close()
+
+    assert prices(healthy) == prices(flaky) == [350_000 + i for i in range(4)]
+    spool = TickSpool(folder=str(tmp_path))
+    assert spool.sink_marks() == {"healthy": 4, "flaky": 4}
+    spool.close()